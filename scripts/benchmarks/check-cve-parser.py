@@ -0,0 +1,73 @@
+import os
+import sys
+import json
+import argparse
+import importlib.util
+
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+SCRIPT = os.path.join(BENCHMARKS_DIR, "..", "monitoramento-zabbix", "get-commvault-cve.py")
+FIXTURES_DIR = os.path.join(BENCHMARKS_DIR, "fixtures")
+
+# Página salva -> avisos esperados
+FIXTURES = [("securityadvisories.html", "securityadvisories.json")]
+# Tamanhos de bloco: página inteira, blocos do coletor e blocos pequenos, que dividem caracteres e tags
+CHUNK_SIZES = [None, 16384, 7, 1]
+ENCODINGS = ["utf-8", "cp1252"]
+
+
+def load_collector():
+    """Carrega o get-commvault-cve.py como módulo, sem executá-lo."""
+    # O coletor importa módulos do próprio diretório (zabbix_sender)
+    sys.path.insert(0, os.path.dirname(os.path.abspath(SCRIPT)))
+    spec = importlib.util.spec_from_file_location("get_commvault_cve", SCRIPT)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def chunked(data, size):
+    if size is None:
+        return [data]
+    return [data[i:i + size] for i in range(0, len(data), size)]
+
+
+def check_fixture(collector, html_file, expected_file):
+    """Extrai os avisos da página salva em cada codificação e tamanho de bloco e compara com os esperados.
+
+    Returns:
+        list: Descrição de cada divergência encontrada.
+    """
+    with open(os.path.join(FIXTURES_DIR, html_file), encoding="utf-8") as f:
+        html = f.read()
+    with open(os.path.join(FIXTURES_DIR, expected_file), encoding="utf-8") as f:
+        expected = json.load(f)
+    failures = []
+    for encoding in ENCODINGS:
+        data = html.encode(encoding)
+        for size in CHUNK_SIZES:
+            advisories, found = collector.parse_advisories(chunked(data, size), encoding)
+            if not found or advisories != expected:
+                failures.append(f"{html_file} ({encoding}, blocos de {size or len(data)} bytes): "
+                                f"{len(advisories)} avisos extraídos, {len(expected)} esperados")
+                for got, want in zip(advisories, expected):
+                    if got != want:
+                        failures.append(f"  extraído {got}\n  esperado {want}")
+                        break
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Valida a extração de avisos do get-commvault-cve.py contra páginas salvas.")
+    parser.parse_args()
+    collector = load_collector()
+    failures = []
+    for html_file, expected_file in FIXTURES:
+        failures.extend(check_fixture(collector, html_file, expected_file))
+    for failure in failures:
+        print(failure)
+    print(f"{len(FIXTURES)} páginas verificadas, {len(failures)} divergências.")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,314 @@
+import re
+import json
+import time
+import socket
+import struct
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlparse, parse_qs
+
+API_PREFIX = "/commandcenter/api/"
+ID_PATTERN = re.compile(r"/\d+(?=/|$)")
+
+# Status dos Jobs sintéticos: os finalizados e os ativos se alternam nesta ordem
+FINISHED_STATUSES = ["Completed", "Completed", "Completed", "Failed", "Completed w/ one or more errors"]
+ACTIVE_STATUSES = ["Running", "Queued", "Waiting", "Pending"]
+LOCALIZED_STATUS = {"Completed w/ one or more errors": "Completed with one or more errors"}
+# Fração dos Jobs que estão ativos
+ACTIVE_RATIO = 0.1
+# Os Jobs finalizados terminam distribuídos nos últimos FINISHED_SPREAD segundos
+FINISHED_SPREAD = 1800
+
+
+class FakeCommServe:
+    """API REST do Commvault simulada, servida em uma thread do próprio processo.
+
+    Responde os endpoints utilizados pelos coletores (Job, V4/mediaAgent, Library, Library/{id},
+    Client, Client/{id}, CommServ, V4/License e datasets do reportsplusengine) com dados sintéticos
+    gerados sob demanda, sem manter a lista de Jobs em memória. A quantidade de Jobs, Libraries,
+    Clients e MediaAgents pode ser alterada entre as execuções, e latency (segundos) é somada a
+    cada resposta. As requisições recebidas são contadas por endpoint.
+    """
+
+    def __init__(self, jobs=100, libraries=10, clients=100, media_agents=4, latency=0.0, host="127.0.0.1", port=0):
+        self.jobs = jobs
+        self.libraries = libraries
+        self.clients = clients
+        self.media_agents = media_agents
+        self.latency = latency
+        self.started = int(time.time())
+        self.requests = {}
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer((host, port), self._handler())
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, name="fake-commserve", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *_):
+        self.stop()
+
+    def reset_counters(self):
+        with self._lock:
+            self.requests = {}
+
+    def request_count(self):
+        with self._lock:
+            return sum(self.requests.values())
+
+    def _count(self, endpoint):
+        name = ID_PATTERN.sub("/{id}", endpoint)
+        with self._lock:
+            self.requests[name] = self.requests.get(name, 0) + 1
+
+    # Jobs ------------------------------------------------------------------------------------
+
+    def _split(self):
+        active = int(self.jobs * ACTIVE_RATIO)
+        return self.jobs - active, active
+
+    def _end_time(self, index, finished):
+        return self.started - int((finished - index) * FINISHED_SPREAD / finished)
+
+    def _first_finished(self, since):
+        """Índice do primeiro Job finalizado com jobEndTime >= since (os índices estão em ordem de término)."""
+        finished, _ = self._split()
+        low, high = 0, finished
+        while low < high:
+            middle = (low + high) // 2
+            if self._end_time(middle, finished) < since:
+                low = middle + 1
+            else:
+                high = middle
+        return low
+
+    def job(self, index):
+        """jobSummary sintético do Job de índice index."""
+        finished, _ = self._split()
+        if index < finished:
+            status = FINISHED_STATUSES[index % len(FINISHED_STATUSES)]
+            end_time = self._end_time(index, finished)
+        else:
+            status = ACTIVE_STATUSES[index % len(ACTIVE_STATUSES)]
+            end_time = 0
+        elapsed = (index * 977) % 260000
+        client = index % max(1, self.clients)
+        media_agent = index % max(1, self.media_agents)
+        return {
+            "jobId": index + 1,
+            "status": status,
+            "localizedStatus": LOCALIZED_STATUS.get(status, status),
+            "jobType": "Backup" if index % 10 else "Restore",
+            "backupLevelName": "Incremental" if index % 7 else "Full",
+            "jobElapsedTime": elapsed,
+            "jobStartTime": (end_time or self.started) - elapsed,
+            "jobEndTime": end_time,
+            "sizeOfApplication": index * 4096,
+            "sizeOfMediaOnDisk": index * 2048,
+            "pendingReason": f"Motivo <b>{index}</b>" if status != "Completed" else "",
+            "subclient": {"clientName": f"client{client}", "clientId": client, "instanceName": "DefaultInstanceName", "appName": "File System"},
+            "clientGroups": [{"clientGroupName": f"grupo{client % 8}", "clientGroupId": client % 8}],
+            "mediaAgent": {"mediaAgentName": f"ma{media_agent}", "mediaAgentId": media_agent},
+            "storagePolicy": {"storagePolicyName": f"sp{index % 5}", "storagePolicyId": index % 5},
+        }
+
+    def job_page(self, query):
+        finished, active = self._split()
+        category = query.get("jobCategory", "All")
+        lookup = int(query.get("completedJobLookupTime", 86400))
+        ranges = []
+        if category in ("All", "Finished"):
+            ranges.append(range(self._first_finished(time.time() - lookup), finished))
+        if category in ("All", "Active"):
+            ranges.append(range(finished, finished + active))
+        total = sum(len(indexes) for indexes in ranges)
+        offset = int(query.get("offset", 0))
+        limit = int(query.get("limit", total or 1))
+        page = []
+        for indexes in ranges:
+            if offset >= len(indexes):
+                offset -= len(indexes)
+                continue
+            for index in indexes[offset:offset + limit - len(page)]:
+                page.append({"jobSummary": self.job(index)})
+            offset = 0
+            if len(page) >= limit:
+                break
+        return {"totalRecordsWithoutPaging": total, "jobs": page}
+
+    # Demais endpoints ------------------------------------------------------------------------
+
+    def response(self, endpoint, query):
+        """Corpo da resposta de um endpoint, ou None se o endpoint não existir."""
+        parts = endpoint.split("/")
+        if endpoint == "Job":
+            return self.job_page(query)
+        if endpoint == "V4/mediaAgent":
+            return {"mediaAgents": [
+                {"id": i, "name": f"ma{i}", "displayName": f"ma{i}", "status": "Online" if i % 5 else "Offline"}
+                for i in range(self.media_agents)
+            ]}
+        if endpoint == "Library":
+            return {"response": [{"entityInfo": {"id": i, "name": f"lib{i}"}} for i in range(self.libraries)]}
+        if parts[0] == "Library" and len(parts) == 2 and parts[1].isdigit():
+            i = int(parts[1])
+            return {"libraryInfo": {
+                "library": {"libraryName": f"lib{i}", "libraryId": i},
+                "magLibSummary": {
+                    "Total Capacity": f"{100 + i} TB",
+                    "Total Free Space": f"{i % 100} TB",
+                    "Total Space": f"{100 + i} TB",
+                    "Space Reserved": "1 TB",
+                    "Online": "Yes" if i % 10 else "No",
+                    "Mount Paths": i % 4 + 1,
+                },
+            }}
+        if endpoint == "Client":
+            return {"clientProperties": [
+                {"client": {"clientEntity": {"clientId": i, "clientName": f"client{i}", "_type_": 106 if i % 50 == 0 else 3}}}
+                for i in range(self.clients)
+            ]}
+        if parts[0] == "Client" and len(parts) == 2 and parts[1].isdigit():
+            i = int(parts[1])
+            return {"clientProperties": [{"client": {
+                "displayName": f"client{i}",
+                "installDirectory": f"C:\\Program Files\\Commvault\\client{i}",
+                "versionInfo": {"version": "11.32.40"},
+            }}]}
+        if endpoint == "CommServ":
+            return {"commcell": {"commCellName": "BENCH"}, "releaseName": "11.32", "csVersionInfo": "SP32"}
+        if endpoint == "V4/License":
+            return {"expiryDate": self.started + 365 * 86400}
+        if endpoint.startswith("cr/reportsplusengine/datasets/"):
+            return self.dataset_page(query)
+        return None
+
+    def dataset_page(self, query):
+        """Dataset de saúde do CommCell, com projeção (fields=[Coluna],...) e paginação (limit/offset)."""
+        names = ["CommUniId", "Status", "Count"]
+        records = [[10000, "1_Good", 40], [10000, "2_Info", 3], [10000, "3_Warning", 2], [10000, "4_Critical", 1]]
+        fields = [name.strip("[]") for name in query["fields"].split(",")] if query.get("fields") else names
+        positions = [names.index(name) for name in fields if name in names]
+        offset = int(query.get("offset", 0))
+        limit = int(query.get("limit", len(records)))
+        return {
+            "columns": [{"name": names[position]} for position in positions],
+            "records": [[record[position] for position in positions] for record in records[offset:offset + limit]],
+            "totalRecordCount": len(records),
+        }
+
+    def _handler(self):
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *_):
+                pass
+
+            def do_GET(self):
+                url = urlparse(self.path)
+                endpoint = url.path[len(API_PREFIX):].strip("/") if url.path.startswith(API_PREFIX) else url.path
+                query = {key: values[0] for key, values in parse_qs(url.query).items()}
+                fake._count(endpoint)
+                if fake.latency:
+                    time.sleep(fake.latency)
+                body = fake.response(endpoint, query)
+                if body is None:
+                    self.send_response(404)
+                    self.send_header("Content-Length", "0")
+                    self.end_headers()
+                    return
+                data = json.dumps(body).encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+        return Handler
+
+
+class FakeTrapper:
+    """Zabbix trapper simulado: aceita o protocolo sender, conta os itens e lotes recebidos e responde sucesso."""
+
+    def __init__(self, host="127.0.0.1", port=0):
+        self.items = 0
+        self.batches = 0
+        self._lock = threading.Lock()
+        self._socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self._socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self._socket.bind((host, port))
+        self._socket.listen(64)
+        self._stopped = False
+
+    @property
+    def address(self):
+        return self._socket.getsockname()[:2]
+
+    def start(self):
+        threading.Thread(target=self._serve, name="fake-trapper", daemon=True).start()
+        return self
+
+    def stop(self):
+        self._stopped = True
+        self._socket.close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *_):
+        self.stop()
+
+    def reset_counters(self):
+        with self._lock:
+            self.items = 0
+            self.batches = 0
+
+    def _serve(self):
+        while not self._stopped:
+            try:
+                conn, _ = self._socket.accept()
+            except OSError:
+                return
+            threading.Thread(target=self._handle, args=(conn,), daemon=True).start()
+
+    def _handle(self, conn):
+        with conn:
+            try:
+                header = self._recv_exact(conn, 13)
+                length = struct.unpack("<Q", header[5:])[0]
+                data = json.loads(self._recv_exact(conn, length))["data"]
+            except (OSError, ValueError, KeyError, struct.error):
+                return
+            with self._lock:
+                self.items += len(data)
+                self.batches += 1
+            info = f"processed: {len(data)}; failed: 0; total: {len(data)}; seconds spent: 0.000100"
+            body = json.dumps({"response": "success", "info": info}).encode("utf-8")
+            conn.sendall(b"ZBXD\x01" + struct.pack("<Q", len(body)) + body)
+
+    @staticmethod
+    def _recv_exact(conn, size):
+        data = b""
+        while len(data) < size:
+            chunk = conn.recv(size - len(data))
+            if not chunk:
+                raise OSError("conexão encerrada")
+            data += chunk
+        return data
@@ -0,0 +1,249 @@
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+import subprocess
+from fake_commserve import FakeCommServe, FakeTrapper
+
+SCRIPTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+
+# Coletor -> (script, dimensão do conjunto de dados que varia entre as execuções, argumentos)
+COLLECTORS = {
+    "get-jobs": ("monitoramento-zabbix/get-jobs.py", "jobs", []),
+    "get-failed-jobs": ("monitoramento-zabbix/get-failed-jobs.py", "jobs", []),
+    "get-library": ("monitoramento-zabbix/get-library.py", "libraries", []),
+    "get-ma": ("monitoramento-zabbix/get-ma.py", "media_agents", []),
+    "get-commcell-info": ("monitoramento-zabbix/get-commcell-info.py", None, []),
+    "get-client-configs": ("devops/get-client-configs.py", "clients", ["--output", "clients.csv"]),
+}
+
+DEFAULT_SIZES = {
+    "jobs": "100,10000,100000",
+    "libraries": "10,100,1000",
+    "media_agents": "10",
+    "clients": "100,1000",
+}
+
+
+def parse_sizes(value):
+    return [int(size) for size in value.split(",") if size.strip()]
+
+
+def collector_env(server, trapper, state_dir):
+    """Variáveis de ambiente de uma execução: API e Zabbix simulados e estado em diretório temporário.
+
+    As variáveis opcionais que alteram o comportamento dos coletores são definidas explicitamente,
+    para que um .env local (lido pelos scripts com load_dotenv) não interfira nos resultados.
+    """
+    zabbix_host, zabbix_port = trapper.address
+    env = dict(os.environ)
+    env.update({
+        "COMMVAULT_SERVER": server.url,
+        "API_TOKEN": "benchmark",
+        "ZABBIX_SERVER": zabbix_host,
+        "ZABBIX_PORT": str(zabbix_port),
+        "ZABBIX_HOST": "benchmark",
+        "ZABBIX_KEY_JOBS": "masteritem.jobs",
+        "ZABBIX_KEY_MEDIAAGENT": "masteritem.mediaAgents",
+        "ZABBIX_KEY_LIBRARIES": "masteritem.libraries",
+        "STATE_DIR": state_dir,
+        "TARGETS_FILE": "",
+        "CACHE_FILE": "",
+        "JOB_INCREMENTAL": "false",
+        "DELTA_MODE": "false",
+        "LLD_WAIT": "0",
+        "COMMVAULT_LATENCY_REPORT": "false",
+        # Recursos opcionais que alteram as requisições, o envio ou o trabalho de cada execução
+        "SEND_QUEUE": "false",
+        "JOB_HISTORY": "false",
+        "JOB_SLA_TRACKER": "false",
+        "SELF_MONITORING": "false",
+        "SEEN_JOBS": "false",
+        # Tamanhos de página e de lote e limites de taxa nos valores padrão
+        "JOB_PAGE_SIZE": "1000",
+        "DATASET_PAGE_SIZE": "1000",
+        "ZABBIX_BATCH_SIZE": "250",
+        "COMMVAULT_RATE_LIMIT": "0",
+        "HEALTH_STATUS_COLUMN": "Status",
+        "HEALTH_COUNT_COLUMN": "Count",
+        "CLIENT_EXPORT_CACHE": "clients_cache.sqlite",
+        "CLIENT_EXPORT_FORMAT": "csv",
+        "CLIENT_EXPORT_WORKERS": "8",
+        "CLIENT_EXPORT_RATE_LIMIT": "0",
+    })
+    return env
+
+
+# Executado no processo filho: roda o coletor como __main__ e grava o pico de memória ao final.
+# O pico é lido de VmHWM (memória do próprio programa após o exec); ru_maxrss herdaria o pico do
+# processo do benchmark no fork.
+BOOTSTRAP = """
+import os, sys, json, atexit, runpy
+def peak_mb():
+    try:
+        with open("/proc/self/status") as status:
+            for line in status:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    try:
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak / 1024 / (1024 if sys.platform == "darwin" else 1)
+    except ImportError:
+        return None
+def report():
+    with open(os.environ["BENCHMARK_PEAK_FILE"], "w") as f:
+        json.dump(peak_mb(), f)
+atexit.register(report)
+script = sys.argv[1]
+sys.argv = sys.argv[1:]
+sys.path.insert(0, os.path.dirname(os.path.abspath(script)))
+runpy.run_path(script, run_name="__main__")
+"""
+
+
+def run_collector(script, args, env, cwd, timeout):
+    """Executa um coletor em um processo filho e mede o tempo e o pico de memória.
+
+    Returns:
+        tuple: (segundos, pico de memória em MB ou None, código de saída, saída do processo).
+    """
+    log_path = os.path.join(cwd, "output.log")
+    peak_path = os.path.join(cwd, "peak")
+    env = dict(env, BENCHMARK_PEAK_FILE=peak_path)
+    with open(log_path, "w") as log:
+        start = time.perf_counter()
+        try:
+            code = subprocess.run([sys.executable, "-c", BOOTSTRAP, script] + args, cwd=cwd, env=env,
+                                  stdout=log, stderr=subprocess.STDOUT, timeout=timeout).returncode
+        except subprocess.TimeoutExpired:
+            code = "timeout"
+        elapsed = time.perf_counter() - start
+    peak = None
+    if os.path.exists(peak_path):
+        with open(peak_path) as f:
+            peak = json.load(f)
+    with open(log_path) as log:
+        output = log.read()
+    return elapsed, peak, code, output
+
+
+def run_benchmarks(collectors, sizes, latency, timeout, verbose=False):
+    """Executa cada coletor contra a API e o trapper simulados, para cada tamanho do conjunto de dados.
+
+    Returns:
+        list: Um dicionário por execução com collector, dimension, size, seconds, peak_mb,
+        requests, items, batches e exit_code.
+    """
+    results = []
+    with FakeCommServe(latency=latency) as server, FakeTrapper() as trapper:
+        for name in collectors:
+            script, dimension, args = COLLECTORS[name]
+            for size in (sizes[dimension] if dimension else [None]):
+                if dimension:
+                    setattr(server, dimension, size)
+                server.reset_counters()
+                trapper.reset_counters()
+                with tempfile.TemporaryDirectory(prefix="bench-") as workdir:
+                    env = collector_env(server, trapper, os.path.join(workdir, "state"))
+                    seconds, peak, code, output = run_collector(os.path.join(SCRIPTS_DIR, script), args, env, workdir, timeout)
+                # O último lote pode chegar ao trapper logo após o término do processo
+                time.sleep(0.05)
+                result = {
+                    "collector": name,
+                    "dimension": dimension,
+                    "size": size,
+                    "seconds": round(seconds, 3),
+                    "peak_mb": round(peak, 1) if peak is not None else None,
+                    "requests": server.request_count(),
+                    "items": trapper.items,
+                    "batches": trapper.batches,
+                    "exit_code": code,
+                }
+                results.append(result)
+                print(format_row(result), flush=True)
+                if verbose or code != 0:
+                    print(output)
+    return results
+
+
+HEADER = f"{'coletor':<20} {'tamanho':>18} {'tempo (s)':>10} {'memória (MB)':>13} {'requisições':>12} {'itens':>8} {'lotes':>6}"
+
+
+def format_row(result):
+    size = f"{result['size']} {result['dimension']}" if result["dimension"] else "-"
+    peak = f"{result['peak_mb']:.1f}" if result["peak_mb"] is not None else "n/d"
+    status = "" if result["exit_code"] == 0 else f"  (saída {result['exit_code']})"
+    return (f"{result['collector']:<20} {size:>18} {result['seconds']:>10.2f} {peak:>13} "
+            f"{result['requests']:>12} {result['items']:>8} {result['batches']:>6}{status}")
+
+
+def compare(results, baseline, tolerance):
+    """Compara tempo e memória com uma execução anterior.
+
+    Returns:
+        list: Mensagens das execuções que pioraram mais que tolerance (ex: 0.2 = 20%).
+    """
+    previous = {(entry["collector"], entry["size"]): entry for entry in baseline}
+    regressions = []
+    for result in results:
+        old = previous.get((result["collector"], result["size"]))
+        if not old:
+            continue
+        for metric in ("seconds", "peak_mb", "requests"):
+            if old.get(metric) and result.get(metric) is not None and result[metric] > old[metric] * (1 + tolerance):
+                regressions.append(f"{result['collector']} ({result['size']}): {metric} {old[metric]} -> {result[metric]}")
+    return regressions
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Benchmark dos coletores contra uma API do Commvault e um Zabbix simulados.")
+    parser.add_argument("--collectors", default=",".join(COLLECTORS), help="Coletores separados por vírgula (padrão: todos)")
+    parser.add_argument("--jobs", default=DEFAULT_SIZES["jobs"], help="Quantidades de Jobs (padrão: 100,10000,100000)")
+    parser.add_argument("--libraries", default=DEFAULT_SIZES["libraries"], help="Quantidades de Libraries (padrão: 10,100,1000)")
+    parser.add_argument("--media-agents", default=DEFAULT_SIZES["media_agents"], help="Quantidades de MediaAgents (padrão: 10)")
+    parser.add_argument("--clients", default=DEFAULT_SIZES["clients"], help="Quantidades de Clients (padrão: 100,1000)")
+    parser.add_argument("--latency", type=float, default=0.0, help="Latência adicionada a cada resposta da API, em segundos (padrão: 0)")
+    parser.add_argument("--timeout", type=float, default=600, help="Tempo máximo de cada execução, em segundos (padrão: 600)")
+    parser.add_argument("--output", help="Grava os resultados em JSON")
+    parser.add_argument("--baseline", help="Resultados JSON de uma execução anterior, para detectar regressões")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="Piora tolerada em relação ao baseline (padrão: 0.2 = 20%%)")
+    parser.add_argument("--verbose", action="store_true", help="Imprime a saída de cada coletor")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    collectors = [name.strip() for name in args.collectors.split(",") if name.strip()]
+    unknown = [name for name in collectors if name not in COLLECTORS]
+    if unknown:
+        print(f"Coletores desconhecidos: {', '.join(unknown)}")
+        return 2
+    sizes = {
+        "jobs": parse_sizes(args.jobs),
+        "libraries": parse_sizes(args.libraries),
+        "media_agents": parse_sizes(args.media_agents),
+        "clients": parse_sizes(args.clients),
+    }
+    print(HEADER)
+    results = run_benchmarks(collectors, sizes, args.latency, args.timeout, args.verbose)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+    failed = [result for result in results if result["exit_code"] != 0]
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        for message in regressions:
+            print(f"Regressão: {message}")
+        if regressions:
+            return 1
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,132 @@
+import time
+import heapq
+from job_analytics import DELAYED_ELAPSED
+
+# Prefixo das regras de JOB_SLA_THRESHOLDS que se aplicam a um grupo de clientes
+GROUP_PREFIX = "group:"
+
+
+def parse_thresholds(value):
+    """Converte "Backup=86400,group:Críticos=28800,default=172800" em limites de tempo (segundos).
+
+    Returns:
+        tuple: (limites por tipo de Job, limites por grupo de clientes, limite padrão ou None).
+
+    Raises:
+        ValueError: Se alguma entrada não estiver no formato nome=segundos, com segundos positivos.
+    """
+    by_type = {}
+    by_group = {}
+    default = None
+    for entry in (value or "").split(","):
+        entry = entry.strip()
+        if not entry:
+            continue
+        name, _, seconds = entry.rpartition("=")
+        name = name.strip()
+        try:
+            seconds = float(seconds)
+        except ValueError:
+            seconds = None
+        if not name or seconds is None or not 0 < seconds < float("inf"):
+            raise ValueError(f"Limite inválido em JOB_SLA_THRESHOLDS: '{entry}' (formato nome=segundos)")
+        if name == "default":
+            default = seconds
+        elif name.startswith(GROUP_PREFIX):
+            by_group[name[len(GROUP_PREFIX):]] = seconds
+        else:
+            by_type[name] = seconds
+    return by_type, by_group, default
+
+
+class ActiveJobTracker:
+    """Jobs ativos indexados pelo prazo de SLA em uma fila de prioridade (heap).
+
+    O prazo de cada Job é o início (jobStartTime) somado ao limite do seu grupo de clientes, do seu
+    tipo de Job ou ao limite padrão, nessa ordem de prioridade. A cada atualização apenas os Jobs
+    novos entram no heap (O(log n)); os que deixaram de estar ativos são removidos do índice e as
+    suas entradas no heap são descartadas quando chegam ao topo (remoção preguiçosa), com
+    compactação do heap quando as entradas descartadas passam da metade. Os Jobs cujo prazo venceu
+    saem do heap e ficam em breached até terminarem, de forma que a consulta do próximo vencimento
+    e dos Jobs vencidos não percorre os Jobs dentro do prazo.
+    """
+
+    def __init__(self, by_type=None, by_group=None, default=None):
+        self.by_type = by_type or {}
+        self.by_group = by_group or {}
+        self.default = float(DELAYED_ELAPSED if default is None else default)
+        # jobId -> (prazo, JobSummary) dos Jobs ativos, dentro do prazo ou não
+        self.jobs = {}
+        # jobId -> (prazo, JobSummary) dos Jobs ativos com o prazo vencido
+        self.breached = {}
+        self._heap = []
+
+    def threshold(self, job):
+        """Limite de tempo de execução (segundos) do Job."""
+        if job.client_group in self.by_group:
+            return self.by_group[job.client_group]
+        return self.by_type.get(job.job_type, self.default)
+
+    def __len__(self):
+        return len(self.jobs)
+
+    def update(self, jobs, now=None):
+        """Atualiza o índice com a lista atual de Jobs ativos e separa os que venceram o prazo.
+
+        Args:
+            jobs (iterable): JobSummary de todos os Jobs ativos no momento. Jobs finalizados
+                (jobEndTime preenchido) são ignorados.
+            now (float, optional): Momento da consulta (padrão: agora).
+        """
+        now = now or time.time()
+        current = set()
+        for job in jobs:
+            if job.end_time or job.job_id is None:
+                continue
+            current.add(job.job_id)
+            entry = self.jobs.get(job.job_id)
+            if entry is not None:
+                # Mantém o prazo calculado na entrada e atualiza os demais campos (ex: status)
+                self.jobs[job.job_id] = (entry[0], job)
+                if job.job_id in self.breached:
+                    self.breached[job.job_id] = (entry[0], job)
+                continue
+            deadline = (job.start_time or now) + self.threshold(job)
+            self.jobs[job.job_id] = (deadline, job)
+            heapq.heappush(self._heap, (deadline, job.job_id))
+        for job_id in self.jobs.keys() - current:
+            del self.jobs[job_id]
+            self.breached.pop(job_id, None)
+        self._expire(now)
+
+    def _expire(self, now):
+        heap = self._heap
+        while heap:
+            deadline, job_id = heap[0]
+            entry = self.jobs.get(job_id)
+            if entry is None or entry[0] != deadline or job_id in self.breached:
+                heapq.heappop(heap)
+            elif deadline <= now:
+                heapq.heappop(heap)
+                self.breached[job_id] = entry
+            else:
+                break
+        # Compacta o heap quando a maior parte das entradas é de Jobs que já terminaram
+        if len(heap) > 2 * (len(self.jobs) - len(self.breached)) + 64:
+            self._heap = [(entry[0], job_id) for job_id, entry in self.jobs.items() if job_id not in self.breached]
+            heapq.heapify(self._heap)
+
+    def next_breach(self, now=None):
+        """Segundos até o próximo Job ativo vencer o prazo, ou None se não houver Jobs dentro do prazo."""
+        if not self._heap:
+            return None
+        return max(0, int(self._heap[0][0] - (now or time.time())))
+
+    def breached_jobs(self, now=None):
+        """Jobs ativos com o prazo vencido, do mais atrasado para o menos atrasado.
+
+        Returns:
+            list: Tuplas (JobSummary, segundos além do prazo).
+        """
+        now = now or time.time()
+        return [(job, int(now - deadline)) for deadline, job in sorted(self.breached.values(), key=lambda entry: entry[0])]
@@ -0,0 +1,274 @@
+import os
+import re
+import sys
+import time
+import threading
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from response_cache import ResponseCache
+from request_governor import RequestGovernor
+from run_metrics import phase, record_request
+from records import loads
+
+DEFAULT_POOL_SIZE = 10
+DEFAULT_TIMEOUT = 30
+DEFAULT_RETRIES = 3
+DEFAULT_BACKOFF = 0.5
+RETRY_STATUS = (500, 502, 503, 504)
+
+# IDs numéricos no caminho são agrupados para a latência e o TTL do cache (ex: Library/{id})
+ID_PATTERN = re.compile(r"/\d+(?=/|$)")
+
+
+def endpoint_name(endpoint):
+    """Normaliza um endpoint para agrupamento (ex: "Library/12?x=1" -> "Library/{id}")."""
+    return ID_PATTERN.sub("/{id}", endpoint.split("?")[0].strip("/"))
+
+
+def _env_bool(name, default=False):
+    value = os.getenv(name)
+    if value is None:
+        return default
+    return value.strip().lower() in ("1", "true", "yes", "sim")
+
+
+class StreamedResponse:
+    """Resposta em streaming que mantém a vaga da requisição no RequestGovernor até ser fechada.
+
+    O corpo de uma resposta em streaming é lido depois que request() retorna; a vaga só é liberada
+    (e a latência registrada) em close(), para que o governor considere a transferência do corpo
+    nas requisições em andamento e na latência do endpoint. Só erros de transferência
+    (RequestException) encerram a vaga como falha. Os demais atributos são os da requests.Response.
+    """
+
+    def __init__(self, response, release):
+        self._response = response
+        self._release = release
+
+    def __getattr__(self, name):
+        return getattr(self._response, name)
+
+    def __iter__(self):
+        return iter(self._response)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self._close(exc_type, exc, tb)
+
+    def close(self):
+        """Fecha a resposta e libera a vaga no governor."""
+        self._close(None, None, None)
+
+    def _close(self, *exc_info):
+        release, self._release = self._release, None
+        try:
+            self._response.close()
+        finally:
+            if release is not None:
+                release(*exc_info)
+
+
+class CommvaultClient:
+    """Cliente da API REST do Commvault compartilhado por todos os scripts.
+
+    Mantém uma única sessão HTTP com pool de conexões persistentes (keep-alive), de forma que o
+    handshake TLS seja feito uma vez por execução e não uma vez por requisição. Todas as chamadas
+    possuem timeout e são repetidas com backoff exponencial em caso de erro 5xx ou falha de conexão.
+    A latência de cada endpoint é registrada e pode ser consultada com latency_stats(). Com um
+    ResponseCache configurado, get_cached() reaproveita a mesma resposta entre os consumidores.
+    Todas as requisições passam pelo RequestGovernor do cliente, que limita as requisições
+    simultâneas e por segundo ao CommServe e ajusta o limite conforme a carga do servidor.
+    """
+
+    def __init__(self, server, token, pool_size=DEFAULT_POOL_SIZE, timeout=DEFAULT_TIMEOUT,
+                 retries=DEFAULT_RETRIES, backoff_factor=DEFAULT_BACKOFF, verify=False, cache=None, governor=None):
+        self.server = (server or "").rstrip("/")
+        self.cache = cache
+        self.governor = governor or RequestGovernor(max_limit=pool_size)
+        self.timeout = float(timeout)
+        self.verify = verify
+        self.session = requests.Session()
+        self.session.headers.update({
+            'Authtoken': token,
+            'Content-Type': 'application/json',
+            'Accept': 'application/json'
+        })
+        retry = Retry(
+            total=int(retries),
+            connect=int(retries),
+            read=int(retries),
+            status=int(retries),
+            backoff_factor=float(backoff_factor),
+            status_forcelist=RETRY_STATUS,
+            raise_on_status=False,
+        )
+        adapter = HTTPAdapter(pool_connections=int(pool_size), pool_maxsize=int(pool_size), max_retries=retry)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self._stats = {}
+        self._stats_lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls, server=None, token=None, name=None):
+        """Cria o cliente a partir das variáveis de ambiente.
+
+        Utiliza COMMVAULT_SERVER e API_TOKEN, e opcionalmente COMMVAULT_POOL_SIZE, COMMVAULT_TIMEOUT,
+        COMMVAULT_RETRIES, COMMVAULT_BACKOFF, COMMVAULT_VERIFY_SSL, as variáveis CACHE_* do
+        ResponseCache e as variáveis de concorrência do RequestGovernor.
+
+        Args:
+            server (str, optional): Servidor do CommCell, no lugar de COMMVAULT_SERVER.
+            token (str, optional): Token da API, no lugar de API_TOKEN.
+            name (str, optional): Nome do CommCell, utilizado para separar o arquivo do cache.
+
+        Returns:
+            CommvaultClient: Cliente configurado.
+        """
+        return cls(
+            server or os.getenv("COMMVAULT_SERVER"),
+            token or os.getenv("API_TOKEN"),
+            pool_size=os.getenv("COMMVAULT_POOL_SIZE", DEFAULT_POOL_SIZE),
+            timeout=os.getenv("COMMVAULT_TIMEOUT", DEFAULT_TIMEOUT),
+            retries=os.getenv("COMMVAULT_RETRIES", DEFAULT_RETRIES),
+            backoff_factor=os.getenv("COMMVAULT_BACKOFF", DEFAULT_BACKOFF),
+            verify=_env_bool("COMMVAULT_VERIFY_SSL"),
+            cache=ResponseCache.from_env(name),
+            governor=RequestGovernor.from_env(),
+        )
+
+    def url(self, endpoint):
+        """Monta a URL completa de um endpoint da API (ex: "V4/mediaAgent")."""
+        return f"{self.server}/commandcenter/api/{endpoint.lstrip('/')}"
+
+    def request(self, method, endpoint, **kwargs):
+        """Executa uma requisição na API do Commvault pela sessão compartilhada.
+
+        Args:
+            method (str): Método HTTP (GET, POST, ...).
+            endpoint (str): Endpoint relativo a /commandcenter/api (ex: "Library/12").
+            **kwargs: Argumentos repassados para requests.Session.request (params, json, ...).
+
+        Returns:
+            requests.Response: Resposta da API. Com stream=True, um StreamedResponse, que deve ser
+            fechado (with response: ...) para liberar a vaga da requisição no governor.
+
+        Raises:
+            requests.exceptions.RequestException: Se a requisição falhar após todas as tentativas.
+        """
+        kwargs.setdefault("timeout", self.timeout)
+        kwargs.setdefault("verify", self.verify)
+        slot = self.governor.slot(endpoint_name(endpoint))
+        start = time.perf_counter()
+        outcome = slot.__enter__()
+        try:
+            with phase("fetch"):
+                response = self.session.request(method, self.url(endpoint), **kwargs)
+            outcome["status"] = response.status_code
+        except BaseException:
+            slot.__exit__(*sys.exc_info())
+            self._record(method, endpoint, time.perf_counter() - start)
+            raise
+        if not kwargs.get("stream"):
+            slot.__exit__(None, None, None)
+            self._record(method, endpoint, time.perf_counter() - start, len(response.content))
+            return response
+
+        def release(exc_type, exc, tb):
+            # Só falhas da transferência contam para o governor; consumidores que param de ler
+            # (GeneratorExit) ou que falham por conta própria não indicam sobrecarga do servidor
+            if exc_type is not None and not issubclass(exc_type, requests.exceptions.RequestException):
+                exc_type = exc = tb = None
+            slot.__exit__(exc_type, exc, tb)
+            # Respostas em streaming são contabilizadas à medida que são lidas (run_metrics.count_bytes)
+            self._record(method, endpoint, time.perf_counter() - start)
+        return StreamedResponse(response, release)
+
+    def get(self, endpoint, **kwargs):
+        """Executa um GET na API do Commvault. Veja request()."""
+        return self.request("GET", endpoint, **kwargs)
+
+    def get_json(self, endpoint, **kwargs):
+        """Executa um GET e retorna o corpo da resposta decodificado (com orjson, quando instalada).
+
+        Raises:
+            requests.exceptions.RequestException: Se a requisição falhar, retornar status de erro ou
+                um corpo que não seja JSON (requests.exceptions.JSONDecodeError, como em response.json()).
+        """
+        response = self.get(endpoint, **kwargs)
+        response.raise_for_status()
+        with phase("decode"):
+            try:
+                return loads(response.content)
+            except ValueError as e:
+                raise requests.exceptions.JSONDecodeError(str(e), response.text, 0) from e
+
+    def get_cached(self, endpoint, params=None):
+        """Executa um GET pelo cache de respostas e retorna o corpo decodificado.
+
+        Enquanto a resposta estiver dentro do TTL do endpoint, todos os consumidores recebem o mesmo
+        objeto, que não deve ser alterado. Sem cache configurado equivale a get_json().
+
+        Raises:
+            requests.exceptions.RequestException: Se a requisição falhar ou retornar status de erro.
+        """
+        if self.cache is None:
+            return self.get_json(endpoint, params=params)
+        key = endpoint if not params else f"{endpoint}?{sorted(params.items())}"
+        return self.cache.get_or_load(key, endpoint_name(endpoint), lambda: self.get_json(endpoint, params=params))
+
+    def _record(self, method, endpoint, elapsed, size=0):
+        name = f"{method} {endpoint_name(endpoint)}"
+        record_request(name, elapsed, size)
+        with self._stats_lock:
+            stats = self._stats.setdefault(name, {"count": 0, "total": 0.0, "max": 0.0})
+            stats["count"] += 1
+            stats["total"] += elapsed
+            stats["max"] = max(stats["max"], elapsed)
+
+    def latency_stats(self):
+        """Retorna a latência registrada por endpoint.
+
+        Returns:
+            dict: Endpoint -> {"count", "total", "avg", "max"} com os tempos em segundos.
+        """
+        with self._stats_lock:
+            return {
+                name: dict(stats, avg=stats["total"] / stats["count"])
+                for name, stats in self._stats.items()
+            }
+
+    def print_latency_report(self):
+        """Imprime a latência por endpoint, os contadores do cache e o limite de concorrência quando COMMVAULT_LATENCY_REPORT estiver habilitado."""
+        if not _env_bool("COMMVAULT_LATENCY_REPORT"):
+            return
+        for name, stats in sorted(self.latency_stats().items()):
+            print(f"{name}: {stats['count']} req, média {stats['avg'] * 1000:.1f} ms, máx {stats['max'] * 1000:.1f} ms")
+        if self.cache is not None:
+            stats = self.cache.stats()
+            print(f"Cache: {stats['hits']} hits, {stats['misses']} misses, {stats['evictions']} evictions, {stats['entries']} entradas")
+        stats = self.governor.stats()
+        print(f"Concorrência: limite {stats['limit']}, {stats['throttled']} reduções, {stats['wait_seconds']:.1f}s em fila")
+
+    def close(self):
+        """Encerra as conexões do pool."""
+        self.session.close()
+
+
+_default_client = None
+_default_client_lock = threading.Lock()
+
+
+def default_client():
+    """Retorna o cliente padrão do processo, criado a partir das variáveis de ambiente na primeira chamada.
+
+    Returns:
+        CommvaultClient: Cliente compartilhado entre todos os módulos carregados no processo.
+    """
+    global _default_client
+    with _default_client_lock:
+        if _default_client is None:
+            _default_client = CommvaultClient.from_env()
+        return _default_client
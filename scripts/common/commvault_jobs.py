@@ -0,0 +1,150 @@
+import os
+import time
+import math
+from json_stream import iter_json_array
+from records import JobSummary
+from local_state import load_state, save_state
+from run_metrics import iterate, count_bytes
+
+DEFAULT_PAGE_SIZE = 1000
+CHUNK_SIZE = 64 * 1024
+# Intervalo padrão entre ressincronizações completas da janela incremental (segundos)
+DEFAULT_RESYNC_INTERVAL = 3600
+# Margem de segurança sobre o cursor, para Jobs finalizados durante a execução anterior (segundos)
+CURSOR_OVERLAP = 120
+
+
+def iter_jobs(api, params=None, page_size=None):
+    """Percorre a API de Jobs do Commvault página por página e retorna um JobSummary de cada Job.
+
+    Cada página é solicitada com limit/offset e decodificada de forma incremental a partir do
+    fluxo da resposta, de modo que a memória utilizada não cresce com a quantidade de Jobs e nenhum
+    Job é perdido por um limite fixo de registros. Cada jobSummary é reduzido aos campos do
+    JobSummary assim que é decodificado. Jobs que aparecem em mais de uma página (a lista
+    pode mudar durante a paginação) são retornados apenas uma vez; a paginação termina na primeira
+    página incompleta ou sem nenhum Job novo, de modo que um servidor que ignore limit/offset e
+    repita sempre a mesma página não prende a coleta.
+
+    Args:
+        api (CommvaultClient): Cliente da API do Commvault.
+        params (dict, optional): Filtros da API de Jobs (ex: {"completedJobLookupTime": 3600}).
+        page_size (int, optional): Jobs por página. Padrão: JOB_PAGE_SIZE ou 1000.
+
+    Yields:
+        JobSummary: Os campos utilizados do jobSummary de cada Job.
+
+    Raises:
+        requests.exceptions.RequestException: Se alguma página não puder ser consultada.
+        json_stream.JsonStreamError: Se a resposta de alguma página estiver malformada.
+    """
+    page_size = int(page_size or os.getenv("JOB_PAGE_SIZE", DEFAULT_PAGE_SIZE))
+    seen = set()
+    offset = 0
+    while True:
+        page_params = dict(params or {}, limit=page_size, offset=offset)
+        count = 0
+        new = 0
+        with api.get("Job", params=page_params, stream=True) as response:
+            response.raise_for_status()
+            # A leitura dos blocos conta como fetch e a decodificação dos Jobs como decode
+            chunks = iterate(count_bytes(response.iter_content(CHUNK_SIZE)), "fetch")
+            for job in iterate(iter_json_array(chunks, "jobs"), "decode"):
+                count += 1
+                summary = JobSummary.from_json(job.get("jobSummary", {}))
+                if summary.job_id in seen:
+                    continue
+                seen.add(summary.job_id)
+                new += 1
+                yield summary
+        # Uma página sem Jobs novos indica que o servidor ignorou limit/offset e repete a mesma página
+        if count < page_size or not new:
+            return
+        offset += page_size
+
+
+class JobWindow:
+    """Janela incremental de Jobs finalizados, persistida em um arquivo de estado local.
+
+    Guarda um cursor (maior jobEndTime e maior jobId já vistos) e um registro reduzido de cada Job
+    finalizado dentro da janela. A cada atualização apenas os Jobs finalizados após o cursor são
+    consultados na API; os registros que saem da janela são descartados. Periodicamente a janela
+    inteira é consultada novamente (ressincronização completa), por segurança.
+    """
+
+    def __init__(self, path, window, resync_interval=DEFAULT_RESYNC_INTERVAL):
+        self.path = path
+        self.window = int(window)
+        self.resync_interval = int(resync_interval)
+        self.state = load_state(path) or {}
+        self.state.setdefault("jobs", {})
+        self.state.setdefault("cursor", {"jobEndTime": 0, "jobId": 0})
+        self.state.setdefault("last_resync", 0)
+        self.state.setdefault("extra", {})
+
+    @property
+    def records(self):
+        """dict: jobId (str) -> registro de cada Job finalizado dentro da janela."""
+        return {job_id: entry["record"] for job_id, entry in self.state["jobs"].items()}
+
+    @property
+    def extra(self):
+        """dict: Dados do chamador persistidos junto com a janela (ex: contadores)."""
+        return self.state["extra"]
+
+    def update(self, api, params=None, project=None):
+        """Consulta os Jobs finalizados desde o cursor e atualiza a janela.
+
+        Args:
+            api (CommvaultClient): Cliente da API do Commvault.
+            params (dict, optional): Filtros adicionais da API de Jobs (ex: {"jobFilter": "backup"}).
+            project (callable, optional): Reduz o JobSummary ao registro guardado na janela (padrão:
+                JobSummary.as_dict()). Se retornar None o Job não é guardado, mas ainda avança o cursor.
+
+        Returns:
+            tuple: (resynced, added, evicted), onde resynced indica uma ressincronização completa
+            (o chamador deve descartar o que acumulou) e added/evicted são listas de registros
+            que entraram e saíram da janela.
+
+        Raises:
+            requests.exceptions.RequestException: Se a API não puder ser consultada.
+        """
+        now = time.time()
+        cursor = self.state["cursor"]
+        resynced = not cursor["jobEndTime"] or now - self.state["last_resync"] >= self.resync_interval
+        if resynced:
+            lookup = self.window
+            evicted = [entry["record"] for entry in self.state["jobs"].values()]
+            jobs = {}
+        else:
+            lookup = min(self.window, math.ceil(now - cursor["jobEndTime"]) + CURSOR_OVERLAP)
+            evicted = []
+            # Cópia, para que uma falha no meio da consulta não altere a janela atual
+            jobs = dict(self.state["jobs"])
+        new_cursor = dict(cursor)
+        added = []
+        filters = dict(params or {}, jobCategory="Finished", completedJobLookupTime=lookup)
+        for summary in iter_jobs(api, filters):
+            job_id = summary.job_id
+            end_time = summary.end_time
+            new_cursor["jobEndTime"] = max(new_cursor["jobEndTime"], end_time)
+            new_cursor["jobId"] = max(new_cursor["jobId"], job_id or 0)
+            if str(job_id) in jobs:
+                continue
+            record = project(summary) if project else summary.as_dict()
+            if record is None:
+                continue
+            jobs[str(job_id)] = {"end": end_time, "record": record}
+            added.append(record)
+        # Descarta os Jobs que saíram da janela
+        limit = now - self.window
+        for job_id in [job_id for job_id, entry in jobs.items() if entry["end"] < limit]:
+            evicted.append(jobs.pop(job_id)["record"])
+        self.state["jobs"] = jobs
+        self.state["cursor"] = new_cursor
+        if resynced:
+            self.state["last_resync"] = now
+        return resynced, added, evicted
+
+    def save(self):
+        """Grava a janela e o cursor no arquivo de estado."""
+        save_state(self.path, self.state)
@@ -0,0 +1,157 @@
+from array import array
+from collections import Counter
+from itertools import islice
+
+# Tempo de execução (segundos) a partir do qual um Job não concluído é considerado atrasado
+DELAYED_ELAPSED = 172800
+# Quantidade de Jobs convertidos para o formato colunar de cada vez
+CHUNK_SIZE = 4096
+# Percentis calculados sobre o tempo de execução dos Jobs
+PERCENTILES = (50, 90, 95, 99)
+
+# Campos de cada linha retornada por job_row(), na ordem em que são guardados
+ROW_FIELDS = ("status", "job_type", "client", "client_group", "media_agent", "storage_policy", "elapsed", "bytes")
+# Colunas categóricas, guardadas como códigos inteiros
+CATEGORIES = ROW_FIELDS[:6]
+
+
+def job_row(job):
+    """Reduz um Job aos campos utilizados nas métricas (veja ROW_FIELDS).
+
+    A linha é uma lista simples, adequada para ser guardada em arquivos de estado (ex: JobWindow).
+
+    Args:
+        job (JobSummary): O Job.
+
+    Returns:
+        list: [status, jobType, cliente, grupo de clientes, MediaAgent, storage policy, tempo de execução, bytes].
+    """
+    return [job.status, job.job_type, job.client, job.client_group, job.media_agent, job.storage_policy, job.elapsed, job.bytes]
+
+
+def percentile(values, pct):
+    """Percentil pelo método nearest-rank de uma sequência já ordenada (0 se vazia)."""
+    if not values:
+        return 0
+    rank = max(1, -(-len(values) * pct // 100))
+    return values[rank - 1]
+
+
+class JobColumns:
+    """Jobs decodificados em formato colunar, para agregação em uma única passada.
+
+    Cada campo categórico (status, tipo, cliente, grupo, MediaAgent, storage policy) é guardado como
+    um código inteiro em um array, com a tabela de nomes em labels; o tempo de execução e os bytes
+    são guardados em arrays de inteiros de 64 bits. Com 100 mil Jobs as colunas ocupam poucos MB, em
+    vez de manter os dicionários do jobSummary em memória.
+    """
+
+    def __init__(self):
+        self.labels = {name: [] for name in CATEGORIES}
+        self._codes = {name: {} for name in CATEGORIES}
+        self.columns = {name: array("I") for name in CATEGORIES}
+        self.columns["elapsed"] = array("q")
+        self.columns["bytes"] = array("q")
+
+    def __len__(self):
+        return len(self.columns["elapsed"])
+
+    def append_row(self, row):
+        """Adiciona um Job no formato retornado por job_row()."""
+        self.extend_rows([row])
+
+    def extend(self, jobs):
+        """Adiciona os Jobs (JobSummary) de um iterável."""
+        self.extend_rows(map(job_row, jobs))
+
+    def extend_rows(self, rows):
+        """Adiciona Jobs já reduzidos por job_row() (ex: registros de uma JobWindow).
+
+        As linhas são lidas em blocos de CHUNK_SIZE e cada bloco é convertido coluna a coluna.
+        """
+        rows = iter(rows)
+        while True:
+            chunk = list(islice(rows, CHUNK_SIZE))
+            if not chunk:
+                return
+            for name, values in zip(ROW_FIELDS, zip(*chunk)):
+                if name in self._codes:
+                    codes = self._codes[name]
+                    for value in set(values).difference(codes):
+                        codes[value] = len(codes)
+                        self.labels[name].append(value)
+                    self.columns[name].extend(map(codes.__getitem__, values))
+                else:
+                    self.columns[name].extend(values)
+
+    def count_by(self, *names):
+        """Conta os Jobs agrupados por uma ou mais colunas categóricas.
+
+        Args:
+            *names (str): Colunas de CATEGORIES (ex: "status", "job_type").
+
+        Returns:
+            dict: Tupla com os nomes de cada coluna -> quantidade de Jobs.
+        """
+        counts = Counter(zip(*(self.columns[name] for name in names)))
+        labels = [self.labels[name] for name in names]
+        return {
+            tuple(label[code] for label, code in zip(labels, key)): count
+            for key, count in counts.items()
+        }
+
+    def summary(self, delayed_elapsed=DELAYED_ELAPSED):
+        """Calcula todas as agregações dos Jobs.
+
+        Args:
+            delayed_elapsed (int): Tempo de execução (segundos) a partir do qual um Job não concluído é considerado atrasado.
+
+        Returns:
+            dict: Com as chaves:
+                - "total": Quantidade de Jobs.
+                - "status": status -> quantidade.
+                - "delayed": Jobs não concluídos com tempo de execução acima de delayed_elapsed.
+                - "elapsed": Percentis ("p50", "p90", ...) e máximo ("max") do tempo de execução.
+                - "breakdown": Lista de {"status", "jobType", "clientGroup", "count"}.
+                - "media_agents": Lista de {"mediaAgent", "jobs", "bytes", "elapsed", "throughput"},
+                  com a vazão em bytes por segundo de execução.
+        """
+        status = self.columns["status"]
+        elapsed = self.columns["elapsed"]
+        completed = self._codes["status"].get("Completed")
+        delayed = sum(1 for code, seconds in zip(status, elapsed) if seconds > delayed_elapsed and code != completed)
+
+        ordered = sorted(elapsed)
+        elapsed_stats = {f"p{pct}": percentile(ordered, pct) for pct in PERCENTILES}
+        elapsed_stats["max"] = ordered[-1] if ordered else 0
+
+        size = len(self.labels["media_agent"])
+        ma_jobs, ma_bytes, ma_elapsed = [0] * size, [0] * size, [0] * size
+        for code, seconds, transferred in zip(self.columns["media_agent"], elapsed, self.columns["bytes"]):
+            ma_jobs[code] += 1
+            ma_bytes[code] += transferred
+            ma_elapsed[code] += seconds
+        media_agents = [
+            {
+                "mediaAgent": name,
+                "jobs": ma_jobs[code],
+                "bytes": ma_bytes[code],
+                "elapsed": ma_elapsed[code],
+                "throughput": round(ma_bytes[code] / ma_elapsed[code], 2) if ma_elapsed[code] else 0,
+            }
+            for code, name in sorted(enumerate(self.labels["media_agent"]), key=lambda entry: str(entry[1]))
+            if name is not None
+        ]
+
+        breakdown = [
+            {"status": key[0], "jobType": key[1], "clientGroup": key[2], "count": count}
+            for key, count in sorted(self.count_by("status", "job_type", "client_group").items(), key=str)
+        ]
+        return {
+            "total": len(self),
+            "status": {key[0]: count for key, count in self.count_by("status").items()},
+            "delayed": delayed,
+            "elapsed": elapsed_stats,
+            "breakdown": breakdown,
+            "media_agents": media_agents,
+        }
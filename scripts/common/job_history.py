@@ -0,0 +1,242 @@
+import time
+import json
+import sqlite3
+
+# Status de Jobs considerados com falha e com sucesso nas taxas e no SLA
+FAILED_STATUSES = ("Failed", "Killed", "Failed to Start")
+SUCCESS_STATUSES = ("Completed", "Completed w/ one or more errors", "Completed w/ one or more warnings")
+# Retenção, em dias, dos Jobs e dos agregados por hora e por dia
+DEFAULT_RETENTION = {"jobs": 90, "hourly": 90, "daily": 730}
+# Janela, em dias, dos clientes considerados no SLA e na taxa de falha por cliente
+CLIENT_WINDOW_DAYS = 30
+# Limites da lista de clientes das tendências, enviada como um único valor de texto (o Zabbix aceita até 64 KB)
+DEFAULT_MAX_CLIENTS = 200
+MAX_CLIENTS_BYTES = 60000
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    job_id INTEGER PRIMARY KEY,
+    end_time INTEGER NOT NULL,
+    status TEXT,
+    job_type TEXT,
+    client TEXT,
+    client_group TEXT,
+    media_agent TEXT,
+    storage_policy TEXT,
+    elapsed INTEGER NOT NULL,
+    bytes INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS jobs_end_time ON jobs (end_time);
+CREATE INDEX IF NOT EXISTS jobs_client ON jobs (client, end_time);
+CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, end_time);
+CREATE INDEX IF NOT EXISTS jobs_job_type ON jobs (job_type, end_time);
+"""
+
+ROLLUP_SCHEMA = """
+CREATE TABLE IF NOT EXISTS {table} (
+    bucket INTEGER NOT NULL,
+    client TEXT NOT NULL,
+    job_type TEXT NOT NULL,
+    status TEXT NOT NULL,
+    jobs INTEGER NOT NULL,
+    failed INTEGER NOT NULL,
+    succeeded INTEGER NOT NULL,
+    elapsed INTEGER NOT NULL,
+    bytes INTEGER NOT NULL,
+    PRIMARY KEY (bucket, client, job_type, status)
+);
+"""
+
+# Tabela de agregados -> tamanho do intervalo (segundos)
+ROLLUPS = {"hourly": 3600, "daily": 86400}
+
+
+def history_row(job):
+    """Reduz um Job finalizado a uma linha da tabela jobs, ou None se o Job não terminou.
+
+    Args:
+        job (JobSummary): O Job.
+
+    Returns:
+        tuple: (job_id, end_time, status, job_type, client, client_group, media_agent, storage_policy, elapsed, bytes).
+    """
+    if not job.end_time or job.job_id is None:
+        return None
+    return (int(job.job_id), job.end_time, job.status, job.job_type, job.client, job.client_group,
+            job.media_agent, job.storage_policy, job.elapsed, job.bytes)
+
+
+def _rate(failed, total):
+    return round(100.0 * failed / total, 2) if total else 0.0
+
+
+def _limit_json(entries, max_bytes):
+    """Mantém as primeiras entradas da lista cujo JSON cabe em max_bytes bytes."""
+    size = 2
+    for count, entry in enumerate(entries):
+        size += len(json.dumps(entry)) + 2
+        if size > max_bytes:
+            return entries[:count]
+    return entries
+
+
+class JobHistory:
+    """Histórico local de Jobs finalizados em SQLite, para métricas de tendência sem consultar a API.
+
+    Cada Job finalizado é gravado uma única vez (pelo jobId) na tabela jobs, indexada por horário de
+    término, cliente, status e tipo de Job. Na mesma transação são atualizados os agregados por hora
+    (hourly) e por dia (daily), por cliente, tipo de Job e status, de forma que as taxas de falha de
+    vários dias são calculadas sobre algumas centenas de linhas. Os dados mais antigos que a retenção
+    de cada tabela são descartados em prune().
+
+    A conexão só pode ser utilizada pela thread que abriu o histórico; utilize um histórico por execução.
+    """
+
+    def __init__(self, path, retention=None):
+        self.path = path
+        self.retention = dict(DEFAULT_RETENTION, **(retention or {}))
+        self.db = sqlite3.connect(path)
+        self.db.executescript(SCHEMA + "".join(ROLLUP_SCHEMA.format(table=table) for table in ROLLUPS))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *_):
+        self.close()
+
+    def close(self):
+        self.db.commit()
+        self.db.close()
+
+    def add(self, rows):
+        """Grava Jobs finalizados e atualiza os agregados. Jobs já gravados são ignorados.
+
+        Args:
+            rows (iterable): Linhas retornadas por history_row() (None é ignorado).
+
+        Returns:
+            int: Quantidade de Jobs novos.
+        """
+        added = 0
+        with self.db:
+            for row in rows:
+                if row is None:
+                    continue
+                cursor = self.db.execute("INSERT OR IGNORE INTO jobs VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", row)
+                if not cursor.rowcount:
+                    continue
+                added += 1
+                _, end_time, status, job_type, client, _, _, _, elapsed, size = row
+                failed = int(status in FAILED_STATUSES)
+                succeeded = int(status in SUCCESS_STATUSES)
+                for table, size_seconds in ROLLUPS.items():
+                    self.db.execute(
+                        f"INSERT INTO {table} VALUES (?, ?, ?, ?, 1, ?, ?, ?, ?) "
+                        "ON CONFLICT (bucket, client, job_type, status) DO UPDATE SET "
+                        "jobs = jobs + 1, failed = failed + excluded.failed, succeeded = succeeded + excluded.succeeded, "
+                        "elapsed = elapsed + excluded.elapsed, bytes = bytes + excluded.bytes",
+                        (end_time - end_time % size_seconds, client or "", job_type or "", status or "",
+                         failed, succeeded, elapsed, size),
+                    )
+        return added
+
+    def prune(self, now=None):
+        """Remove os Jobs e os agregados mais antigos que a retenção de cada tabela."""
+        now = int(now or time.time())
+        with self.db:
+            self.db.execute("DELETE FROM jobs WHERE end_time < ?", (now - self.retention["jobs"] * 86400,))
+            for table in ROLLUPS:
+                self.db.execute(f"DELETE FROM {table} WHERE bucket < ?", (now - self.retention[table] * 86400,))
+
+    def failure_rate(self, days, client=None, job_type=None, now=None):
+        """Taxa de falha (%) dos Jobs finalizados nos últimos days dias, a partir dos agregados por hora.
+
+        Args:
+            days (float): Tamanho da janela, em dias.
+            client (str, optional): Restringe a um cliente.
+            job_type (str, optional): Restringe a um tipo de Job (ex: "Backup").
+
+        Returns:
+            tuple: (taxa de falha em %, quantidade de Jobs, quantidade de Jobs com falha).
+        """
+        now = int(now or time.time())
+        query = "SELECT COALESCE(SUM(jobs), 0), COALESCE(SUM(failed), 0) FROM hourly WHERE bucket >= ?"
+        params = [now - int(days * 86400)]
+        if client is not None:
+            query += " AND client = ?"
+            params.append(client)
+        if job_type is not None:
+            query += " AND job_type = ?"
+            params.append(job_type)
+        jobs, failed = self.db.execute(query, params).fetchone()
+        return _rate(failed, jobs), jobs, failed
+
+    def client_stats(self, days=CLIENT_WINDOW_DAYS, now=None):
+        """Jobs, falhas e último backup com sucesso de cada cliente nos últimos days dias.
+
+        Returns:
+            list: Um dicionário {"client", "jobs", "failed", "failureRate", "lastSuccess"} por cliente,
+            ordenado pelo nome. lastSuccess é o término (epoch) do último backup com sucesso, ou 0.
+        """
+        now = int(now or time.time())
+        since = now - int(days * 86400)
+        placeholders = ", ".join("?" for _ in SUCCESS_STATUSES)
+        last_success = dict(self.db.execute(
+            f"SELECT client, MAX(end_time) FROM jobs WHERE end_time >= ? AND job_type = 'Backup' "
+            f"AND status IN ({placeholders}) GROUP BY client",
+            [since, *SUCCESS_STATUSES],
+        ))
+        rows = self.db.execute(
+            "SELECT client, SUM(jobs), SUM(failed) FROM daily WHERE bucket >= ? AND client != '' GROUP BY client ORDER BY client",
+            (since - since % 86400,),
+        )
+        return [
+            {"client": client, "jobs": jobs, "failed": failed, "failureRate": _rate(failed, jobs),
+             "lastSuccess": last_success.get(client) or 0}
+            for client, jobs, failed in rows
+        ]
+
+    def trends(self, sla_hours=24, now=None, max_clients=DEFAULT_MAX_CLIENTS):
+        """Calcula as métricas de tendência do histórico.
+
+        O SLA considera os clientes com Jobs de backup nos últimos CLIENT_WINDOW_DAYS dias: um cliente
+        está dentro do SLA se teve um backup com sucesso nas últimas sla_hours horas. A lista de
+        clientes contém apenas os que precisam de atenção (fora do SLA ou com falhas), os fora do SLA
+        primeiro e em seguida pela taxa de falha, limitada a max_clients clientes e a MAX_CLIENTS_BYTES
+        bytes em JSON.
+
+        Returns:
+            dict: failure_rate_24h e failure_rate_7d (%), jobs_24h e jobs_7d, sla_compliance (% de
+            clientes dentro do SLA), sla_missed (clientes fora do SLA), clients (client_stats() dos
+            clientes que precisam de atenção, com "slaMissed") e clients_attention (quantidade desses
+            clientes, antes do limite).
+        """
+        now = int(now or time.time())
+        rate_24h, jobs_24h, _ = self.failure_rate(1, now=now)
+        rate_7d, jobs_7d, _ = self.failure_rate(7, now=now)
+        # Mesma janela de client_stats(), alinhada ao início do dia como os buckets diários
+        since = now - int(CLIENT_WINDOW_DAYS * 86400)
+        backup_clients = {client for (client,) in self.db.execute(
+            "SELECT DISTINCT client FROM daily WHERE bucket >= ? AND job_type = 'Backup' AND client != ''",
+            (since - since % 86400,),
+        )}
+        deadline = now - sla_hours * 3600
+        attention = []
+        missed = 0
+        for entry in self.client_stats(now=now):
+            entry["slaMissed"] = entry["client"] in backup_clients and entry["lastSuccess"] < deadline
+            missed += entry["slaMissed"]
+            if entry["slaMissed"] or entry["failed"]:
+                attention.append(entry)
+        attention.sort(key=lambda entry: (not entry["slaMissed"], -entry["failureRate"], -entry["failed"], entry["client"]))
+        return {
+            "failure_rate_24h": rate_24h,
+            "failure_rate_7d": rate_7d,
+            "jobs_24h": jobs_24h,
+            "jobs_7d": jobs_7d,
+            "sla_compliance": round(100.0 * (len(backup_clients) - missed) / len(backup_clients), 2) if backup_clients else 100.0,
+            "sla_missed": missed,
+            "clients": _limit_json(attention[:max(0, max_clients)], MAX_CLIENTS_BYTES),
+            "clients_attention": len(attention),
+        }
+
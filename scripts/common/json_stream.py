@@ -0,0 +1,129 @@
+import json
+import codecs
+
+WHITESPACE = " \t\n\r"
+
+
+class JsonStreamError(ValueError):
+    """O conteúdo recebido não é o JSON esperado."""
+
+
+def _chunks_to_text(chunks):
+    decoder = codecs.getincrementaldecoder("utf-8")()
+    for chunk in chunks:
+        text = decoder.decode(chunk) if isinstance(chunk, bytes) else chunk
+        if text:
+            yield text
+    tail = decoder.decode(b"", final=True)
+    if tail:
+        yield tail
+
+
+class _Buffer:
+    """Janela de texto sobre o fluxo de chunks, descartando o que já foi consumido."""
+
+    def __init__(self, chunks):
+        self.chunks = _chunks_to_text(chunks)
+        self.text = ""
+        self.pos = 0
+        self.eof = False
+
+    def fill(self):
+        if self.eof:
+            return False
+        chunk = next(self.chunks, None)
+        if chunk is None:
+            self.eof = True
+            return False
+        self.text = self.text[self.pos:] + chunk
+        self.pos = 0
+        return True
+
+    def peek(self):
+        """Retorna o próximo caractere que não seja espaço, lendo mais dados se necessário."""
+        while True:
+            while self.pos < len(self.text) and self.text[self.pos] in WHITESPACE:
+                self.pos += 1
+            if self.pos < len(self.text):
+                return self.text[self.pos]
+            if not self.fill():
+                return None
+
+
+def _find_array(buffer, key):
+    """Avança o buffer até o início do array da chave informada no objeto raiz."""
+    depth = 0
+    in_string = False
+    escape = False
+    name = []
+    while True:
+        if buffer.pos >= len(buffer.text) and not buffer.fill():
+            return False
+        char = buffer.text[buffer.pos]
+        buffer.pos += 1
+        if in_string:
+            if escape:
+                escape = False
+            elif char == "\\":
+                escape = True
+            elif char == '"':
+                in_string = False
+                if depth == 1 and "".join(name) == key and buffer.peek() == ":":
+                    buffer.pos += 1
+                    if buffer.peek() == "[":
+                        buffer.pos += 1
+                        return True
+                name = []
+                continue
+            if depth == 1:
+                name.append(char)
+            continue
+        if char == '"':
+            in_string = True
+        elif char in "{[":
+            depth += 1
+        elif char in "}]":
+            depth -= 1
+
+
+def iter_json_array(chunks, key):
+    """Decodifica de forma incremental os elementos de um array de primeiro nível de um documento JSON.
+
+    Apenas um elemento por vez é mantido em memória, o que permite processar respostas grandes da
+    API (ex: a lista "jobs" de /Job) sem carregar o documento inteiro.
+
+    Args:
+        chunks (iterable): Partes do corpo da resposta (bytes ou str), ex: response.iter_content().
+        key (str): Chave do objeto raiz que contém o array (ex: "jobs").
+
+    Yields:
+        any: Cada elemento do array, já decodificado.
+
+    Raises:
+        JsonStreamError: Se o documento estiver truncado ou malformado.
+    """
+    decoder = json.JSONDecoder()
+    buffer = _Buffer(chunks)
+    if not _find_array(buffer, key):
+        return
+    while True:
+        char = buffer.peek()
+        if char is None:
+            raise JsonStreamError(f"Array '{key}' truncado.")
+        if char == "]":
+            return
+        if char == ",":
+            buffer.pos += 1
+            continue
+        while True:
+            try:
+                value, end = decoder.raw_decode(buffer.text, buffer.pos)
+                # Um valor que termina no fim do buffer pode estar incompleto (ex: número)
+                if end < len(buffer.text) or buffer.eof:
+                    break
+            except json.JSONDecodeError as e:
+                if buffer.eof:
+                    raise JsonStreamError(f"JSON inválido no array '{key}': {e}") from e
+            buffer.fill()
+        buffer.pos = end
+        yield value
@@ -0,0 +1,56 @@
+import os
+import sys
+import json
+import tempfile
+
+
+def state_dir():
+    """Retorna o diretório dos arquivos de estado locais, criando-o se necessário.
+
+    Utiliza STATE_DIR ou, se não definido, o subdiretório "state" ao lado do script em execução.
+    """
+    path = os.getenv("STATE_DIR") or os.path.join(os.path.dirname(os.path.abspath(sys.argv[0])), "state")
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def state_path(name):
+    """Retorna o caminho de um arquivo de estado (ex: state_path("jobs.json"))."""
+    return os.path.join(state_dir(), name)
+
+
+def load_state(path, default=None):
+    """Carrega um arquivo de estado JSON.
+
+    Args:
+        path (str): Caminho do arquivo.
+        default (any): Valor retornado se o arquivo não existir ou estiver corrompido.
+
+    Returns:
+        any: Conteúdo do arquivo decodificado.
+    """
+    try:
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return default
+    except (OSError, ValueError) as e:
+        print(f"Arquivo de estado {path} ignorado: {e}")
+        return default
+
+
+def save_state(path, data):
+    """Grava um arquivo de estado JSON de forma atômica (arquivo temporário + rename).
+
+    Uma execução interrompida no meio da gravação nunca deixa o arquivo corrompido.
+    """
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".tmp-", suffix=".json")
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(data, f, separators=(",", ":"))
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
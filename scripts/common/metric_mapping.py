@@ -0,0 +1,208 @@
+import json
+import string
+import requests
+from run_metrics import phase, record, report_error
+
+
+class MappingError(ValueError):
+    """Mapeamento de métricas inválido."""
+
+
+def compile_path(path):
+    """Compila um caminho pontuado (ex: "commcell.commCellName" ou "clientGroups.0.clientGroupName").
+
+    Segmentos numéricos são índices de listas. Um segmento vazio ("") retorna o próprio objeto.
+
+    Returns:
+        callable: Função objeto -> valor no caminho, ou None se algum segmento não existir.
+    """
+    steps = tuple(int(step) if step.isdigit() else step for step in path.split(".") if step)
+    if not steps:
+        return lambda data: data
+    if len(steps) == 1:
+        step = steps[0]
+
+        def get(data):
+            try:
+                return data[step]
+            except (KeyError, IndexError, TypeError):
+                return None
+        return get
+
+    def get(data):
+        try:
+            for step in steps:
+                data = data[step]
+            return data
+        except (KeyError, IndexError, TypeError):
+            return None
+    return get
+
+
+def compile_template(template, fields):
+    """Compila um modelo com referências aos campos extraídos (ex: "status.ma[{name}]").
+
+    Um modelo sem referências (ex: "key.commCellName") é retornado sem alteração.
+
+    Args:
+        template (str): Modelo no formato de str.format().
+        fields (iterable): Campos disponíveis.
+
+    Returns:
+        callable: Função campos extraídos (dict) -> texto.
+
+    Raises:
+        MappingError: Se o modelo referenciar um campo inexistente.
+    """
+    try:
+        names = {name for _, name, _, _ in string.Formatter().parse(template) if name is not None}
+    except ValueError as e:
+        raise MappingError(f"Modelo '{template}' inválido: {e}") from e
+    missing = names - set(fields)
+    if missing:
+        raise MappingError(f"Campos não definidos no modelo '{template}': {', '.join(sorted(missing))}")
+    if not names:
+        return lambda values: template
+    return lambda values: template.format_map(values)
+
+
+def compile_value(value, fields):
+    """Compila o valor de uma métrica: o nome de um campo (valor sem conversão) ou um modelo (veja compile_template())."""
+    if value in fields:
+        return lambda values: values[value]
+    if "{" not in value:
+        raise MappingError(f"Campo '{value}' não definido")
+    return compile_template(value, fields)
+
+
+class EndpointExtractor:
+    """Mapeamentos compilados de um endpoint, aplicados a uma única resposta em uma única passada.
+
+    Cada grupo de registros (caminho "records" da resposta) extrai uma vez cada caminho utilizado
+    pelos mapeamentos e gera as chaves e valores de cada mapeamento a partir dos seus próprios
+    campos; mapeamentos diferentes podem usar o mesmo nome de campo para caminhos diferentes.
+    """
+
+    def __init__(self, endpoint, params=None):
+        self.endpoint = endpoint
+        self.params = params or None
+        # caminho dos registros -> [obter registros, {caminho: obter valor}, [({campo: caminho}, [(chave, valor)])]]
+        self.groups = {}
+
+    def add(self, entry):
+        """Compila um mapeamento do arquivo (veja compile_mappings())."""
+        records = entry.get("records", "")
+        fields = entry.get("fields") or {}
+        if (not isinstance(records, str) or not isinstance(fields, dict)
+                or not all(isinstance(path, str) for path in fields.values())):
+            raise MappingError(f"Os caminhos de 'records' e 'fields' devem ser textos no endpoint {self.endpoint}")
+        fields = dict(fields)
+        group = self.groups.setdefault(records, [compile_path(records), {}, []])
+        for path in fields.values():
+            if path not in group[1]:
+                group[1][path] = compile_path(path)
+        # Os campos de outros mapeamentos do mesmo grupo não podem ser referenciados
+        available = set(fields)
+        metrics = entry.get("metrics") or []
+        if not metrics:
+            raise MappingError(f"Nenhuma métrica definida para o endpoint {self.endpoint}")
+        compiled = []
+        for metric in metrics:
+            if "key" not in metric or "value" not in metric:
+                raise MappingError(f"Métrica sem 'key' ou 'value' no endpoint {self.endpoint}")
+            if not isinstance(metric["key"], str) or not isinstance(metric["value"], str):
+                raise MappingError(f"'key' e 'value' devem ser textos no endpoint {self.endpoint}: {metric}")
+            compiled.append((compile_template(metric["key"], available), compile_value(metric["value"], available)))
+        group[2].append((fields, compiled))
+
+    def extract(self, document):
+        """Gera (chave, valor) de todos os mapeamentos a partir da resposta decodificada."""
+        for get_records, paths, mappings in self.groups.values():
+            records = get_records(document)
+            if records is None:
+                continue
+            if not isinstance(records, list):
+                records = [records]
+            for item in records:
+                extracted = {path: get(item) for path, get in paths.items()}
+                for fields, metrics in mappings:
+                    values = {name: extracted[path] for name, path in fields.items()}
+                    for key, value in metrics:
+                        yield key(values), value(values)
+
+
+def compile_mappings(entries):
+    """Compila mapeamentos declarativos de métricas em extratores, agrupados por endpoint.
+
+    Cada mapeamento é um dicionário com:
+        - "endpoint": Endpoint da API do Commvault (ex: "V4/mediaAgent").
+        - "params" (opcional): Parâmetros da consulta.
+        - "records" (opcional): Caminho da lista de registros na resposta (ex: "mediaAgents"). Sem
+          ele a resposta inteira é um único registro.
+        - "fields": Campo -> caminho pontuado dentro de cada registro (ex: {"name": "displayName"}).
+        - "metrics": Lista de {"key": modelo da chave, "value": campo ou modelo do valor}, ex:
+          {"key": "status.ma[{name}]", "value": "status"}.
+
+    Mapeamentos do mesmo endpoint e parâmetros compartilham uma única consulta.
+
+    Returns:
+        list: Lista de EndpointExtractor.
+
+    Raises:
+        MappingError: Se algum mapeamento for inválido.
+    """
+    extractors = {}
+    for entry in entries:
+        if not entry.get("endpoint"):
+            raise MappingError("Mapeamento sem 'endpoint'")
+        params = entry.get("params") or {}
+        key = (entry["endpoint"], tuple(sorted(params.items())))
+        if key not in extractors:
+            extractors[key] = EndpointExtractor(entry["endpoint"], params)
+        extractors[key].add(entry)
+    return list(extractors.values())
+
+
+def load_mappings(path):
+    """Lê e compila um arquivo JSON com uma lista de mapeamentos (veja compile_mappings()).
+
+    Raises:
+        OSError: Se o arquivo não puder ser lido.
+        MappingError: Se o arquivo ou algum mapeamento for inválido.
+    """
+    with open(path, encoding="utf-8") as f:
+        try:
+            entries = json.load(f)
+        except ValueError as e:
+            raise MappingError(f"Arquivo de mapeamentos {path} inválido: {e}") from e
+    if not isinstance(entries, list):
+        raise MappingError(f"Arquivo de mapeamentos {path} deve conter uma lista")
+    return compile_mappings(entries)
+
+
+def extract_metrics(api, extractors, label=""):
+    """Consulta cada endpoint uma única vez e extrai as métricas de todos os mapeamentos.
+
+    As respostas são obtidas pelo cache de respostas do cliente (get_cached()), compartilhado com os
+    demais coletores. Um endpoint com erro é informado e os demais continuam sendo consultados. O
+    tempo de extração é contabilizado na fase transform e a quantidade de valores em mapped_values.
+
+    Args:
+        api (CommvaultClient): Cliente da API do Commvault.
+        extractors (list): Extratores retornados por compile_mappings().
+        label (str): Prefixo das mensagens de erro (ex: target.label).
+
+    Returns:
+        dict: Chave do Zabbix -> valor.
+    """
+    metrics = {}
+    for extractor in extractors:
+        try:
+            document = api.get_cached(extractor.endpoint, params=extractor.params)
+        except requests.exceptions.RequestException as e:
+            report_error(f"{label}Erro ao consultar {extractor.endpoint}: {e}")
+            continue
+        with phase("transform"):
+            metrics.update(extractor.extract(document))
+    record("mapped_values", len(metrics))
+    return metrics
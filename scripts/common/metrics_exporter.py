@@ -0,0 +1,154 @@
+import re
+import time
+import threading
+from collections import namedtuple
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+NAME_PATTERN = re.compile(r"[^a-zA-Z0-9_:]")
+
+Sample = namedtuple("Sample", ["name", "labels", "value", "help", "type"])
+
+
+def sample(name, value, help=None, type="gauge", **labels):
+    """Monta uma amostra no formato de exposição do Prometheus.
+
+    Args:
+        name (str): Nome da métrica (caracteres inválidos são trocados por "_").
+        value (int or float): Valor da amostra.
+        help (str, optional): Descrição da métrica (# HELP).
+        type (str): Tipo da métrica (# TYPE), padrão "gauge".
+        **labels: Labels da amostra. Labels com valor None são omitidos.
+
+    Returns:
+        Sample: Amostra para MetricsSnapshot.publish().
+    """
+    return Sample(NAME_PATTERN.sub("_", name), {key: str(value) for key, value in labels.items() if value is not None}, value, help, type)
+
+
+def _escape(value):
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_value(value):
+    if isinstance(value, bool):
+        return "1" if value else "0"
+    if isinstance(value, float):
+        return repr(value) if value == value and abs(value) != float("inf") else ("NaN" if value != value else ("+Inf" if value > 0 else "-Inf"))
+    return str(value)
+
+
+class MetricsSnapshot:
+    """Última leitura publicada por cada coletor, pronta para ser servida no formato do Prometheus.
+
+    Cada origem (ex: "get-jobs@cs01") substitui por completo as suas amostras a cada publish(). O texto
+    de exposição é gerado no momento da publicação, pela thread do coletor, e guardado em memória:
+    uma leitura (render()) apenas retorna os bytes já prontos, sem consultar a API do Commvault.
+    Enquanto nenhum MetricsServer estiver ativo (ex: coletores executados pelo cron) as amostras são
+    apenas guardadas, sem gerar o texto.
+    """
+
+    def __init__(self):
+        self._groups = {}
+        self._lock = threading.Lock()
+        self._rendered = b""
+        self._active = False
+        self.updated = 0.0
+
+    def activate(self):
+        """Passa a gerar o texto de exposição a cada publicação (chamado pelo MetricsServer)."""
+        with self._lock:
+            self._active = True
+            self._rendered = self._render()
+
+    def publish(self, source, samples, **labels):
+        """Substitui as amostras de uma origem.
+
+        Args:
+            source (str): Identificador da origem (coletor e CommCell).
+            samples (iterable): Amostras montadas com sample().
+            **labels: Labels adicionados a todas as amostras (ex: commcell="cs01").
+        """
+        samples = [item._replace(labels=dict(labels, **item.labels)) for item in samples]
+        with self._lock:
+            self._groups[source] = samples
+            self.updated = time.time()
+            if self._active:
+                self._rendered = self._render()
+
+    def render(self):
+        """Retorna o texto de exposição da última publicação."""
+        return self._rendered
+
+    def _render(self):
+        metrics = {}
+        for samples in self._groups.values():
+            for item in samples:
+                metrics.setdefault(item.name, []).append(item)
+        lines = []
+        for name in sorted(metrics):
+            first = metrics[name][0]
+            if first.help:
+                lines.append(f"# HELP {name} {_escape(first.help)}")
+            lines.append(f"# TYPE {name} {first.type}")
+            for item in metrics[name]:
+                labels = ",".join(f'{key}="{_escape(value)}"' for key, value in sorted(item.labels.items()))
+                lines.append(f"{name}{{{labels}}} {_format_value(item.value)}" if labels else f"{name} {_format_value(item.value)}")
+        return ("\n".join(lines) + "\n").encode("utf-8") if lines else b""
+
+
+class MetricsServer:
+    """Servidor HTTP do endpoint /metrics, executado em uma thread em segundo plano."""
+
+    def __init__(self, snapshot, address="0.0.0.0", port=9658):
+        self.snapshot = snapshot
+        snapshot.activate()
+        self._server = ThreadingHTTPServer((address, int(port)), self._handler())
+        self._server.daemon_threads = True
+
+    @property
+    def address(self):
+        return self._server.server_address[:2]
+
+    def start(self):
+        threading.Thread(target=self._server.serve_forever, name="metrics-server", daemon=True).start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def _handler(self):
+        snapshot = self.snapshot
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *_):
+                pass
+
+            def do_GET(self):
+                if self.path.split("?")[0] != "/metrics":
+                    self.send_response(404)
+                    self.send_header("Content-Length", "0")
+                    self.end_headers()
+                    return
+                body = snapshot.render()
+                self.send_response(200)
+                self.send_header("Content-Type", CONTENT_TYPE)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+        return Handler
+
+
+_default_snapshot = MetricsSnapshot()
+
+
+def default_snapshot():
+    """Retorna o snapshot compartilhado por todos os coletores do processo."""
+    return _default_snapshot
+
+
+def publish(source, samples, **labels):
+    """Publica amostras no snapshot do processo. Veja MetricsSnapshot.publish()."""
+    _default_snapshot.publish(source, samples, **labels)
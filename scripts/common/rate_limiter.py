@@ -0,0 +1,27 @@
+import time
+import threading
+
+
+class RateLimiter:
+    """Limita a taxa de chamadas (requisições por segundo) entre várias threads.
+
+    Cada chamada a acquire() reserva o próximo intervalo livre e aguarda até ele, espaçando as
+    requisições de forma uniforme. Uma taxa menor ou igual a zero desativa o limite.
+    """
+
+    def __init__(self, rate):
+        self.rate = float(rate or 0)
+        self._next = 0.0
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """Bloqueia até que uma nova chamada seja permitida."""
+        if self.rate <= 0:
+            return
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next)
+            self._next = slot + 1.0 / self.rate
+        delay = slot - now
+        if delay > 0:
+            time.sleep(delay)
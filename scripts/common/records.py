@@ -0,0 +1,128 @@
+import json
+
+try:
+    import orjson # type: ignore
+except ImportError:
+    orjson = None
+
+# Biblioteca utilizada por loads(): orjson quando instalada, senão o módulo json da biblioteca padrão
+JSON_BACKEND = "orjson" if orjson is not None else "json"
+
+
+def loads(data):
+    """Decodifica um documento JSON com a biblioteca mais rápida disponível.
+
+    Args:
+        data (bytes or str): Documento JSON, ex: response.content. Com bytes a decodificação é feita
+            direto do UTF-8, sem a detecção de charset de response.json().
+
+    Returns:
+        any: O documento decodificado.
+
+    Raises:
+        ValueError: Se o documento não for um JSON válido.
+    """
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+class Record:
+    """Registro com campos fixos (__slots__), extraído de um objeto da API do Commvault.
+
+    Cada subclasse declara em __slots__ apenas os campos utilizados pelos coletores e os extrai em
+    from_json(); o dicionário original pode ser descartado logo após a extração. Sem o __dict__ por
+    instância, cada registro ocupa uma fração da memória do objeto decodificado.
+    """
+
+    __slots__ = ()
+
+    def __init__(self, *values):
+        for name, value in zip(self.__slots__, values):
+            setattr(self, name, value)
+
+    def as_dict(self):
+        """Retorna os campos do registro em um dicionário (ex: para gravar em arquivos de estado)."""
+        return {name: getattr(self, name) for name in self.__slots__}
+
+    def __eq__(self, other):
+        return type(other) is type(self) and all(getattr(self, name) == getattr(other, name) for name in self.__slots__)
+
+    def __repr__(self):
+        fields = ", ".join(f"{name}={getattr(self, name)!r}" for name in self.__slots__)
+        return f"{type(self).__name__}({fields})"
+
+
+class JobSummary(Record):
+    """Campos do jobSummary utilizados pelos coletores de Jobs."""
+
+    __slots__ = ("job_id", "status", "localized_status", "job_type", "backup_level", "client", "instance",
+                 "client_group", "media_agent", "storage_policy", "elapsed", "bytes", "start_time", "end_time",
+                 "pending_reason")
+
+    @classmethod
+    def from_json(cls, summary):
+        """Extrai os campos de um jobSummary (ou de um registro parcial gravado por versões anteriores)."""
+        subclient = summary.get("subclient") or {}
+        groups = summary.get("clientGroups") or []
+        return cls(
+            summary.get("jobId"),
+            summary.get("status"),
+            summary.get("localizedStatus", ""),
+            summary.get("jobType"),
+            summary.get("backupLevelName"),
+            subclient.get("clientName"),
+            subclient.get("instanceName"),
+            groups[0].get("clientGroupName") if groups else None,
+            (summary.get("mediaAgent") or {}).get("mediaAgentName"),
+            (summary.get("storagePolicy") or {}).get("storagePolicyName"),
+            int(summary.get("jobElapsedTime") or 0),
+            int(summary.get("sizeOfApplication") or 0),
+            int(summary.get("jobStartTime") or 0),
+            int(summary.get("jobEndTime") or 0),
+            summary.get("pendingReason"),
+        )
+
+
+class MediaAgent(Record):
+    """Nome e status de um MediaAgent (lista mediaAgents de V4/mediaAgent)."""
+
+    __slots__ = ("name", "status")
+
+    @classmethod
+    def from_json(cls, entry):
+        return cls(entry["displayName"], entry.get("status"))
+
+
+class Library(Record):
+    """Library de armazenamento: ID e nome (lista de Library) e as métricas do magLibSummary (detalhes)."""
+
+    __slots__ = ("library_id", "name", "summary")
+
+    @classmethod
+    def from_entity(cls, entry):
+        """Extrai o ID e o nome de um elemento da lista "response" de Library."""
+        entity = entry["entityInfo"]
+        return cls(entity["id"], entity["name"], None)
+
+    @classmethod
+    def from_details(cls, data, library_id=None):
+        """Extrai o nome e o magLibSummary da resposta de Library/<id>."""
+        info = data["libraryInfo"]
+        return cls(library_id, info["library"]["libraryName"], info["magLibSummary"])
+
+
+class Client(Record):
+    """Identificação de um cliente (lista clientProperties de Client)."""
+
+    __slots__ = ("client_id", "name", "host_name", "client_type")
+
+    @classmethod
+    def from_json(cls, entry):
+        entity = entry["client"]["clientEntity"]
+        return cls(entity["clientId"], entity.get("clientName"), entity.get("hostName"), entity.get("_type_"))
+
+
+def decode_records(items, convert):
+    """Converte uma lista de objetos da API em registros (ex: convert=MediaAgent.from_json)."""
+    return [convert(item) for item in items or []]
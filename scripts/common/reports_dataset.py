@@ -0,0 +1,128 @@
+import os
+
+# Linhas solicitadas por página ao consultar um dataset
+DEFAULT_PAGE_SIZE = 1000
+
+
+class DatasetError(ValueError):
+    """A resposta do dataset não tem as colunas solicitadas."""
+
+
+def dataset_endpoint(dataset_id):
+    """Endpoint de dados de um dataset do Reports Plus."""
+    return f"cr/reportsplusengine/datasets/{dataset_id}/data"
+
+
+def column_positions(columns, fields=None, defaults=None, width=None):
+    """Mapeia o nome de cada coluna para a sua posição nas linhas ("records") da resposta.
+
+    Args:
+        columns (list): Lista "columns" da resposta; cada coluna é identificada pelo "name" ou pelo "dataField".
+            None se a resposta não tiver a lista.
+        fields (list, optional): Colunas desejadas. Padrão: todas as colunas da resposta.
+        defaults (dict, optional): Posição utilizada para as colunas de fields cujo nome não está na resposta.
+        width (int, optional): Quantidade de valores em cada linha, utilizada para validar as posições de
+            defaults quando a resposta não tem a lista "columns".
+
+    Returns:
+        dict: Nome da coluna -> posição, na ordem de fields.
+
+    Raises:
+        DatasetError: Se alguma das colunas de fields não estiver na resposta nem em defaults, ou se a
+            resposta não tiver a lista "columns" e as colunas não puderem ser localizadas por defaults.
+    """
+    if columns is None:
+        if not fields or not defaults:
+            raise DatasetError("A resposta do dataset não tem a lista de colunas (columns)")
+        columns = []
+    else:
+        width = len(columns)
+    positions = {}
+    for position, column in enumerate(columns):
+        for name in (column.get("name"), column.get("dataField")):
+            if name is not None:
+                positions.setdefault(name, position)
+    if not fields:
+        return {column.get("name") or column.get("dataField"): position for position, column in enumerate(columns)}
+    defaults = defaults or {}
+    for name in fields:
+        if name not in positions and defaults.get(name) is not None and (width is None or defaults[name] < width):
+            positions[name] = defaults[name]
+    missing = [name for name in fields if name not in positions]
+    if missing:
+        raise DatasetError(f"Colunas ausentes no dataset: {', '.join(missing)}")
+    return {name: positions[name] for name in fields}
+
+
+def iter_dataset(api, dataset_id, fields=None, parameters=None, filter=None, order_by=None, where=None,
+                 page_size=None, cache=True, defaults=None):
+    """Consulta um dataset do Reports Plus página por página e retorna cada linha como um dicionário.
+
+    Apenas as colunas de fields são solicitadas ao servidor (fields=[Coluna],...) e as linhas são
+    lidas com limit/offset, de modo que a memória utilizada não cresce com o tamanho do dataset. As
+    colunas são localizadas pelo nome na lista "columns" da resposta, e não pela posição, que muda
+    conforme a versão do relatório e a projeção.
+
+    Args:
+        api (CommvaultClient): Cliente da API do Commvault.
+        dataset_id (str): GUID do dataset.
+        fields (list, optional): Colunas retornadas. Padrão: todas.
+        parameters (dict, optional): Parâmetros do dataset (ex: {"commUniId": 10000}), enviados como parameter.<nome>.
+        filter (str, optional): Filtro de linhas aplicado pelo servidor, na sintaxe do Reports Plus.
+        order_by (str, optional): Coluna de ordenação, para uma paginação estável.
+        where (callable, optional): Filtro aplicado a cada linha já mapeada, para condições que o servidor não aplica.
+        page_size (int, optional): Linhas por página. Padrão: DATASET_PAGE_SIZE ou 1000.
+        cache (bool): Permite ao servidor responder com o resultado em cache do dataset (padrão True).
+        defaults (dict, optional): Posição de cada coluna de fields na linha completa (ex: {"Status": 1}).
+            As colunas continuam projetadas pelo nome; só se a resposta não tiver esses nomes a consulta é
+            refeita sem projeção e as colunas são lidas nessas posições.
+
+    Yields:
+        dict: Nome da coluna -> valor, para cada linha.
+
+    Raises:
+        requests.exceptions.RequestException: Se alguma página não puder ser consultada.
+        DatasetError: Se a resposta não tiver alguma das colunas de fields (nem a posição em defaults)
+            ou não tiver a lista "columns" necessária para localizá-las.
+    """
+    page_size = int(page_size or os.getenv("DATASET_PAGE_SIZE", DEFAULT_PAGE_SIZE))
+    params = {"cache": "true" if cache else "false"}
+    params.update({f"parameter.{name}": value for name, value in (parameters or {}).items()})
+    if fields:
+        params["fields"] = ",".join(f"[{name}]" for name in fields)
+    if filter:
+        params["filter"] = filter
+    if order_by:
+        params["orderby"] = f"[{order_by}]"
+    positions = None
+    offset = 0
+    previous = None
+    while True:
+        data = api.get_json(dataset_endpoint(dataset_id), params=dict(params, limit=page_size, offset=offset))
+        records = data.get("records") or []
+        # A mesma página repetida indica que o servidor ignorou limit/offset (e não informou o total)
+        if records and records == previous:
+            return
+        previous = records
+        if positions is None and records:
+            projected = "fields" in params
+            try:
+                # Com projeção as posições de defaults (da linha completa) não se aplicam
+                positions = column_positions(data.get("columns"), fields, None if projected else defaults,
+                                             len(records[0]))
+            except DatasetError:
+                if not (projected and defaults):
+                    raise
+                # Os nomes do servidor não correspondem a fields: refaz a consulta sem projeção
+                del params["fields"]
+                previous = None
+                continue
+        for record in records:
+            row = {name: record[position] for name, position in positions.items()}
+            if where is None or where(row):
+                yield row
+        offset += len(records)
+        total = data.get("totalRecordCount")
+        # Uma página diferente de page_size é a última (ou o servidor ignorou a paginação)
+        if len(records) != page_size or (total is not None and offset >= int(total)):
+            return
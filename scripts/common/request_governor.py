@@ -0,0 +1,136 @@
+import os
+import time
+import threading
+from contextlib import contextmanager
+from rate_limiter import RateLimiter
+
+# Limite inicial, mínimo e máximo de requisições simultâneas por CommServe (o máximo padrão é o
+# tamanho padrão do pool de conexões do CommvaultClient)
+DEFAULT_INITIAL_LIMIT = 4
+DEFAULT_MIN_LIMIT = 1
+DEFAULT_MAX_LIMIT = 10
+# Fator de redução do limite ao detectar sobrecarga (decremento multiplicativo)
+DEFAULT_DECREASE_FACTOR = 0.5
+# Uma resposta é considerada lenta acima de LATENCY_FACTOR x a latência habitual do endpoint,
+# desde que acima de MIN_SLOW_LATENCY segundos
+DEFAULT_LATENCY_FACTOR = 3.0
+DEFAULT_MIN_SLOW_LATENCY = 1.0
+# Peso de cada resposta na latência habitual (média móvel exponencial) de um endpoint
+BASELINE_WEIGHT = 0.1
+# Status HTTP que indicam sobrecarga do servidor
+OVERLOAD_STATUS = (429, 500, 502, 503, 504)
+
+
+class RequestGovernor:
+    """Controle adaptativo das requisições simultâneas a um CommServe (AIMD).
+
+    Cada requisição aguarda uma vaga (slot()) enquanto houver limit requisições em andamento e,
+    com um limite de requisições por segundo configurado, o próximo intervalo do RateLimiter. O
+    limite cresce de forma aditiva (cerca de +1 a cada limit respostas rápidas) até max_limit e é
+    reduzido de forma multiplicativa quando o servidor dá sinais de sobrecarga: status 429/5xx,
+    falha de conexão ou latência muito acima da habitual do endpoint. Reduções seguidas só são
+    aplicadas após as requisições em andamento no momento da última redução terminarem, de forma
+    que uma rajada de respostas lentas conta como um único sinal. Assim a coleta usa toda a
+    capacidade do CommServe quando ele está ocioso e recua automaticamente na janela de backup.
+    """
+
+    def __init__(self, initial_limit=DEFAULT_INITIAL_LIMIT, min_limit=DEFAULT_MIN_LIMIT, max_limit=DEFAULT_MAX_LIMIT,
+                 rate=0, decrease_factor=DEFAULT_DECREASE_FACTOR, latency_factor=DEFAULT_LATENCY_FACTOR,
+                 min_slow_latency=DEFAULT_MIN_SLOW_LATENCY):
+        self.min_limit = max(1, int(min_limit))
+        self.max_limit = max(self.min_limit, int(max_limit))
+        self.limit = float(min(self.max_limit, max(self.min_limit, int(initial_limit))))
+        self.decrease_factor = float(decrease_factor)
+        self.latency_factor = float(latency_factor)
+        self.min_slow_latency = float(min_slow_latency)
+        self.limiter = RateLimiter(rate)
+        self.in_flight = 0
+        self.waiting = 0
+        self.requests = 0
+        self.throttled = 0
+        self.wait_seconds = 0.0
+        self._baselines = {}
+        self._started = 0
+        self._recovery_until = 0
+        self._cond = threading.Condition()
+
+    @classmethod
+    def from_env(cls):
+        """Cria o controle a partir de COMMVAULT_MAX_CONCURRENCY, COMMVAULT_MIN_CONCURRENCY,
+        COMMVAULT_INITIAL_CONCURRENCY, COMMVAULT_RATE_LIMIT e COMMVAULT_SLOW_LATENCY."""
+        return cls(
+            initial_limit=os.getenv("COMMVAULT_INITIAL_CONCURRENCY", DEFAULT_INITIAL_LIMIT),
+            min_limit=os.getenv("COMMVAULT_MIN_CONCURRENCY", DEFAULT_MIN_LIMIT),
+            max_limit=os.getenv("COMMVAULT_MAX_CONCURRENCY", DEFAULT_MAX_LIMIT),
+            rate=os.getenv("COMMVAULT_RATE_LIMIT", 0),
+            min_slow_latency=os.getenv("COMMVAULT_SLOW_LATENCY", DEFAULT_MIN_SLOW_LATENCY),
+        )
+
+    def set_rate(self, rate):
+        """Altera o limite de requisições por segundo (0 desativa o limite)."""
+        self.limiter = RateLimiter(rate)
+
+    @contextmanager
+    def slot(self, endpoint):
+        """Aguarda uma vaga para uma requisição ao endpoint e registra o resultado ao final.
+
+        O bloco recebe um dicionário em que a requisição informa o status HTTP da resposta
+        (outcome["status"]). Uma exceção no bloco é tratada como falha de conexão.
+
+        Yields:
+            dict: Resultado da requisição, preenchido pelo chamador.
+        """
+        start = time.monotonic()
+        with self._cond:
+            self.waiting += 1
+            while self.in_flight >= int(self.limit):
+                self._cond.wait()
+            self.waiting -= 1
+            self.in_flight += 1
+            self._started += 1
+            sequence = self._started
+        self.limiter.acquire()
+        began = time.monotonic()
+        outcome = {"status": None}
+        failed = True
+        try:
+            yield outcome
+            failed = False
+        finally:
+            self._release(endpoint, sequence, time.monotonic() - began, began - start, outcome["status"], failed)
+
+    def _release(self, endpoint, sequence, latency, waited, status, failed):
+        with self._cond:
+            self.in_flight -= 1
+            self.requests += 1
+            self.wait_seconds += waited
+            baseline = self._baselines.get(endpoint)
+            slow = baseline is not None and latency > max(self.min_slow_latency, baseline * self.latency_factor)
+            if failed or status in OVERLOAD_STATUS or slow:
+                # Requisições iniciadas antes da última redução não reduzem o limite novamente
+                if sequence > self._recovery_until:
+                    self.limit = max(self.min_limit, self.limit * self.decrease_factor)
+                    self._recovery_until = self._started
+                    self.throttled += 1
+            else:
+                self.limit = min(self.max_limit, self.limit + 1.0 / self.limit)
+            if not failed and status is not None and status < 400:
+                self._baselines[endpoint] = latency if baseline is None else baseline + BASELINE_WEIGHT * (latency - baseline)
+            self._cond.notify_all()
+
+    def stats(self):
+        """Retorna o estado atual do controle.
+
+        Returns:
+            dict: limit (requisições simultâneas permitidas), in_flight, waiting (requisições na
+            fila), requests, throttled (reduções do limite) e wait_seconds (tempo total na fila).
+        """
+        with self._cond:
+            return {
+                "limit": int(self.limit),
+                "in_flight": self.in_flight,
+                "waiting": self.waiting,
+                "requests": self.requests,
+                "throttled": self.throttled,
+                "wait_seconds": round(self.wait_seconds, 3),
+            }
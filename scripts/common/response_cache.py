@@ -0,0 +1,166 @@
+import os
+import time
+import atexit
+import threading
+from collections import OrderedDict
+from local_state import load_state, save_state
+
+DEFAULT_TTL = 60
+DEFAULT_MAX_ENTRIES = 256
+# Intervalo mínimo, em segundos, entre gravações do arquivo do cache
+DEFAULT_SAVE_INTERVAL = 5
+
+
+def parse_ttls(value):
+    """Converte "CommServ=300,V4/mediaAgent=60" em um dicionário endpoint -> TTL (segundos)."""
+    ttls = {}
+    for entry in (value or "").split(","):
+        name, _, ttl = entry.strip().rpartition("=")
+        if name:
+            ttls[name.strip("/")] = float(ttl)
+    return ttls
+
+
+class ResponseCache:
+    """Cache de respostas da API com TTL por endpoint, limite de tamanho (LRU) e persistência opcional.
+
+    Uma mesma resposta é reaproveitada por todos os consumidores enquanto estiver dentro do seu
+    prazo de validade. Chamadas simultâneas para a mesma chave aguardam a primeira consulta em vez
+    de repeti-la; o lock da chave existe apenas enquanto houver chamadas aguardando por ela. Os
+    valores retornados são compartilhados e não devem ser alterados pelo chamador. Com arquivo, as
+    entradas novas são gravadas no máximo a cada save_interval segundos e ao encerrar o processo.
+    """
+
+    def __init__(self, ttls=None, default_ttl=DEFAULT_TTL, max_entries=DEFAULT_MAX_ENTRIES, path=None,
+                 save_interval=DEFAULT_SAVE_INTERVAL):
+        self.ttls = ttls or {}
+        self.default_ttl = float(default_ttl)
+        self.max_entries = max(1, int(max_entries))
+        self.path = path
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()
+        self.save_interval = float(save_interval)
+        self._lock = threading.Lock()
+        # chave -> [lock, chamadas usando o lock]
+        self._key_locks = {}
+        self._save_lock = threading.Lock()
+        self._dirty = False
+        self._saved_at = None
+        if path:
+            for key, (expires, value) in (load_state(path) or {}).items():
+                if expires > time.time():
+                    self._entries[key] = (expires, value)
+            atexit.register(self.flush)
+
+    @classmethod
+    def from_env(cls, name=None):
+        """Cria o cache a partir de CACHE_TTLS, CACHE_DEFAULT_TTL, CACHE_MAX_ENTRIES e CACHE_FILE.
+
+        Args:
+            name (str, optional): Nome do CommCell. Se informado, é acrescentado ao nome do
+                CACHE_FILE (ex: cache-cs01.json), para que cada CommCell tenha o seu arquivo.
+
+        Returns:
+            ResponseCache: Cache configurado, ou None se CACHE_DEFAULT_TTL for 0 e não houver CACHE_TTLS.
+        """
+        ttls = parse_ttls(os.getenv("CACHE_TTLS"))
+        default_ttl = float(os.getenv("CACHE_DEFAULT_TTL", DEFAULT_TTL))
+        if default_ttl <= 0 and not ttls:
+            return None
+        path = os.getenv("CACHE_FILE") or None
+        if path and name:
+            base, ext = os.path.splitext(path)
+            path = f"{base}-{name}{ext}"
+        return cls(
+            ttls=ttls,
+            default_ttl=default_ttl,
+            max_entries=os.getenv("CACHE_MAX_ENTRIES", DEFAULT_MAX_ENTRIES),
+            path=path,
+        )
+
+    def ttl_for(self, group):
+        """Retorna o TTL do endpoint (ex: "Library/{id}"), ou o TTL padrão."""
+        return self.ttls.get(group, self.default_ttl)
+
+    def get_or_load(self, key, group, loader):
+        """Retorna o valor em cache ou executa loader() e guarda o resultado.
+
+        Args:
+            key (str): Chave da resposta (endpoint + parâmetros).
+            group (str): Endpoint normalizado, utilizado para escolher o TTL.
+            loader (callable): Função que consulta a API. Exceções não são guardadas em cache.
+
+        Returns:
+            any: Valor em cache ou retornado por loader().
+        """
+        ttl = self.ttl_for(group)
+        if ttl <= 0:
+            return loader()
+        with self._lock:
+            key_lock = self._key_locks.setdefault(key, [threading.Lock(), 0])
+            key_lock[1] += 1
+        try:
+            with key_lock[0]:
+                with self._lock:
+                    entry = self._entries.get(key)
+                    if entry and entry[0] > time.time():
+                        self._entries.move_to_end(key)
+                        self.hits += 1
+                        return entry[1]
+                    self.misses += 1
+                value = loader()
+                with self._lock:
+                    self._entries[key] = (time.time() + ttl, value)
+                    self._entries.move_to_end(key)
+                    while len(self._entries) > self.max_entries:
+                        self._entries.popitem(last=False)
+                        self.evictions += 1
+                    self._dirty = True
+        finally:
+            with self._lock:
+                key_lock[1] -= 1
+                if not key_lock[1]:
+                    del self._key_locks[key]
+        if self.path and (self._saved_at is None or time.monotonic() - self._saved_at >= self.save_interval):
+            self.flush()
+        return value
+
+    def flush(self):
+        """Grava o cache no arquivo, se houver alterações desde a última gravação."""
+        if not self.path:
+            return
+        with self._save_lock:
+            with self._lock:
+                if not self._dirty:
+                    return
+                entries = dict(self._entries)
+                self._dirty = False
+            self._saved_at = time.monotonic()
+            save_state(self.path, entries)
+
+    def invalidate(self, key=None):
+        """Remove uma chave do cache, ou todas se key for None."""
+        with self._lock:
+            if key is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(key, None)
+            self._dirty = True
+
+    def stats(self):
+        """Retorna os contadores do cache.
+
+        Returns:
+            dict: hits, misses, evictions, entries e hit_ratio.
+        """
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "entries": len(self._entries),
+                "hit_ratio": self.hits / total if total else 0.0,
+            }
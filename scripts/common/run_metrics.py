@@ -0,0 +1,187 @@
+import time
+import threading
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+# Fases de uma execução de coletor
+PHASES = ("fetch", "decode", "transform", "send")
+
+_current = ContextVar("run_metrics", default=None)
+
+
+class RunMetrics:
+    """Instrumentação de uma execução de coletor.
+
+    Registra o tempo de cada fase (fetch, decode, transform e send), a latência e os bytes das
+    requisições por endpoint e contadores (itens enviados, erros). As fases podem ser aninhadas: o
+    tempo de uma fase interna é descontado da externa, de forma que a soma das fases nunca passa da
+    duração da execução. As fases são medidas apenas na thread que iniciou a execução; requisições
+    feitas em threads auxiliares entram na latência por endpoint, mas não nas fases.
+    """
+
+    def __init__(self, collector, target=None):
+        self.collector = collector
+        self.target = target
+        self.started = time.time()
+        self.duration = None
+        self.phases = dict.fromkeys(PHASES, 0.0)
+        self.counters = {"requests": 0, "http_bytes": 0, "items": 0, "errors": 0}
+        self.endpoints = {}
+        self._start = time.perf_counter()
+        self._owner = threading.get_ident()
+        self._stack = []
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def phase(self, name):
+        """Contabiliza o tempo do bloco na fase name, descontando-o da fase externa em andamento."""
+        if threading.get_ident() != self._owner:
+            yield
+            return
+        self._enter(name)
+        try:
+            yield
+        finally:
+            self._exit()
+
+    def _enter(self, name):
+        now = time.perf_counter()
+        if self._stack:
+            outer = self._stack[-1]
+            self.phases[outer[0]] += now - outer[1]
+        self._stack.append([name, now])
+
+    def _exit(self):
+        now = time.perf_counter()
+        name, start = self._stack.pop()
+        self.phases[name] = self.phases.get(name, 0.0) + now - start
+        if self._stack:
+            self._stack[-1][1] = now
+
+    def add(self, name, value=1):
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def record_request(self, endpoint, seconds, size=0):
+        """Registra uma requisição à API (endpoint normalizado, duração e bytes da resposta)."""
+        with self._lock:
+            stats = self.endpoints.setdefault(endpoint, {"count": 0, "total": 0.0, "max": 0.0})
+            stats["count"] += 1
+            stats["total"] += seconds
+            stats["max"] = max(stats["max"], seconds)
+            self.counters["requests"] += 1
+            self.counters["http_bytes"] += size
+
+    def finish(self):
+        self.duration = time.perf_counter() - self._start
+
+    def summary(self):
+        """Retorna a execução em um dicionário serializável (utilizado no log JSON).
+
+        Returns:
+            dict: collector, started, duration, phases (segundos por fase, com "other" para o tempo
+            fora das fases), contadores e endpoints ({"count", "avg", "max"} em segundos).
+        """
+        duration = self.duration if self.duration is not None else time.perf_counter() - self._start
+        phases = {name: round(seconds, 4) for name, seconds in self.phases.items()}
+        phases["other"] = round(max(0.0, duration - sum(self.phases.values())), 4)
+        with self._lock:
+            endpoints = {
+                name: {"count": stats["count"], "avg": round(stats["total"] / stats["count"], 4), "max": round(stats["max"], 4)}
+                for name, stats in self.endpoints.items()
+            }
+            counters = dict(self.counters)
+        return dict(
+            collector=self.collector,
+            started=int(self.started),
+            duration=round(duration, 4),
+            phases=phases,
+            endpoints=endpoints,
+            **counters,
+        )
+
+
+def current_run():
+    """Retorna a execução instrumentada em andamento no contexto atual, ou None."""
+    return _current.get()
+
+
+@contextmanager
+def collector_run(collector, target=None):
+    """Inicia a instrumentação de uma execução de coletor no contexto atual.
+
+    Yields:
+        RunMetrics: Métricas da execução, finalizadas ao sair do bloco.
+    """
+    metrics = RunMetrics(collector, target)
+    token = _current.set(metrics)
+    try:
+        yield metrics
+    finally:
+        metrics.finish()
+        _current.reset(token)
+
+
+@contextmanager
+def phase(name):
+    """Contabiliza o bloco na fase name da execução em andamento (sem efeito fora de uma execução)."""
+    metrics = _current.get()
+    if metrics is None:
+        yield
+        return
+    with metrics.phase(name):
+        yield
+
+
+def iterate(iterable, name):
+    """Contabiliza na fase name o tempo de obter cada elemento de um iterável (ex: um gerador)."""
+    metrics = _current.get()
+    if metrics is None:
+        return iterable
+    return _timed(metrics, iter(iterable), name)
+
+
+def _timed(metrics, iterator, name):
+    if threading.get_ident() != metrics._owner:
+        yield from iterator
+        return
+    while True:
+        metrics._enter(name)
+        try:
+            value = next(iterator)
+        except StopIteration:
+            return
+        finally:
+            metrics._exit()
+        yield value
+
+
+def record(name, value=1):
+    """Soma value ao contador name da execução em andamento."""
+    metrics = _current.get()
+    if metrics is not None:
+        metrics.add(name, value)
+
+
+def count_bytes(chunks):
+    """Soma o tamanho de cada bloco de uma resposta lida em streaming aos bytes da execução em andamento."""
+    metrics = _current.get()
+    if metrics is None:
+        yield from chunks
+        return
+    for chunk in chunks:
+        metrics.add("http_bytes", len(chunk))
+        yield chunk
+
+
+def record_request(endpoint, seconds, size=0):
+    """Registra uma requisição à API na execução em andamento."""
+    metrics = _current.get()
+    if metrics is not None:
+        metrics.record_request(endpoint, seconds, size)
+
+
+def report_error(message):
+    """Imprime uma mensagem de erro e a contabiliza na execução em andamento."""
+    print(message)
+    record("errors")
@@ -0,0 +1,121 @@
+import os
+import json
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from commvault_api import CommvaultClient, default_client
+
+# Quantidade máxima de CommCells consultados em paralelo
+DEFAULT_TARGET_WORKERS = 8
+
+
+class Target:
+    """Um CommCell monitorado: cliente da API próprio e o host correspondente no Zabbix.
+
+    Cada alvo possui a sua sessão HTTP, pool de conexões, cache de respostas e estado local, de
+    forma que um CommServe lento ou fora do ar não afeta a coleta dos demais.
+    """
+
+    def __init__(self, name, api, zabbix_host, default=False):
+        self.name = name
+        self.api = api
+        self.zabbix_host = zabbix_host
+        self.default = default
+        self._components = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_config(cls, entry):
+        """Cria um alvo a partir de uma entrada do arquivo TARGETS_FILE.
+
+        Args:
+            entry (dict): Entrada com as chaves "name", "server", "zabbix_host" e "token" ou
+                "token_env" (nome da variável de ambiente que contém o token).
+
+        Returns:
+            Target: Alvo configurado.
+
+        Raises:
+            ValueError: Se alguma chave obrigatória estiver ausente.
+        """
+        missing = [key for key in ("name", "server", "zabbix_host") if not entry.get(key)]
+        if missing:
+            raise ValueError(f"Alvo {entry.get('name', '?')} sem as chaves: {', '.join(missing)}")
+        token = entry.get("token") or os.getenv(entry.get("token_env", ""))
+        if not token:
+            raise ValueError(f"Alvo {entry['name']} sem token (token ou token_env)")
+        api = CommvaultClient.from_env(server=entry["server"], token=token, name=entry["name"])
+        return cls(entry["name"], api, entry["zabbix_host"])
+
+    @property
+    def label(self):
+        """Prefixo das mensagens do alvo (ex: "[cs01] "), vazio para o alvo padrão."""
+        return "" if self.default else f"[{self.name}] "
+
+    def state_name(self, name):
+        """Nome do estado local de um coletor para este alvo (ex: "get-jobs-cs01").
+
+        O alvo padrão (configuração única do .env) mantém os nomes originais dos arquivos de estado.
+        """
+        return name if self.default else f"{name}-{self.name}"
+
+    def component(self, key, factory):
+        """Retorna um objeto do alvo (ex: DeltaFilter de um coletor), criado por factory() na primeira chamada."""
+        with self._lock:
+            if key not in self._components:
+                self._components[key] = factory()
+            return self._components[key]
+
+
+_targets = None
+_targets_lock = threading.Lock()
+
+
+def load_targets():
+    """Retorna os CommCells monitorados pelo processo.
+
+    Com TARGETS_FILE definido, os alvos são lidos do arquivo JSON (uma lista de entradas, veja
+    Target.from_config()). Caso contrário é utilizado um único alvo a partir de COMMVAULT_SERVER,
+    API_TOKEN e ZABBIX_HOST.
+
+    Returns:
+        list: Lista de Target, criada uma única vez por processo.
+
+    Raises:
+        ValueError: Se o arquivo de alvos for inválido.
+    """
+    global _targets
+    with _targets_lock:
+        if _targets is None:
+            path = os.getenv("TARGETS_FILE")
+            if path:
+                with open(path, encoding="utf-8") as f:
+                    _targets = [Target.from_config(entry) for entry in json.load(f)]
+                if not _targets:
+                    raise ValueError(f"Nenhum alvo configurado em {path}")
+            else:
+                _targets = [Target("default", default_client(), os.getenv("ZABBIX_HOST"), default=True)]
+        return _targets
+
+
+def run_for_targets(func, targets=None):
+    """Executa func(target) para cada CommCell, em paralelo e com isolamento por alvo.
+
+    Uma exceção em um alvo é impressa com o nome do alvo e não interrompe os demais. Com um único
+    alvo a função é executada diretamente, sem thread adicional.
+
+    Args:
+        func (callable): Função de coleta que recebe um Target.
+        targets (list, optional): Alvos a executar. Se omitido, utiliza load_targets().
+    """
+    targets = targets if targets is not None else load_targets()
+    if len(targets) == 1:
+        func(targets[0])
+        return
+    workers = min(len(targets), int(os.getenv("TARGET_WORKERS", DEFAULT_TARGET_WORKERS)))
+    with ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="target") as executor:
+        futures = {executor.submit(func, target): target for target in targets}
+        for future in as_completed(futures):
+            try:
+                future.result()
+            except Exception as e:
+                print(f"[{futures[future].name}] Erro na coleta: {e!r}")
@@ -1,75 +1,324 @@
 import os
+import sys
 import csv
+import json
+import time
+import sqlite3
+import hashlib
+import argparse
+import importlib.util
+from contextlib import closing
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
 from dotenv import load_dotenv # type: ignore
 import requests
 import urllib3
+# Shared modules (scripts/common)
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "common"))
+from commvault_api import default_client
+from records import Client
 urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
 
 load_dotenv()
-COMMVAULT_SERVER = os.getenv("COMMVAULT_SERVER")
-API_TOKEN = os.getenv("API_TOKEN")
 
-payload={}
-headers = {
-    'Authtoken': API_TOKEN,
-    'Content-Type': 'application/json',
-    'Accept': 'application/json'
-}
+# Commvault API client (pooled session with timeouts, retries and adaptive concurrency limit)
+api = default_client()
 
-url = f'{COMMVAULT_SERVER}/commandcenter/api/Client'
+endpoint = 'Client'
+
+# Exported columns: header -> dotted path inside clientProperties[0]
+DEFAULT_FIELDS = "ClientName=client.displayName,InstallDirectory=client.installDirectory"
+# Client inventory cache, refreshed incrementally between runs
+DEFAULT_CACHE_FILE = "clients_cache.sqlite"
+# Unchanged clients are refreshed after 30 days, at most DEFAULT_REFRESH_LIMIT per run
+DEFAULT_MAX_AGE = 30 * 86400
+DEFAULT_REFRESH_LIMIT = 50
+# Cache entries written between commits
+COMMIT_EVERY = 100
 
 def get_clients():
-    """Retrieves a list of client IDs from a remote server.
+    """Retrieves the list of clients from the Commvault API with a change marker for each one.
     
-    This function sends a GET request to a specified URL to fetch client data. It filters the clients based on their type and returns a list of client IDs that do not have a type of 106. In case of a request error, it prints an error message and returns an empty list.
+    This function sends a GET request to the Client endpoint to fetch client data. It filters out the clients with a type of 106. The change marker of each client is a hash of its entry in the list, so a client whose summary (name, host, version, ...) changes gets a new marker. In case of a request error, it prints an error message and returns None, so an unavailable list is not mistaken for a CommCell without clients.
     
     Returns:
-        list: A list of client IDs that meet the filtering criteria. If an error occurs during the request, an empty list is returned.
-    
-    Raises:
-        requests.exceptions.RequestException: If there is an issue with the HTTP request.
+        dict: Client ID -> change marker for the clients that meet the filtering criteria, or None if the list could not be retrieved.
     """
     try:
-        response = requests.request("GET", url, headers=headers, data=payload, verify=False)
-        response = response.json()
-        filtered_clients = [
-            client["client"]["clientEntity"]["clientId"]
-            for client in response["clientProperties"]
-            if client["client"]["clientEntity"]["_type_"] != 106
-        ]
+        response = api.get_json(endpoint)
+        filtered_clients = {}
+        for entry in response["clientProperties"]:
+            client = Client.from_json(entry)
+            if client.client_type != 106:
+                filtered_clients[client.client_id] = client_marker(entry)
         return filtered_clients
     except requests.exceptions.RequestException as e:
         print(f"Error in searching clients: {e}")
-        return []
+        return None
+
+def client_marker(entry):
+    """Returns the change marker of a client: a hash of its entry in the client list."""
+    return hashlib.sha1(json.dumps(entry, sort_keys=True, separators=(",", ":")).encode("utf-8")).hexdigest()
 
-def get_configs(filtered_clients):
-    """Retrieves client configurations for a list of filtered clients and saves the information to a CSV file.
+class ClientCache:
+    """On-disk inventory of the client properties, keyed by clientId (SQLite).
+    
+    Each entry stores the properties fetched from Client/{id} (clientProperties[0]), the change marker of the client when it was fetched and the fetch time. The cache is only written from the thread that created it.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.db = sqlite3.connect(path)
+        self.db.execute(
+            "CREATE TABLE IF NOT EXISTS clients ("
+            "client_id INTEGER PRIMARY KEY, marker TEXT NOT NULL, fetched REAL NOT NULL, properties TEXT NOT NULL)"
+        )
+
+    def markers(self):
+        """Returns client ID -> (change marker, fetch time) for every cached client."""
+        return {row[0]: (row[1], row[2]) for row in self.db.execute("SELECT client_id, marker, fetched FROM clients")}
+
+    def store(self, client_id, marker, properties):
+        self.db.execute(
+            "INSERT OR REPLACE INTO clients (client_id, marker, fetched, properties) VALUES (?, ?, ?, ?)",
+            (client_id, marker, time.time(), json.dumps(properties, separators=(",", ":"))),
+        )
+
+    def remove(self, client_ids):
+        self.db.executemany("DELETE FROM clients WHERE client_id = ?", [(client_id,) for client_id in client_ids])
+
+    def properties(self):
+        """Yields (client ID, properties) for every cached client, ordered by client ID."""
+        for client_id, properties in self.db.execute("SELECT client_id, properties FROM clients ORDER BY client_id"):
+            yield client_id, json.loads(properties)
+
+    def commit(self):
+        self.db.commit()
+
+    def close(self):
+        self.db.commit()
+        self.db.close()
+
+def plan_fetch(clients, cached, full=False, max_age=DEFAULT_MAX_AGE, refresh_limit=DEFAULT_REFRESH_LIMIT):
+    """Selects the clients that need to be fetched again.
+    
+    Args:
+        clients (dict): Client ID -> change marker returned by get_clients().
+        cached (dict): Client ID -> (change marker, fetch time) returned by ClientCache.markers().
+        full (bool): Fetch every client, ignoring the cache.
+        max_age (float): Age, in seconds, after which an unchanged client is refreshed anyway.
+        refresh_limit (int): Maximum number of unchanged clients refreshed per run (oldest first).
+    
+    Returns:
+        tuple: (client IDs to fetch, client IDs to remove from the cache).
+    """
+    removed = [client_id for client_id in cached if client_id not in clients]
+    if full:
+        return list(clients), removed
+    changed = [client_id for client_id, marker in clients.items() if cached.get(client_id, (None,))[0] != marker]
+    deadline = time.time() - max_age
+    stale = sorted(
+        (fetched, client_id) for client_id, (marker, fetched) in cached.items()
+        if client_id in clients and clients[client_id] == marker and fetched < deadline
+    )
+    return changed + [client_id for _, client_id in stale[:max(0, refresh_limit)]], removed
+
+def parse_fields(fields):
+    """Parses the list of client properties to export.
     
     Args:
-        filtered_clients (list): A list of client IDs for which the configurations are to be retrieved.
+        fields (str): Comma-separated list of "Header=dotted.path" or "dotted.path" entries, where the path is relative to clientProperties[0] (e.g. "client.versionInfo.version").
     
     Returns:
-        None
+        list: A list of (header, path) tuples.
+    """
+    parsed = []
+    for field in fields.split(","):
+        field = field.strip()
+        if not field:
+            continue
+        header, _, path = field.rpartition("=")
+        parsed.append((header or path, path))
+    return parsed
+
+def get_field(properties, path):
+    """Returns the value of a dotted path inside the client properties, or "N/A" if it does not exist."""
+    value = properties
+    for part in path.split("."):
+        if not isinstance(value, dict) or part not in value:
+            return "N/A"
+        value = value[part]
+    return value
+
+def get_client_properties(client_id):
+    """Retrieves the configuration of a single client.
+    
+    Args:
+        client_id (int): The client ID.
+    
+    Returns:
+        dict: The client properties (clientProperties[0]).
     
     Raises:
         requests.exceptions.RequestException: If there is an error during the HTTP request.
-        KeyError: If the expected keys are not found in the response JSON.
+    """
+    return api.get_json(f"{endpoint}/{client_id}")["clientProperties"][0]
+
+def fetch_clients(cache, clients, to_fetch, workers=8):
+    """Fetches the properties of the given clients in parallel and stores them in the cache.
+    
+    At most workers * 4 requests are queued at a time and each response is stored as soon as it arrives, 
+    so an interrupted run keeps everything fetched so far. A client that cannot be fetched keeps its previous 
+    cache entry (and marker), so it is fetched again in the next run.
+    
+    Args:
+        cache (ClientCache): The client inventory cache.
+        clients (dict): Client ID -> change marker returned by get_clients().
+        to_fetch (list): Client IDs to fetch.
+        workers (int): Number of clients fetched in parallel.
+    
+    Returns:
+        int: Number of clients that could not be fetched.
+    """
+    pending = iter(to_fetch)
+    errors = 0
+    stored = 0
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+        in_flight = {}
+        while True:
+            while len(in_flight) < max(1, workers) * 4:
+                client_id = next(pending, None)
+                if client_id is None:
+                    break
+                in_flight[executor.submit(get_client_properties, client_id)] = client_id
+            if not in_flight:
+                break
+            finished, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+            for future in finished:
+                client_id = in_flight.pop(future)
+                try:
+                    cache.store(client_id, clients[client_id], future.result())
+                except (requests.exceptions.RequestException, KeyError, IndexError, ValueError) as e:
+                    print(f"Error in searching client {client_id}: {e}")
+                    errors += 1
+                    continue
+                stored += 1
+                if stored % COMMIT_EVERY == 0:
+                    cache.commit()
+    cache.commit()
+    return errors
+
+def export_rows(cache, clients, fields, counter=None):
+    """Yields the exported row of every current client found in the cache, ordered by client ID.
     
-    The function makes a GET request to retrieve details for each client ID, extracts the client name and install directory, 
-    and writes this information to a CSV file named 'clients_info.csv'.
+    If counter is a list, its first element is incremented for every row yielded.
     """
-    client_info_list = []
-    for client_id in filtered_clients:
-        response = requests.get(f"{url}/{client_id}", headers=headers, data=payload, verify=False)
-        client_details = response.json()
-        client_name = client_details["clientProperties"][0]["client"].get("displayName")
-        install_directory = client_details["clientProperties"][0]["client"].get("installDirectory", "N/A")
-        client_info_list.append([client_name, install_directory])
-    with open("clients_info.csv", "w", newline="") as csvfile:
+    for client_id, properties in cache.properties():
+        if client_id in clients:
+            if counter is not None:
+                counter[0] += 1
+            yield [get_field(properties, path) for _, path in fields]
+
+def export_csv(rows, headers, output):
+    with open(output, "w", newline="") as csvfile:
         csv_writer = csv.writer(csvfile)
-        csv_writer.writerow(["ClientName", "InstallDirectory"])
-        csv_writer.writerows(client_info_list)
+        csv_writer.writerow(headers)
+        csv_writer.writerows(rows)
+
+def export_sqlite(rows, headers, output):
+    """Writes the rows to the "clients" table of a SQLite database (the table is recreated)."""
+    columns = ", ".join(f'"{header}"' for header in headers)
+    with closing(sqlite3.connect(output)) as db:
+        db.execute("DROP TABLE IF EXISTS clients")
+        db.execute(f"CREATE TABLE clients ({columns})")
+        db.executemany(
+            f"INSERT INTO clients VALUES ({', '.join('?' for _ in headers)})",
+            ([value if isinstance(value, (int, float)) or value is None else str(value) for value in row] for row in rows),
+        )
+        db.commit()
+
+def export_parquet(rows, headers, output):
+    """Writes the rows to a Parquet file (requires pyarrow)."""
+    import pyarrow
+    import pyarrow.parquet
+    columns = list(zip(*rows)) or [()] * len(headers)
+    table = pyarrow.table({header: [str(value) for value in column] for header, column in zip(headers, columns)})
+    pyarrow.parquet.write_table(table, output)
+
+EXPORTERS = {"csv": export_csv, "sqlite": export_sqlite, "parquet": export_parquet}
+
+def get_configs(filtered_clients, output="clients_info.csv", fields=DEFAULT_FIELDS, workers=8, rate_limit=0,
+                cache_file=DEFAULT_CACHE_FILE, full=False, max_age=DEFAULT_MAX_AGE, refresh_limit=DEFAULT_REFRESH_LIMIT,
+                output_format="csv"):
+    """Updates the client inventory cache and exports the configuration of the filtered clients.
+    
+    Args:
+        filtered_clients (dict): Client ID -> change marker returned by get_clients(). If None (the client list 
+            could not be retrieved), nothing is done: the cache and the exported file are kept as they are.
+        output (str): Path of the exported file.
+        fields (str): Client properties to export (see parse_fields()).
+        workers (int): Number of clients fetched in parallel.
+        rate_limit (float): Maximum requests per second (0 disables the limit).
+        cache_file (str): Path of the inventory cache (SQLite).
+        full (bool): Fetch every client again, ignoring the cache.
+        max_age (float): Age, in seconds, after which an unchanged client is refreshed anyway.
+        refresh_limit (int): Maximum number of unchanged clients refreshed per run.
+        output_format (str): "csv", "sqlite" or "parquet".
+    
+    Returns:
+        bool: False if the client list was not available, True otherwise.
+    
+    Only the clients that are new, whose change marker differs from the cached one or whose cache entry is 
+    older than max_age are fetched; clients that no longer exist are removed from the cache. The export is 
+    then regenerated from the cache, so changing the exported fields does not require fetching the clients 
+    again. The API client's governor caps the requests actually in flight and backs off when the CommServe 
+    slows down or returns 429/5xx; rate_limit is applied by the same governor.
+    """
+    if filtered_clients is None:
+        print("Client list unavailable: the cache and the exported file were not changed.")
+        return False
+    fields = parse_fields(fields)
+    if rate_limit:
+        api.governor.set_rate(rate_limit)
+    cache = ClientCache(cache_file)
+    try:
+        to_fetch, removed = plan_fetch(filtered_clients, cache.markers(), full, max_age, refresh_limit)
+        cache.remove(removed)
+        print(f"{len(filtered_clients)} clients: {len(to_fetch)} to fetch, {len(removed)} removed, "
+              f"{len(filtered_clients) - len(to_fetch)} from the cache.")
+        errors = fetch_clients(cache, filtered_clients, to_fetch, workers)
+        # The rows are streamed from the cache straight into the exporter
+        exported = [0]
+        EXPORTERS[output_format](export_rows(cache, filtered_clients, fields, exported), [header for header, _ in fields], output)
+    finally:
+        cache.close()
+    print(f"{exported[0]} clients exported to {output}.")
+    if errors:
+        print(f"{errors} clients could not be fetched and will be retried in the next run.")
+    return True
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Exports the configuration of the Commvault clients to a CSV file.")
+    parser.add_argument("--output", default=os.getenv("CLIENT_EXPORT_FILE", "clients_info.csv"), help="Exported file (default: clients_info.csv)")
+    parser.add_argument("--format", choices=sorted(EXPORTERS), default=os.getenv("CLIENT_EXPORT_FORMAT", "csv"), help="Export format (default: csv; parquet requires pyarrow)")
+    parser.add_argument("--fields", default=os.getenv("CLIENT_EXPORT_FIELDS", DEFAULT_FIELDS), help="Comma-separated Header=dotted.path list of client properties to export")
+    parser.add_argument("--workers", type=int, default=int(os.getenv("CLIENT_EXPORT_WORKERS", 8)), help="Clients fetched in parallel (default: 8)")
+    parser.add_argument("--rate-limit", type=float, default=float(os.getenv("CLIENT_EXPORT_RATE_LIMIT", 0)), help="Maximum requests per second (default: unlimited)")
+    parser.add_argument("--cache", default=os.getenv("CLIENT_EXPORT_CACHE", DEFAULT_CACHE_FILE), help=f"Client inventory cache (default: {DEFAULT_CACHE_FILE})")
+    parser.add_argument("--full", action="store_true", help="Fetch every client again, ignoring the cache")
+    parser.add_argument("--max-age", type=float, default=float(os.getenv("CLIENT_EXPORT_MAX_AGE", DEFAULT_MAX_AGE / 86400)), help="Days after which an unchanged client is refreshed (default: 30)")
+    parser.add_argument("--refresh-limit", type=int, default=int(os.getenv("CLIENT_EXPORT_REFRESH_LIMIT", DEFAULT_REFRESH_LIMIT)), help="Maximum unchanged clients refreshed per run (default: 50)")
+    parser.add_argument("--resume", action="store_true", help="Kept for compatibility: an interrupted run always continues from the cache")
+    return parser.parse_args()
 
 if __name__ == "__main__":
+    args = parse_args()
+    if args.format == "parquet" and importlib.util.find_spec("pyarrow") is None:
+        print("The parquet format requires pyarrow (pip install pyarrow).")
+        sys.exit(2)
     clients = get_clients()
-    get_configs(clients)
\ No newline at end of file
+    exported = get_configs(clients, output=args.output, fields=args.fields, workers=args.workers, rate_limit=args.rate_limit,
+                cache_file=args.cache, full=args.full, max_age=args.max_age * 86400, refresh_limit=args.refresh_limit,
+                output_format=args.format)
+    api.print_latency_report()
+    if not exported:
+        sys.exit(1)
@@ -0,0 +1,157 @@
+import os
+import sys
+import time
+import signal
+import threading
+import importlib.util
+from functools import partial
+from concurrent.futures import ThreadPoolExecutor
+from dotenv import load_dotenv # type: ignore
+
+# Carregando configurações
+load_dotenv()
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+# Módulos compartilhados entre os scripts (scripts/common)
+sys.path.append(os.path.join(SCRIPT_DIR, "..", "common"))
+from targets import load_targets
+from metrics_exporter import MetricsServer, default_snapshot
+
+# Intervalo padrão (segundos) de cada coletor. Pode ser alterado com DAEMON_TASKS (ex: "get-jobs=60,get-library=900")
+DEFAULT_TASKS = {
+    "get-commcell-info": 3600,
+    "get-jobs": 60,
+    "get-failed-jobs": 300,
+    "get-ma": 300,
+    "get-library": 600,
+}
+
+
+def log(message):
+    print(f"{time.strftime('%Y-%m-%d %H:%M:%S')} {message}", flush=True)
+
+
+def parse_tasks(value):
+    """Converte a configuração DAEMON_TASKS em um dicionário coletor -> intervalo.
+
+    Args:
+        value (str): Lista separada por vírgula de "coletor=intervalo". Se vazia, utiliza DEFAULT_TASKS.
+
+    Returns:
+        dict: Nome do coletor -> intervalo em segundos.
+    """
+    if not value:
+        return dict(DEFAULT_TASKS)
+    tasks = {}
+    for entry in value.split(","):
+        name, _, interval = entry.strip().partition("=")
+        if name:
+            tasks[name] = int(interval or DEFAULT_TASKS.get(name, 300))
+    return tasks
+
+
+def load_collector(name):
+    """Carrega um script coletor (ex: get-jobs.py) como módulo.
+
+    O módulo é carregado uma única vez, de forma que o cliente da API, as conexões e o estado em
+    memória são mantidos entre as execuções.
+
+    Args:
+        name (str): Nome do script sem a extensão.
+
+    Returns:
+        module: Módulo carregado, que expõe as funções run(target) e main().
+    """
+    path = os.path.join(SCRIPT_DIR, f"{name}.py")
+    spec = importlib.util.spec_from_file_location(name.replace("-", "_"), path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+class ScheduledTask:
+    """Coletor agendado com intervalo próprio, que nunca executa duas vezes em paralelo."""
+
+    def __init__(self, name, interval, run):
+        self.name = name
+        self.interval = interval
+        self.run = run
+        self.next_run = time.monotonic()
+        self.running = threading.Lock()
+
+    def execute(self):
+        start = time.monotonic()
+        try:
+            self.run()
+            log(f"[{self.name}] concluído em {time.monotonic() - start:.1f}s")
+        except Exception as e:
+            log(f"[{self.name}] erro na execução: {e!r}")
+        finally:
+            self.running.release()
+
+
+class Scheduler:
+    """Agendador em processo dos coletores.
+
+    Cada coletor é executado em uma thread do pool quando chega o seu horário, separadamente para
+    cada CommCell, de forma que um CommServe lento não atrasa os demais. Se a execução anterior de
+    um coletor no mesmo CommCell ainda não terminou, o ciclo é pulado. stop() interrompe o agendamento
+    e aguarda as execuções em andamento.
+    """
+
+    def __init__(self, tasks):
+        self.tasks = tasks
+        self.stop_event = threading.Event()
+        self.executor = ThreadPoolExecutor(max_workers=max(1, len(tasks)), thread_name_prefix="collector")
+
+    def run(self):
+        while not self.stop_event.is_set():
+            now = time.monotonic()
+            for task in self.tasks:
+                if task.next_run > now:
+                    continue
+                task.next_run = now + task.interval
+                if not task.running.acquire(blocking=False):
+                    log(f"[{task.name}] execução anterior ainda em andamento, ciclo ignorado")
+                    continue
+                self.executor.submit(task.execute)
+            next_run = min(task.next_run for task in self.tasks)
+            self.stop_event.wait(max(0.1, next_run - time.monotonic()))
+        log("Aguardando coletores em execução...")
+        self.executor.shutdown(wait=True)
+        log("Daemon encerrado.")
+
+    def stop(self, *_):
+        self.stop_event.set()
+
+
+def main():
+    """Inicia o daemon com os coletores configurados em DAEMON_TASKS, para cada CommCell configurado.
+
+    Com EXPORTER_PORT definido, o daemon também expõe as últimas métricas coletadas no formato do
+    Prometheus em /metrics.
+    """
+    targets = load_targets()
+    tasks = []
+    for name, interval in parse_tasks(os.getenv("DAEMON_TASKS")).items():
+        module = load_collector(name)
+        for target in targets:
+            task_name = name if target.default else f"{name}@{target.name}"
+            tasks.append(ScheduledTask(task_name, interval, partial(module.run, target)))
+        log(f"[{name}] agendado a cada {interval}s para {len(targets)} CommCell(s)")
+    if not tasks:
+        log("Nenhum coletor configurado.")
+        return
+    port = os.getenv("EXPORTER_PORT")
+    if port:
+        # /metrics é servido a partir da última coleta de cada coletor, sem consultar a API
+        server = MetricsServer(default_snapshot(), os.getenv("EXPORTER_ADDRESS", "0.0.0.0"), port).start()
+        log(f"Exporter Prometheus em http://{server.address[0]}:{server.address[1]}/metrics")
+    scheduler = Scheduler(tasks)
+    signal.signal(signal.SIGINT, scheduler.stop)
+    signal.signal(signal.SIGTERM, scheduler.stop)
+    scheduler.run()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
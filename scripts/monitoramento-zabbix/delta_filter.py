@@ -0,0 +1,74 @@
+import os
+import time
+from local_state import state_path, load_state, save_state
+
+DEFAULT_HEARTBEAT = 3600
+
+
+class DeltaFilter:
+    """Filtra os itens cujo valor não mudou desde o último envio ao Zabbix.
+
+    O último valor enviado de cada (host, chave) é mantido em um arquivo de estado local. Um item
+    com o mesmo valor é descartado, exceto quando o último envio tiver mais de heartbeat segundos,
+    para que as triggers de nodata do Zabbix continuem funcionando. Os valores só são registrados
+    como enviados após commit(), chamado quando o envio ao Zabbix termina com sucesso.
+    """
+
+    def __init__(self, path, heartbeat=DEFAULT_HEARTBEAT, enabled=True):
+        self.path = path
+        self.heartbeat = float(heartbeat)
+        self.enabled = enabled
+        self.sent = (load_state(path) or {}) if enabled else {}
+        self.pending = {}
+        self.skipped = 0
+
+    @classmethod
+    def from_env(cls, name):
+        """Cria o filtro a partir de DELTA_MODE e DELTA_HEARTBEAT.
+
+        Args:
+            name (str): Nome do coletor, utilizado no nome do arquivo de estado (state/delta-<name>.json).
+
+        Returns:
+            DeltaFilter: Filtro configurado. Com DELTA_MODE desabilitado todos os itens são repassados.
+        """
+        enabled = os.getenv("DELTA_MODE", "false").lower() in ("1", "true", "yes", "sim")
+        return cls(
+            state_path(f"delta-{name}.json") if enabled else None,
+            heartbeat=os.getenv("DELTA_HEARTBEAT", DEFAULT_HEARTBEAT),
+            enabled=enabled,
+        )
+
+    def filter(self, items):
+        """Repassa apenas os itens novos, alterados ou com heartbeat vencido.
+
+        Args:
+            items (iterable): Itens montados com zabbix_item().
+
+        Yields:
+            dict: Itens que devem ser enviados ao Zabbix.
+        """
+        self.pending = {}
+        self.skipped = 0
+        for item in items:
+            if not self.enabled:
+                yield item
+                continue
+            key = f"{item['host']}|{item['key']}"
+            last = self.sent.get(key)
+            if last and last[0] == item["value"] and item["clock"] - last[1] < self.heartbeat:
+                self.skipped += 1
+                continue
+            self.pending[key] = [item["value"], item["clock"]]
+            yield item
+
+    def commit(self):
+        """Registra os itens repassados pelo último filter() como enviados e grava o estado."""
+        if not self.enabled:
+            return
+        self.sent.update(self.pending)
+        self.pending = {}
+        # Descarta itens que deixaram de existir (sem envio há mais de dois heartbeats)
+        limit = time.time() - 2 * self.heartbeat
+        self.sent = {key: last for key, last in self.sent.items() if last[1] >= limit}
+        save_state(self.path, self.sent)
@@ -0,0 +1,79 @@
+import os
+import json
+import time
+import hashlib
+from local_state import state_path, load_state, save_state
+
+# Reenvio forçado da LLD mesmo sem mudanças (segundos)
+DEFAULT_RESEND_INTERVAL = 86400
+# Espera para o Zabbix criar os itens de novas entidades descobertas (segundos)
+DEFAULT_WAIT = 10
+
+
+def _row_hash(row):
+    return hashlib.sha1(json.dumps(row, sort_keys=True).encode("utf-8")).hexdigest()[:16]
+
+
+class DiscoveryState:
+    """Guarda o fingerprint das LLDs enviadas ao Zabbix, para evitar reenviar descobertas iguais.
+
+    Para cada (host, chave de descoberta) é mantido o hash de cada entidade enviada. check() indica
+    se o conjunto mudou e se há entidades novas; apenas nesse último caso é necessário aguardar o
+    Zabbix criar os itens antes de enviar os valores. Os fingerprints só são gravados após commit().
+    """
+
+    def __init__(self, path, resend_interval=DEFAULT_RESEND_INTERVAL, wait=DEFAULT_WAIT):
+        self.path = path
+        self.resend_interval = float(resend_interval)
+        self.wait = float(wait)
+        self.state = load_state(path) or {}
+        self.pending = {}
+
+    @classmethod
+    def from_env(cls, name):
+        """Cria o estado de descoberta do coletor a partir de LLD_RESEND_INTERVAL e LLD_WAIT.
+
+        Args:
+            name (str): Nome do coletor, utilizado no nome do arquivo de estado (state/lld-<name>.json).
+        """
+        return cls(
+            state_path(f"lld-{name}.json"),
+            resend_interval=os.getenv("LLD_RESEND_INTERVAL", DEFAULT_RESEND_INTERVAL),
+            wait=os.getenv("LLD_WAIT", DEFAULT_WAIT),
+        )
+
+    def check(self, host, key, lld_data):
+        """Compara a LLD com a última enviada para o mesmo host e chave.
+
+        Args:
+            host (str): Nome do host no Zabbix.
+            key (str): Chave do item de descoberta.
+            lld_data (list): Lista de entidades no formato LLD.
+
+        Returns:
+            tuple: (changed, new_entities). changed indica que a LLD deve ser enviada (conjunto
+            diferente ou reenvio periódico vencido); new_entities indica que há entidades que
+            ainda não haviam sido descobertas.
+        """
+        name = f"{host}|{key}"
+        hashes = sorted({_row_hash(row) for row in lld_data})
+        previous = self.state.get(name)
+        now = time.time()
+        if previous and previous["hashes"] == hashes and now - previous["sent"] < self.resend_interval:
+            return False, False
+        new_entities = bool(set(hashes) - set(previous["hashes"] if previous else []))
+        self.pending[name] = {"hashes": hashes, "sent": now}
+        return True, new_entities
+
+    def commit(self):
+        """Registra as LLDs verificadas por check() como enviadas e grava o estado."""
+        if not self.pending:
+            return
+        self.state.update(self.pending)
+        self.pending = {}
+        save_state(self.path, self.state)
+
+    def wait_for_items(self):
+        """Aguarda o Zabbix criar os itens das novas entidades descobertas."""
+        if self.wait > 0:
+            time.sleep(self.wait)
@@ -1,27 +1,57 @@
 
 import os
+import sys
 from dotenv import load_dotenv # type: ignore
 import time
 import requests
 import re
 import json
-import subprocess
 import urllib3
+# Módulos compartilhados entre os scripts (scripts/common)
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "common"))
+from zabbix_sender import ZabbixSenderError, default_sender
+from targets import run_for_targets
+from run_metrics import phase, report_error
+from self_monitoring import monitored
+from prometheus_metrics import health_samples, publish_target
+from reports_dataset import DatasetError, iter_dataset
+from metric_mapping import compile_mappings, extract_metrics
 urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
 
 # Carregando configurações
 load_dotenv()
-COMMVAULT_SERVER = os.getenv("COMMVAULT_SERVER")
 ZABBIX_SERVER = os.getenv("ZABBIX_SERVER")
-ZABBIX_HOST = os.getenv("ZABBIX_HOST")
-API_TOKEN = os.getenv("API_TOKEN")
+# Dataset do Reports Plus com a saúde do CommCell e as colunas de nível e de quantidade de itens
+HEALTH_DATASET = os.getenv("HEALTH_DATASET", "b50b20ed-5fc4-4b4c-f7c4-fc6b84eb35cc")
+HEALTH_STATUS_COLUMN = os.getenv("HEALTH_STATUS_COLUMN", "Status")
+HEALTH_COUNT_COLUMN = os.getenv("HEALTH_COUNT_COLUMN", "Count")
+# Posições das colunas de nível e de quantidade no dataset original, utilizadas quando os nomes não existem
+HEALTH_COLUMN_POSITIONS = {HEALTH_STATUS_COLUMN: 1, HEALTH_COUNT_COLUMN: 2}
 
-# Cabeçalhos da requisição
-payload={}
-headers = {
-    'Authtoken': API_TOKEN,
-    'Content-Type': 'application/json',
-    'Accept': 'application/json'
+# Métricas extraídas diretamente das respostas da API (veja metric_mapping.compile_mappings())
+COMMCELL_MAPPINGS = [
+    {
+        "endpoint": "CommServ",
+        "fields": {"name": "commcell.commCellName", "release": "releaseName", "version": "csVersionInfo"},
+        "metrics": [
+            {"key": "key.commCellName", "value": "name"},
+            {"key": "key.release", "value": "{release} | {version}"},
+        ],
+    },
+    {
+        "endpoint": "V4/License",
+        "fields": {"expiry": "expiryDate"},
+        "metrics": [{"key": "key.expiryDate", "value": "expiry"}],
+    },
+]
+INFO_EXTRACTORS = compile_mappings(COMMCELL_MAPPINGS)
+
+# Nível de saúde no dataset -> chave do Zabbix
+HEALTH_KEYS = {
+    '1_Good': 'key.health-good',
+    '2_Info': 'key.health-info',
+    '3_Warning': 'key.health-warning',
+    '4_Critical': 'key.health-critical',
 }
 
 def sanitize_string(value):
@@ -39,164 +69,82 @@ def sanitize_string(value):
         return re.sub(r"[^a-zA-Z0-9 _-]", "", value)  # Remove caracteres especiais
     return value[:255]
 
-def get_commcell_license():
-    """Retorna informacoes a respeito da licenca do Commvault.
-    
-    Essa funcao envia um requisicao GET para a API do Commvault que retornara a data de expiracao da licenca. Se a requisicao e realizada com sucesso e tentado enviar o valor para o Zabbix. Em caso de erro e apresentado uma mensagem de erro.
+def get_commcell_info(target):
+    """Retorna o nome, a release e a data de expiracao da licenca do CommCell.
     
-    Returns:
-        list: Retornara uma lista vazia em caso de erro.
+    As metricas sao extraidas das respostas de /CommServ e /V4/License pelos mapeamentos de COMMCELL_MAPPINGS, com uma unica consulta por endpoint. Um endpoint com erro e informado e as metricas dos demais sao retornadas.
     
-    Raises:
-        requests.exceptions.RequestException: Se ocorrer algum erro com a requisicao HTTP.
-        subprocess.CalledProcessError: Se ocorrer algum erro no envio dos dados para o Zabbix.
-    """
-    url = f'{COMMVAULT_SERVER}/commandcenter/api/V4/License'
-    try:
-        response = requests.request("GET", url, headers=headers, data=payload, verify=False)
-        response.raise_for_status()
-        expiryDate = response.json().get("expiryDate")
-        key="key.expiryDate"
-        try:
-            send_to_zabbix(key, expiryDate)
-        except subprocess.CalledProcessError as e:
-            print(f"Erro ao enviar para o Zabbix: {e}")
-    except requests.exceptions.RequestException as e:
-        print(f"Erro ao buscar informacaoes: {e}")
-        return []
-
-def get_commcell_name():
-    """Retorna o nome do CommCell.
-    
-    Essa funcao envia um requisicao GET para a API do Commvault que retornara o nome do CommCell. Se a requisicao for realizada com sucesso o dado coletado e enviado para o Zabbix. Em caso de erro e apresentado uma mensagem de erro.
+    Args:
+        target (Target): CommCell consultado.
     
     Returns:
-        list: Retornara uma lista vazia em caso de erro. Caso contrario retornara o valor.
-    
-    Raises:
-        requests.exceptions.RequestException: Se ocorrer algum erro com a requisicao HTTP.
-        subprocess.CalledProcessError: Se ocorrer algum erro no envio dos dados para o Zabbix.
+        dict: Metricas key.commCellName, key.release e key.expiryDate (chave do Zabbix -> valor).
     """
-    url = f'{COMMVAULT_SERVER}/commandcenter/api/CommServ'
-    try:
-        response = requests.request("GET", url, headers=headers, data=payload, verify=False)
-        response.raise_for_status()
-        commCellName = response.json().get("commcell", {}).get("commCellName")
-        key="key.commCellName"
-        try:
-            send_to_zabbix(key, commCellName)
-        except subprocess.CalledProcessError as e:
-            print(f"Erro ao enviar para o Zabbix: {e}")
-    except requests.exceptions.RequestException as e:
-        print(f"Erro ao buscar informacaoes: {e}")
-        return []
+    return extract_metrics(target.api, INFO_EXTRACTORS, target.label)
 
-def get_commcell_release():
-    """Retorna a release do CommCell.
-    
-    Essa funcao envia um requisicao GET para a API do Commvault que retornara o nome da realeas e informacoes de versao. Se a requisicao for realizada com sucesso o dado coletado e enviado para o Zabbix. Em caso de erro e apresentado uma mensagem de erro.
-    
-    Returns:
-        list: Retornara uma lista vazia em caso de erro.
-    
-    Raises:
-        requests.exceptions.RequestException: Se ocorrer algum erro com a requisicao HTTP.
-        subprocess.CalledProcessError: Se ocorrer algum erro no envio dos dados para o Zabbix.
-    """
-    url = f'{COMMVAULT_SERVER}/commandcenter/api/CommServ'
-    try:
-        response = requests.request("GET", url, headers=headers, data=payload, verify=False)
-        response.raise_for_status()
-        releaseName = response.json().get("releaseName")
-        csVersionInfo = response.json().get("csVersionInfo")
-        release = (f"{releaseName} | {csVersionInfo}")
-        key="key.release"
-        try:
-            send_to_zabbix(key, release)
-        except subprocess.CalledProcessError as e:
-            print(f"Erro ao enviar para o Zabbix: {e}")
-    except requests.exceptions.RequestException as e:
-        print(f"Erro ao buscar informacaoes: {e}")
-        return []
-    
-def get_commcell_health():
+def get_commcell_health(target):
     """Consulta informações de status de saude do CommCell e envia para o Zabbix.
     
-    ssa funcao envia um requisicao GET para a API do Commvault que retornara com os dados de saude do CommCell. A resposta é processada e extraida as informacoes. Cada metrica e enviada para o Zabbix.
+    Essa funcao consulta o dataset de saude do CommCell (HEALTH_DATASET) no Reports Plus, e le as colunas de nivel (HEALTH_STATUS_COLUMN) e de quantidade de itens (HEALTH_COUNT_COLUMN) pelo nome. Se os nomes nao estiverem na lista de colunas do dataset sao utilizadas as posicoes 1 e 2, como nas versoes anteriores. Cada metrica e retornada para ser enviada ao Zabbix.
+    
+    Args:
+        target (Target): CommCell consultado.
     
     Returns:
-        list: Retornara uma lista vazia em caso de erro.
+        dict: Metricas de saude (chave do Zabbix -> valor). Retornara um dicionario vazio em caso de erro.
     
     Raises:
         requests.exceptions.RequestException: Se ocorrer algum erro com a requisicao HTTP.
-        subprocess.CalledProcessError: Se ocorrer algum erro no envio dos dados para o Zabbix.
     """
-    url = f'{COMMVAULT_SERVER}/commandcenter/api/cr/reportsplusengine/datasets/b50b20ed-5fc4-4b4c-f7c4-fc6b84eb35cc/data?cache=true&parameter.commUniId=10000'
     try:
-        response = requests.request("GET", url, headers=headers, data=payload, verify=False)
-        response.raise_for_status()
         valores = {}
-        keyGood="key.health-good"
-        keyInfo="key.health-info"
-        keyWarning="key.health-warning"
-        keyCritical="key.health-critical"
-        for sublista in response.json().get("records"):
-            if sublista[1] == '1_Good':
-                valores['Good'] = sublista[2]
-            elif sublista[1] == '2_Info':
-                valores['Info'] = sublista[2]
-            elif sublista[1] == '3_Warning':
-                valores['Warning'] = sublista[2]
-            elif sublista[1] == '4_Critical':
-                valores['Critical'] = sublista[2]
-        if 'Good' in valores:
-            valor = valores['Good']
-            try:
-                send_to_zabbix(keyGood, valor)
-            except subprocess.CalledProcessError as e:
-                print(f"Erro ao enviar para o Zabbix: {e}")
-        if 'Info' in valores:
-            valor = valores['Info']
-            try:
-                send_to_zabbix(keyInfo, valor)
-            except subprocess.CalledProcessError as e:
-                print(f"Erro ao enviar para o Zabbix: {e}")
-        if 'Warning' in valores:
-            valor = valores['Warning']
-            try:
-                send_to_zabbix(keyWarning, valor)
-            except subprocess.CalledProcessError as e:
-                print(f"Erro ao enviar para o Zabbix: {e}")
-        if 'Critical' in valores:
-            valor = valores['Critical']
-            try:
-                send_to_zabbix(keyCritical, valor)
-            except subprocess.CalledProcessError as e:
-                print(f"Erro ao enviar para o Zabbix: {e}")
-    except requests.exceptions.RequestException as e:
-        print(f"Erro ao buscar informacaoes: {e}")
-        return []
+        rows = iter_dataset(target.api, HEALTH_DATASET, fields=[HEALTH_STATUS_COLUMN, HEALTH_COUNT_COLUMN], parameters={"commUniId": 10000},
+                            defaults=HEALTH_COLUMN_POSITIONS)
+        for row in rows:
+            key = HEALTH_KEYS.get(row[HEALTH_STATUS_COLUMN])
+            if key:
+                valores[key] = row[HEALTH_COUNT_COLUMN]
+        return valores
+    except (requests.exceptions.RequestException, DatasetError) as e:
+        report_error(f"{target.label}Erro ao buscar informacaoes: {e}")
+        return {}
 
-def send_to_zabbix(key, value):
-    """Envia dados de Jobs para o Zabbix usando o aplicativo zabbix_sender.
+def send_to_zabbix(target, metrics):
+    """Envia as metricas do CommCell para o Zabbix utilizando o protocolo nativo do Zabbix sender.
     
-    Esta função constrói um comando para enviar informações de Jobs para um servidor Zabbix usando o aplicativo zabbix_sender. Ele executa o comando em um shell e captura qualquer saída ou erro que possa ocorrer durante a execução.
+    Esta função envia todas as metricas coletadas na execucao em um unico lote para o servidor Zabbix. Em caso de falha no envio uma mensagem de erro sera impressa.
     
     Args:
-        jobs (str): Uma string que representa os dados do Job a serem enviados ao Zabbix.
+        target (Target): CommCell de origem, com o host correspondente no Zabbix.
+        metrics (dict): Um dicionario onde as chaves sao as chaves dos itens no Zabbix e os valores sao os dados a serem enviados.
     
     Raises:
-        subprocess.CalledProcessError: Se a execução do comando falhar, uma mensagem de erro será impressa indicando a falha no envio de dados para o Zabbix.
+        ZabbixSenderError: Se ocorrer algum erro na comunicacao com o Zabbix.
     """
-    #cmd = f'echo -e \'"{ZABBIX_SERVER}" custom.discovery.ma "{jobs}" -vv\' | C:\Zabbix\zabbix_sender.exe -z {ZABBIX_SERVER} -s {ZABBIX_HOST} -k {ZABBIX_KEY} -o "{jobs}" -vv'
-    cmd = f'C:\Zabbix\zabbix_sender.exe -z {ZABBIX_SERVER} -s {ZABBIX_HOST} -k {key} -o "{value}"'
     try:
-        subprocess.run(cmd, shell=True, capture_output=True, check=True, text=True)
-    except subprocess.CalledProcessError as e:
-        print(f"Erro ao enviar para o Zabbix: {e}")
+        default_sender().send_metrics(target.zabbix_host, metrics)
+    except ZabbixSenderError as e:
+        report_error(f"{target.label}Erro ao enviar para o Zabbix: {e}")
+
+@monitored("get-commcell-info")
+def run(target):
+    """Coleta as informações de um CommCell e as envia para o Zabbix.
+
+    Args:
+        target (Target): CommCell a ser consultado.
+    """
+    metrics = {}
+    with phase("transform"):
+        metrics.update(get_commcell_info(target))
+        metrics.update(get_commcell_health(target))
+    if metrics:
+        publish_target(target, "get-commcell-info", health_samples(metrics))
+        send_to_zabbix(target, metrics)
+    target.api.print_latency_report()
+
+def main():
+    """Coleta as informações de todos os CommCells configurados e as envia para o Zabbix."""
+    run_for_targets(run)
 
 if __name__ == "__main__":
-    get_commcell_name()
-    get_commcell_license()
-    get_commcell_release()
-    get_commcell_health()
+    main()
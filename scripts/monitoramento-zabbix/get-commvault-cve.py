@@ -1,50 +1,251 @@
-import requests
+import os
+import sys
 import json
-from bs4 import BeautifulSoup
+import codecs
+import argparse
+from html.parser import HTMLParser
+from dotenv import load_dotenv # type: ignore
+import requests
+# Módulos compartilhados entre os scripts (scripts/common)
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "common"))
+from zabbix_sender import ZabbixSenderError, default_sender
+from targets import load_targets
+from run_metrics import report_error
+from local_state import state_path, load_state, save_state
+
+# Carregando configurações
+load_dotenv()
 
 # URL do site com os avisos de segurança
-url = "https://documentation.commvault.com/securityadvisories/"
-
-# Fazendo a requisição HTTP para obter o conteúdo da página
-response = requests.get(url)
-response.raise_for_status()  # Levanta uma exceção se a requisição falhar
-
-# Parseando o HTML com BeautifulSoup
-soup = BeautifulSoup(response.text, 'html.parser')
-
-# Criando uma lista para armazenar as vulnerabilidades
-vulnerabilities = []
-
-# Encontrando a tabela que contém os avisos de segurança
-table = soup.find('table')
-
-if table:
-    # Extraindo as linhas da tabela
-    rows = table.find_all('tr')
-    
-    # Iterando sobre as linhas e adicionando à lista
-    for row in rows[1:]:  # Pulando o cabeçalho (primeira linha)
-        cols = row.find_all('td')
-        if len(cols) >= 3:  # Verificando se há colunas suficientes
-            vulnerability = {
-                "ID": cols[0].get_text(strip=True),
-                "Título": cols[1].get_text(strip=True),
-                "Data": cols[2].get_text(strip=True)
-            }
-            if cols[1].get_text(strip=True) != 'none':
-                vulnerabilities.append(vulnerability)
-else:
-    print("Nenhuma tabela de avisos de segurança encontrada na página.")
-
-with open("vulnerabilities.json", "w", encoding="utf-8") as f:
-    json.dump(vulnerabilities, f, ensure_ascii=False, indent=4)
-print("Lista salva em 'vulnerabilities.json'.")
-# Exemplo de como acessar a lista
-#if vulnerabilities:
-#    for vuln in vulnerabilities:
-#        print(f"ID: {vuln['ID']}")
-#        print(f"Título: {vuln['Título']}")
-#        print(f"Data: {vuln['Data']}")
-#        print("-" * 50)
-#else:
-#    print("Nenhuma vulnerabilidade encontrada.")
\ No newline at end of file
+url = os.getenv("CVE_URL", "https://documentation.commvault.com/securityadvisories/")
+# Arquivo com a lista completa de avisos
+OUTPUT_FILE = os.getenv("CVE_OUTPUT", "vulnerabilities.json")
+# Tamanho dos blocos lidos da página
+CHUNK_SIZE = 16384
+TIMEOUT = 30
+
+
+class AdvisoryTableParser(HTMLParser):
+    """Extrai as linhas da primeira tabela da página de avisos de segurança.
+
+    O HTML pode ser fornecido em blocos (feed()) à medida que chega do servidor. Cada linha de
+    dados (a primeira linha da tabela é o cabeçalho) com pelo menos 3 colunas vira um aviso com
+    as chaves "ID", "Título" e "Data". Ao final da tabela done passa a True e o restante da página
+    pode ser descartado.
+    """
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.advisories = []
+        self.done = False
+        self.rows = 0
+        self._depth = 0
+        self._cells = None
+        self._text = None
+        self._run = []
+
+    def handle_starttag(self, tag, attrs):
+        if self.done:
+            return
+        self._end_run()
+        if tag == "table":
+            self._depth += 1
+        elif self._depth == 1 and tag == "tr":
+            self._cells = []
+        elif self._depth == 1 and tag == "td" and self._cells is not None:
+            self._text = []
+
+    def handle_endtag(self, tag):
+        if self.done or not self._depth:
+            return
+        self._end_run()
+        if tag == "table":
+            self._depth -= 1
+            self.done = self._depth == 0
+        elif self._depth == 1 and tag == "td" and self._text is not None:
+            self._cells.append("".join(self._text))
+            self._text = None
+        elif self._depth == 1 and tag == "tr" and self._cells is not None:
+            self._end_row()
+
+    def handle_data(self, data):
+        if self._text is not None:
+            # O mesmo trecho de texto pode chegar em partes, conforme os blocos recebidos
+            self._run.append(data)
+
+    def _end_run(self):
+        # Mesmo resultado do get_text(strip=True): cada trecho de texto entre tags sem espaços nas pontas
+        if self._run:
+            if self._text is not None:
+                self._text.append("".join(self._run).strip())
+            self._run = []
+
+    def _end_row(self):
+        cells, self._cells = self._cells, None
+        self.rows += 1
+        if self.rows == 1 or len(cells) < 3:
+            return
+        if cells[1] != 'none':
+            self.advisories.append({"ID": cells[0], "Título": cells[1], "Data": cells[2]})
+
+
+def parse_advisories(chunks, encoding="utf-8"):
+    """Extrai os avisos de segurança de uma página HTML.
+
+    Args:
+        chunks (iterable): Blocos da página (str, ou bytes na codificação encoding), na ordem.
+        encoding (str): Codificação dos blocos em bytes (padrão UTF-8; uma codificação desconhecida é tratada como UTF-8).
+
+    Returns:
+        tuple: (lista de avisos, True se a tabela de avisos foi encontrada).
+    """
+    parser = AdvisoryTableParser()
+    # Decodificação incremental: um caractere pode estar dividido entre dois blocos
+    try:
+        decoder = codecs.getincrementaldecoder(encoding or "utf-8")(errors="replace")
+    except LookupError:
+        decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+    for chunk in chunks:
+        parser.feed(decoder.decode(chunk) if isinstance(chunk, bytes) else chunk)
+        if parser.done:
+            break
+    parser.close()
+    return parser.advisories, parser.rows > 0
+
+
+def page_chunks(response):
+    """Blocos e codificação da página de avisos.
+
+    Com charset no Content-Type a página é lida em streaming na codificação informada
+    (response.encoding). Sem charset o requests assume ISO-8859-1; nesse caso a página é lida por
+    completo e decodificada com a codificação detectada no conteúdo (response.apparent_encoding).
+
+    Returns:
+        tuple: (blocos da página em bytes, codificação).
+    """
+    if "charset" in response.headers.get("Content-Type", "").lower():
+        return response.iter_content(CHUNK_SIZE), response.encoding
+    content = response.content
+    return (content[i:i + CHUNK_SIZE] for i in range(0, len(content), CHUNK_SIZE)), response.apparent_encoding
+
+
+def fetch_page(state):
+    """Consulta a página de avisos somente se ela mudou desde a última consulta.
+
+    Envia If-None-Match/If-Modified-Since com o ETag e o Last-Modified da consulta anterior à mesma URL.
+
+    Args:
+        state (dict): Estado salvo da última consulta (chaves "url", "etag" e "last_modified").
+
+    Returns:
+        requests.Response or None: Resposta em streaming, ou None se a página não mudou (HTTP 304).
+
+    Raises:
+        requests.exceptions.RequestException: Se a requisição falhar.
+    """
+    headers = {}
+    if state.get("advisories") is not None and state.get("url") == url:
+        if state.get("etag"):
+            headers["If-None-Match"] = state["etag"]
+        if state.get("last_modified"):
+            headers["If-Modified-Since"] = state["last_modified"]
+    response = requests.get(url, headers=headers, stream=True, timeout=TIMEOUT)
+    if response.status_code == 304:
+        response.close()
+        return None
+    response.raise_for_status()  # Levanta uma exceção se a requisição falhar
+    return response
+
+
+def diff_advisories(known, advisories):
+    """Retorna os avisos cujo ID não está na lista anterior, na ordem da página."""
+    known_ids = {advisory["ID"] for advisory in known}
+    return [advisory for advisory in advisories if advisory["ID"] not in known_ids]
+
+
+def send_to_zabbix(new, total):
+    """Envia a quantidade de avisos novos e total, e os avisos novos (JSON), para o host de cada CommCell.
+
+    Returns:
+        bool: True se o Zabbix aceitou todos os itens de todos os hosts.
+    """
+    metrics = {
+        "commvault.cve.new": len(new),
+        "commvault.cve.total": total,
+        "commvault.cve.advisories": new,
+    }
+    hosts = {target.zabbix_host for target in load_targets() if target.zabbix_host}
+    try:
+        for host in sorted(hosts):
+            result = default_sender().send_metrics(host, metrics)
+            if result["failed"]:
+                report_error(f"Zabbix rejeitou {result['failed']} itens de avisos de segurança do host {host}")
+                return False
+    except ZabbixSenderError as e:
+        report_error(f"Erro ao enviar para o Zabbix: {e}")
+        return False
+    return True
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Consulta os avisos de segurança do Commvault e envia os novos para o Zabbix.")
+    parser.add_argument("--html", help="Lê a página de um arquivo HTML salvo, sem acessar o site")
+    parser.add_argument("--encoding", default="utf-8", help="Codificação do arquivo de --html (padrão: utf-8)")
+    parser.add_argument("--no-send", action="store_true", help="Não envia os resultados para o Zabbix (o estado não é atualizado)")
+    parser.add_argument("--update-state", action="store_true", help="Com --no-send, atualiza o estado mesmo assim (para reproduzir a detecção com páginas salvas)")
+    return parser.parse_args()
+
+
+def main():
+    """Consulta os avisos de segurança, identifica os publicados desde a execução anterior e os envia para o Zabbix.
+
+    Na primeira execução a lista consultada é apenas registrada como referência, sem avisos novos.
+    O estado só é atualizado depois que o Zabbix aceita o envio; se o envio falhar, os mesmos avisos
+    são informados como novos na próxima execução. Com --no-send o estado não é alterado, a não ser
+    com --update-state, o que permite reproduzir a detecção de avisos novos com páginas salvas (--html).
+    """
+    args = parse_args()
+    path = state_path("cve.json")
+    state = load_state(path, {})
+    known = state.get("advisories")
+    if args.html:
+        with open(args.html, "rb") as f:
+            advisories, found = parse_advisories(iter(lambda: f.read(CHUNK_SIZE), b""), args.encoding)
+        response = None
+    else:
+        try:
+            response = fetch_page(state)
+        except requests.exceptions.RequestException as e:
+            report_error(f"Erro ao consultar os avisos de segurança: {e}")
+            return
+        if response is None:
+            print("Página de avisos de segurança inalterada.")
+            if not args.no_send:
+                send_to_zabbix([], len(known))
+            return
+        with response:
+            advisories, found = parse_advisories(*page_chunks(response))
+    if not found:
+        print("Nenhuma tabela de avisos de segurança encontrada na página.")
+        return
+    new = diff_advisories(known, advisories) if known is not None else []
+    for advisory in new:
+        print(f"Novo aviso: {advisory['ID']} - {advisory['Título']} ({advisory['Data']})")
+    print(f"{len(advisories)} avisos, {len(new)} novos.")
+    with open(OUTPUT_FILE, "w", encoding="utf-8") as f:
+        json.dump(advisories, f, ensure_ascii=False, indent=4)
+    if args.no_send and not args.update_state:
+        return
+    if not args.no_send and not send_to_zabbix(new, len(advisories)):
+        print("Estado dos avisos de segurança mantido: os avisos novos serão enviados na próxima execução.")
+        return
+    save_state(path, {
+        "url": url if response is not None else None,
+        "etag": response.headers.get("ETag") if response is not None else None,
+        "last_modified": response.headers.get("Last-Modified") if response is not None else None,
+        "advisories": advisories,
+    })
+
+
+if __name__ == "__main__":
+    main()
@@ -1,31 +1,40 @@
 import os
+import sys
 from dotenv import load_dotenv # type: ignore
-import time
 import requests
 import re
 import json
-import subprocess
 import urllib3
+# Módulos compartilhados entre os scripts (scripts/common)
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "common"))
+from zabbix_sender import ZabbixSenderError, default_sender, zabbix_item
+from targets import run_for_targets
+from run_metrics import phase, report_error
+from self_monitoring import monitored
+from discovery_state import DiscoveryState
+from seen_jobs import SeenJobs
+from commvault_jobs import iter_jobs, JobWindow
+from local_state import state_path
 urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
 
 # Carregando configurações
 load_dotenv()
-COMMVAULT_SERVER = os.getenv("COMMVAULT_SERVER")
 ZABBIX_SERVER = os.getenv("ZABBIX_SERVER")
-ZABBIX_HOST = os.getenv("ZABBIX_HOST")
 ZABBIX_KEY_JOBS = os.getenv("ZABBIX_KEY_MEDIAAGENT")
-API_TOKEN = os.getenv("API_TOKEN")
+# Modo incremental: consulta apenas os Jobs finalizados desde a última execução
+JOB_INCREMENTAL = os.getenv("JOB_INCREMENTAL", "false").lower() in ("1", "true", "yes", "sim")
+JOB_RESYNC_INTERVAL = int(os.getenv("JOB_RESYNC_INTERVAL", 3600))
 
-# Endpoint da API para buscar jobs
-url = f'{COMMVAULT_SERVER}/commandcenter/api/Job?completedJobLookupTime=14400&jobCategory=Finished&jobFilter=backup,restore&limit=10000'
+# Filtros da API para buscar jobs
+JOB_FILTERS = {'completedJobLookupTime': 14400, 'jobCategory': 'Finished', 'jobFilter': 'backup,restore'}
 
-# Cabeçalhos da requisição
-payload={}
-headers = {
-    'Authtoken': API_TOKEN,
-    'Content-Type': 'application/json',
-    'Accept': 'application/json'
-}
+def discovery(target):
+    """Fingerprint das LLDs enviadas pelo CommCell, para não reenviar descobertas iguais."""
+    return target.component("get-failed-jobs.discovery", lambda: DiscoveryState.from_env(target.state_name("get-failed-jobs")))
+
+def seen_jobs(target):
+    """Jobs do CommCell cujo status já foi enviado, para enviar apenas falhas novas e mudanças de status."""
+    return target.component("get-failed-jobs.seen", lambda: SeenJobs.from_env(target.state_name("get-failed-jobs")))
 
 def sanitize_string(value):
     """Faz a limpeza da string removendo quaisquer caracteres especiais.
@@ -42,10 +51,37 @@ def sanitize_string(value):
         return re.sub(r"[^a-zA-Z0-9 _-]", "", value)  # Remove caracteres especiais
     return value[:255]
 
-def get_jobs():
+def job_to_lld(job_summary):
+    """Formata um Job com falha em LLD.
+    
+    Args:
+        job_summary (JobSummary): O Job.
+    
+    Returns:
+        dict: Os dados do Job em LLD, ou None se o Job não falhou nem foi concluído com erros.
+    """
+    localized_status = job_summary.localized_status
+    if localized_status not in ["Failed", "Completed with one or more errors"]:
+        return None
+    return {
+        "{#JOBID}": str(job_summary.job_id),
+        "{#LOCALIZEDSTATUS}": localized_status,
+        "{#JOBTYPE}": job_summary.job_type,
+        "{#BACKUPLEVELNAME}": job_summary.backup_level,
+        "{#CLIENTNAME}": job_summary.client,
+        "{#INSTANCENAME}": job_summary.instance,
+        "{#PENDINGREASON}": str(sanitize_string(job_summary.pending_reason))
+    }
+
+def get_jobs(target):
     """Consulta informações de Jobs na API do Commvault e filtra os resultados com base no status do Job.
     
-    Esta função envia uma solicitação GET para a API do Commvault para buscar informações dos Jobs, processa a resposta e retorna uma lista de Jobs que falharam ou foram concluídos com erros. A lista retornada é formatada em LLD e enviada para o Zabbix.
+    Esta função percorre a API de Jobs do Commvault página por página, decodificando cada página de forma incremental, e retorna uma lista de Jobs que falharam ou foram concluídos com erros. Apenas os Jobs filtrados são mantidos em memória. A lista retornada é formatada em LLD e enviada para o Zabbix.
+    
+    No modo incremental (JOB_INCREMENTAL), os Jobs com falha da janela de 14400 segundos são mantidos em um arquivo de estado por CommCell (state/get-failed-jobs.json, ou state/get-failed-jobs-<nome>.json com TARGETS_FILE) e apenas os Jobs finalizados após o último cursor são consultados na API, com uma ressincronização completa a cada JOB_RESYNC_INTERVAL segundos.
+    
+    Args:
+        target (Target): CommCell consultado.
     
     Returns:
         list: Uma lista de dicionários, cada um contendo detalhes do Job, como ID do Job, status, tipo de job, tipo de backup, nome do client, nome do subclient e motivo da falha. Se nenhum job corresponder aos critérios ou ocorrer um erro durante a solicitação, uma lista vazia será retornada.
@@ -54,74 +90,98 @@ def get_jobs():
         requests.exceptions.RequestException: Se houver um erro durante a solicitação da API.
     """
     try:
-        response = requests.request("GET", url, headers=headers, data=payload, verify=False)
-        response.raise_for_status()
-        data = response.json()
+        if JOB_INCREMENTAL:
+            window = JobWindow(state_path(target.state_name("get-failed-jobs") + ".json"), JOB_FILTERS['completedJobLookupTime'], JOB_RESYNC_INTERVAL)
+            filters = {key: value for key, value in JOB_FILTERS.items() if key not in ('completedJobLookupTime', 'jobCategory')}
+            window.update(target.api, filters, project=job_to_lld)
+            window.save()
+            return list(window.records.values())
         lld_jobs = []
-        for job in data.get("jobs", []):
-            job_summary = job.get("jobSummary", {})
-            localized_status = job_summary.get("localizedStatus", "")
-            
-            if localized_status in ["Failed", "Completed with one or more errors"]:
-                lld_jobs.append({
-                    "{#JOBID}": str(job_summary.get("jobId")),
-                    "{#LOCALIZEDSTATUS}": localized_status,
-                    "{#JOBTYPE}": job_summary.get("jobType"),
-                    "{#BACKUPLEVELNAME}": job_summary.get("backupLevelName"),
-                    "{#CLIENTNAME}": job_summary.get("subclient", {}).get("clientName"),
-                    "{#INSTANCENAME}": job_summary.get("subclient", {}).get("instanceName"),
-                    "{#PENDINGREASON}": str(sanitize_string(job_summary.get("pendingReason")))
-                })
+        for job_summary in iter_jobs(target.api, JOB_FILTERS):
+            lld_job = job_to_lld(job_summary)
+            if lld_job:
+                lld_jobs.append(lld_job)
         return lld_jobs
-    except requests.exceptions.RequestException as e:
-        print(f"Erro ao buscar jobs: {e}")
+    except (requests.exceptions.RequestException, ValueError) as e:
+        report_error(f"{target.label}Erro ao buscar jobs: {e}")
         return []
 
-def get_job_status(jobs):
+def get_job_status(target, jobs):
     """Consulta o status dos Jobs e os envia para o Zabbix.
     
-    Esta função iterage com uma lista de jobs, extrai o ID do Job e seu status e envia essas informações para um servidor Zabbix usando o aplicativo zabbix_sender. Se ocorrer um erro durante o processo de envio, ele registra uma mensagem de erro e retorna uma lista vazia. No caso de uma exceção de solicitação, ele também registra o erro e retorna uma lista vazia.
+    Esta função iterage com uma lista de jobs, extrai o ID do Job e seu status e envia em um único lote para o servidor Zabbix, utilizando o protocolo nativo do Zabbix sender, apenas os status ainda não enviados: Jobs novos ou cujo status mudou desde o último envio (veja SeenJobs). Os status são registrados como enviados quando o Zabbix processa todos os itens (com SEND_QUEUE, quando a fila ou o spool aceitam todos); se ocorrer um erro durante o envio ou algum item for rejeitado, os status serão enviados novamente nas próximas execuções, até SEEN_JOBS_ATTEMPTS envios com falha.
     
     Args:
+        target (Target): CommCell de origem, com o host correspondente no Zabbix.
         jobs (list): Uma lista de dicionários, onde cada dicionário contém informações sobre o job, incluindo o ID do job e o status.
     """
+    seen = seen_jobs(target)
+    items = [
+        zabbix_item(target.zabbix_host, f'status.job[{job["{#JOBID}"]}]', job["{#LOCALIZEDSTATUS}"])
+        for job in seen.filter(jobs)
+    ]
     try:
-        for job in jobs:
-            job_id = job["{#JOBID}"]
-            localized_status = job["{#LOCALIZEDSTATUS}"]
-            cmd = f'C:\Zabbix\zabbix_sender.exe -z {ZABBIX_SERVER} -s {ZABBIX_HOST} -k status.job[{job_id}] -o "{localized_status}"'
-            try:
-                subprocess.run(cmd, shell=True, capture_output=True, check=True, text=True)
-            except subprocess.CalledProcessError as e:
-                print(f"Erro ao enviar para o Zabbix: {e}")
-                return []
-    except requests.exceptions.RequestException as e:
-        print(f"Erro ao buscar Status Jobs: {e}")
-        return []
+        if items:
+            result = default_sender().send(items)
+            print(f"{target.label}Enviado para o Zabbix: {result['processed']} processados, {result['failed']} com falha, {seen.skipped} já enviados")
+            # Valores rejeitados (ex: itens ainda não criados pela LLD) ou descartados pela fila (SEND_QUEUE)
+            # são repassados novamente nas próximas execuções, até SEEN_JOBS_ATTEMPTS envios
+            seen.commit(failed=bool(result["failed"]))
+            if seen.given_up:
+                print(f"{target.label}{seen.given_up} status rejeitados em {seen.max_attempts} envios registrados como enviados")
+        else:
+            seen.commit()
+    except ZabbixSenderError as e:
+        report_error(f"{target.label}Erro ao enviar para o Zabbix: {e}")
 
-def send_to_zabbix(jobs):
-    """Envia dados de Jobs para o Zabbix usando o aplicativo zabbix_sender.
+def send_to_zabbix(target, jobs):
+    """Envia dados de Jobs (LLD) para o Zabbix utilizando o protocolo nativo do Zabbix sender.
     
-    Esta função constrói um comando para enviar informações de Jobs para um servidor Zabbix usando o aplicativo zabbix_sender. Ele executa o comando em um shell e captura qualquer saída ou erro que possa ocorrer durante a execução.
+    Esta função serializa a lista de Jobs em JSON e a envia para o item de descoberta do servidor Zabbix. A LLD só é enviada quando o conjunto de Jobs muda em relação ao último envio (ou quando vence LLD_RESEND_INTERVAL). Em caso de falha no envio uma mensagem de erro será impressa.
     
     Args:
-        jobs (str): Uma string que representa os dados do Job a serem enviados ao Zabbix.
+        target (Target): CommCell de origem, com o host correspondente no Zabbix.
+        jobs (list): Uma lista de dicionários no formato LLD que representa os Jobs a serem enviados ao Zabbix.
+    
+    Returns:
+        bool: True se novas Jobs foram descobertas e o Zabbix precisa de tempo para criar os itens.
     
     Raises:
-        subprocess.CalledProcessError: Se a execução do comando falhar, uma mensagem de erro será impressa indicando a falha no envio de dados para o Zabbix.
+        ZabbixSenderError: Se ocorrer algum erro na comunicação com o Zabbix.
     """
-    #cmd = f'echo -e \'"{ZABBIX_SERVER}" custom.discovery.ma "{jobs}" -vv\' | C:\Zabbix\zabbix_sender.exe -z {ZABBIX_SERVER} -s {ZABBIX_HOST} -k {ZABBIX_KEY} -o "{jobs}" -vv'
-    cmd = f'C:\Zabbix\zabbix_sender.exe -z {ZABBIX_SERVER} -s {ZABBIX_HOST} -k {ZABBIX_KEY_JOBS} -o "{jobs}"'
+    state = discovery(target)
+    changed, new_entities = state.check(target.zabbix_host, ZABBIX_KEY_JOBS, jobs)
+    if not changed:
+        return False
     try:
-        subprocess.run(cmd, shell=True, capture_output=True, check=True, text=True)
-    except subprocess.CalledProcessError as e:
-        print(f"Erro ao enviar para o Zabbix: {e}")
+        default_sender().send([zabbix_item(target.zabbix_host, ZABBIX_KEY_JOBS, jobs)])
+        state.commit()
+        return new_entities
+    except ZabbixSenderError as e:
+        report_error(f"{target.label}Erro ao enviar para o Zabbix: {e}")
+        return False
 
-if __name__ == "__main__":
-    jobs = get_jobs()
+@monitored("get-failed-jobs")
+def run(target):
+    """Descobre os Jobs com falha de um CommCell, envia a LLD e em seguida o status de cada Job para o Zabbix.
+
+    Args:
+        target (Target): CommCell a ser consultado.
+    """
+    with phase("transform"):
+        jobs = get_jobs(target)
     if jobs:
-        send_to_zabbix(jobs)
-        time.sleep(10)
-        get_job_status(jobs)
+        # Aguarda o Zabbix criar os itens somente quando há novos Jobs com falha
+        if send_to_zabbix(target, jobs):
+            discovery(target).wait_for_items()
+        get_job_status(target, jobs)
     else:
-        print("Nenhum job encontrado ou erro na API.")
+        print(f"{target.label}Nenhum job encontrado ou erro na API.")
+    target.api.print_latency_report()
+
+def main():
+    """Coleta os Jobs com falha de todos os CommCells configurados e os envia para o Zabbix."""
+    run_for_targets(run)
+
+if __name__ == "__main__":
+    main()
@@ -1,57 +1,72 @@
 
 import os
+import sys
 from dotenv import load_dotenv # type: ignore
 import requests
 import json
-import subprocess
+import sqlite3
+import itertools
 import urllib3
+# Módulos compartilhados entre os scripts (scripts/common)
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "common"))
+from zabbix_sender import ZabbixSenderError, default_sender
+from targets import run_for_targets
+from run_metrics import phase, report_error
+from self_monitoring import monitored
+from prometheus_metrics import job_samples, publish_target
+from commvault_jobs import iter_jobs, JobWindow
+from job_analytics import JobColumns, job_row
+from job_history import JobHistory, history_row
+from active_jobs import ActiveJobTracker, parse_thresholds
+from records import JobSummary
+from local_state import state_path
 urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
 
 # Carregando configurações
 load_dotenv()
-COMMVAULT_SERVER = os.getenv("COMMVAULT_SERVER")
 ZABBIX_SERVER = os.getenv("ZABBIX_SERVER")
-ZABBIX_HOST = os.getenv("ZABBIX_HOST")
-API_TOKEN = os.getenv("API_TOKEN")
+# Modo incremental: consulta apenas os Jobs finalizados desde a última execução
+JOB_INCREMENTAL = os.getenv("JOB_INCREMENTAL", "false").lower() in ("1", "true", "yes", "sim")
+JOB_RESYNC_INTERVAL = int(os.getenv("JOB_RESYNC_INTERVAL", 3600))
+# Histórico local de Jobs finalizados, para as métricas de tendência (taxa de falha, SLA)
+JOB_HISTORY = os.getenv("JOB_HISTORY", "false").lower() in ("1", "true", "yes", "sim")
+JOB_HISTORY_DAYS = int(os.getenv("JOB_HISTORY_DAYS", 90))
+JOB_SLA_HOURS = int(os.getenv("JOB_SLA_HOURS", 24))
+# Clientes listados em commvault.history.clients (apenas os fora do SLA ou com falhas)
+JOB_HISTORY_CLIENTS = int(os.getenv("JOB_HISTORY_CLIENTS", 200))
+# Acompanhamento do prazo de SLA dos Jobs ativos (limites em JOB_SLA_THRESHOLDS)
+JOB_SLA_TRACKER = os.getenv("JOB_SLA_TRACKER", "false").lower() in ("1", "true", "yes", "sim")
+# Limites validados uma única vez, na carga do script; com um valor inválido apenas as métricas de SLA deixam de ser enviadas
+try:
+    JOB_SLA_LIMITS = parse_thresholds(os.getenv("JOB_SLA_THRESHOLDS"))
+    JOB_SLA_ERROR = None
+except ValueError as e:
+    JOB_SLA_LIMITS = None
+    JOB_SLA_ERROR = e
 
-# Endpoint da API para buscar jobs
-url = f'{COMMVAULT_SERVER}/commandcenter/api/Job?completedJobLookupTime=3600'
+# Filtros da API para buscar jobs
+JOB_FILTERS = {'completedJobLookupTime': 3600}
 
-# Cabeçalhos da requisição
-payload={}
-headers = {
-    'Authtoken': API_TOKEN,
-    'Content-Type': 'application/json',
-    'Accept': 'application/json'
-}
-
-def get_jobs():
+def get_jobs(target):
     """Busca lista de Jobs na API do Commvault.
-    Esta função envia uma solicitação GET para a URL especificada em #Configurações
-    para listar os jobs dos últimos 3600 segundos. Ela lida com quaisquer exceções 
-    na solicitação e retorna uma lista vazia em caso de erro.
+    Esta função percorre a API de Jobs página por página, com os filtros definidos em
+    JOB_FILTERS, para listar os jobs dos últimos 3600 segundos. Os Jobs são decodificados
+    de forma incremental e retornados um a um, sem carregar a lista inteira em memória.
+    Args:
+        target (Target): CommCell consultado.
     Returns:
-        list: Uma lista de Jobs. Se ocorrer um erro, uma lista vazia será retornada.
+        generator: Um JobSummary de cada Job.
     Raises:
         requests.exceptions.RequestException: Se houver um erro durante a solicitação.
     """
-    try:
-        response = requests.request("GET", url, headers=headers, data=payload, verify=False)
-        response.raise_for_status()
-        jobs = response.json().get("jobs", [])
-        return jobs
-    except requests.exceptions.RequestException as e:
-        print(f"Erro ao buscar jobs: {e}")
-        return []
+    return iter_jobs(target.api, JOB_FILTERS)
 
-def parse_jobs(jobs):
-    """Analisa a lista de Jobs e conta o número de ocorrências baseado no status do Jobs.
+def job_metrics(columns):
+    """Converte as agregações dos Jobs em métricas para o Zabbix.
     Args:
-        jobs (list of dict): Uma lista de dicionários de jobs, onde cada dicionário contém
-                             uma chave 'jobSummary' com um campo 'status' indicando o status 
-                             da tarefa.
+        columns (JobColumns): Jobs decodificados em formato colunar.
     Returns:
-        dict: Um dicionário contendo as contagens de jobs baseado em seu status com as seguintes chaves:
+        dict: Um dicionário com as métricas dos jobs com as seguintes chaves:
             - "commvault.failed_jobs": Número de jobs que falharam.
             - "commvault.running_jobs": Número de jobs que estão em execução.
             - "commvault.completed_jobs": Número de jobs que completaram com sucesso.
@@ -59,67 +74,212 @@ def parse_jobs(jobs):
             - "commvault.waiting_jobs": Número de jobs que estão aguardando por recurso.
             - "commvault.pending_jobs": Número de jobs que estão pendentes.
             - "commvault.delayed_jobs": Número de jobs que estão com tempo de execução elevado.
+            - "commvault.total_jobs": Número total de jobs.
+            - "commvault.job_elapsed.p50", ".p90", ".p95", ".p99" e ".max": Percentis e máximo do tempo de execução (segundos).
+            - "commvault.jobs.breakdown": JSON com a contagem por status x tipo de job x grupo de clientes.
+            - "commvault.jobs.mediaagents": JSON com jobs, bytes e vazão (bytes/s) por MediaAgent.
+    """
+    summary = columns.summary()
+    status = summary["status"]
+    metrics = {
+        "commvault.failed_jobs": status.get('Failed', 0),
+        "commvault.running_jobs": status.get('Running', 0),
+        "commvault.completed_jobs": status.get('Completed', 0),
+        "commvault.queued_jobs": status.get('Queued', 0),
+        "commvault.waiting_jobs": status.get('Waiting', 0),
+        "commvault.pending_jobs": status.get('Pending', 0),
+        "commvault.delayed_jobs": summary["delayed"],
+        "commvault.total_jobs": summary["total"],
+    }
+    for name, value in summary["elapsed"].items():
+        metrics[f"commvault.job_elapsed.{name}"] = value
+    metrics["commvault.jobs.breakdown"] = summary["breakdown"]
+    metrics["commvault.jobs.mediaagents"] = summary["media_agents"]
+    return metrics
+
+def parse_jobs(jobs):
+    """Analisa a lista de Jobs em uma única passada e calcula as métricas para o Zabbix.
+    Os Jobs são convertidos para o formato colunar (JobColumns) à medida que são lidos, sem
+    mantê-los em memória.
+    Args:
+        jobs (iterable of JobSummary): Os Jobs.
+    Returns:
+        dict: As métricas retornadas por job_metrics().
     """
-    failed_jobs = 0
-    running_jobs = 0
-    completed_jobs = 0
-    queued_jobs = 0
-    waiting_jobs = 0
-    pending_jobs = 0
-    delayed_jobs= 0
+    columns = JobColumns()
+    columns.extend(jobs)
+    return job_metrics(columns)
 
+def collect_jobs(jobs, history_rows=None, active=None):
+    """Repassa os Jobs de jobs, acumulando as linhas do histórico (history_row()) em history_rows e os Jobs ativos em active."""
     for job in jobs:
-        status = job['jobSummary'].get('status')
-        elapsedtime = int(job['jobSummary'].get('jobElapsedTime'))
-        if status == 'Completed': 
-            completed_jobs += 1
-        if status == 'Failed':
-            failed_jobs += 1
-        if status == 'Queued':
-            queued_jobs += 1    
-        if status == 'Waiting':
-            waiting_jobs += 1
-        if status == 'Running':
-            running_jobs += 1
-        if status == 'Pending':
-            pending_jobs += 1
-        if status != 'Completed' and elapsedtime > 172800:
-            delayed_jobs += 1
+        if history_rows is not None:
+            history_rows.append(history_row(job))
+        if active is not None and not job.end_time:
+            active.append(job)
+        yield job
+
+def active_jobs(target):
+    """Jobs ativos do CommCell indexados pelo prazo de SLA, mantidos entre as execuções do daemon."""
+    return target.component("get-jobs.active", lambda: ActiveJobTracker(*JOB_SLA_LIMITS))
+
+def get_jobs_incremental(target, history_rows=None, active=None):
+    """Calcula as métricas de Jobs de forma incremental, a partir de um cursor persistido localmente.
+    
+    Os Jobs finalizados na última hora são mantidos, reduzidos aos campos das métricas (job_row()), em um arquivo de estado por CommCell (state/get-jobs.json, ou state/get-jobs-<nome>.json com TARGETS_FILE). A cada execução apenas os Jobs finalizados após o cursor são consultados e os que saíram da janela de 3600 segundos são descartados; as métricas são calculadas sobre a janela e os Jobs ativos, que são sempre consultados por completo. A cada JOB_RESYNC_INTERVAL segundos a janela inteira é consultada novamente, por segurança.
+    
+    Args:
+        target (Target): CommCell consultado.
+        history_rows (list, optional): Recebe as linhas do histórico (history_row()) dos Jobs novos na janela.
+        active (list, optional): Recebe os Jobs ativos.
+    
+    Returns:
+        dict: As mesmas métricas retornadas por parse_jobs().
+    
+    Raises:
+        requests.exceptions.RequestException: Se houver um erro durante a solicitação.
+    """
+    window = JobWindow(state_path(target.state_name("get-jobs") + ".json"), JOB_FILTERS['completedJobLookupTime'], JOB_RESYNC_INTERVAL)
+    def project(job):
+        if history_rows is not None:
+            history_rows.append(history_row(job))
+        return job_row(job)
+    window.update(target.api, project=project)
+    # Contadores gravados por versões anteriores do script
+    window.extra.pop("counters", None)
+    columns = JobColumns()
+    # Registros em dicionário ({status, jobElapsedTime}) também foram gravados por versões anteriores
+    columns.extend_rows(row if isinstance(row, list) else job_row(JobSummary.from_json(row)) for row in window.records.values())
+    columns.extend(collect_jobs(iter_jobs(target.api, {'jobCategory': 'Active'}), active=active))
+    window.save()
+    return job_metrics(columns)
+
+def history_metrics(target, rows):
+    """Grava os Jobs finalizados no histórico local do CommCell e calcula as métricas de tendência.
+
+    O histórico fica em state/job-history.sqlite (ou state/job-history-<nome>.sqlite com TARGETS_FILE).
+    Jobs já gravados em execuções anteriores são ignorados.
+
+    Args:
+        target (Target): CommCell consultado.
+        rows (list): Linhas do histórico (history_row()) dos Jobs consultados.
+
+    Returns:
+        dict: Métricas para o Zabbix com as seguintes chaves:
+            - "commvault.history.failure_rate_24h" e "commvault.history.failure_rate_7d": Taxa de falha (%) dos Jobs.
+            - "commvault.history.jobs_24h" e "commvault.history.jobs_7d": Jobs finalizados no período.
+            - "commvault.history.sla_compliance": Clientes (%) com backup com sucesso nas últimas JOB_SLA_HOURS horas.
+            - "commvault.history.sla_missed": Clientes sem backup com sucesso nas últimas JOB_SLA_HOURS horas.
+            - "commvault.history.clients": JSON com jobs, falhas, taxa de falha e último backup com sucesso (30 dias) dos clientes
+              fora do SLA ou com falhas, limitado a JOB_HISTORY_CLIENTS clientes e a 60000 bytes.
+            - "commvault.history.clients_attention": Clientes fora do SLA ou com falhas, antes do limite.
+    """
+    path = state_path(target.state_name("job-history") + ".sqlite")
+    with JobHistory(path, {"jobs": JOB_HISTORY_DAYS}) as history:
+        history.add(rows)
+        history.prune()
+        trends = history.trends(JOB_SLA_HOURS, max_clients=JOB_HISTORY_CLIENTS)
+    return {f"commvault.history.{name}": value for name, value in trends.items()}
+
+def sla_metrics(target, active):
+    """Atualiza os Jobs ativos do CommCell e calcula as métricas de prazo de SLA.
+
+    O prazo de cada Job é o início somado ao limite do seu grupo de clientes ou tipo de Job em
+    JOB_SLA_THRESHOLDS (padrão de 172800 segundos, o mesmo dos Jobs atrasados).
+
+    Args:
+        target (Target): CommCell consultado.
+        active (list): JobSummary de todos os Jobs ativos.
+
+    Returns:
+        dict: Métricas para o Zabbix com as seguintes chaves:
+            - "commvault.jobs.sla_active": Jobs ativos acompanhados.
+            - "commvault.jobs.sla_breached": Jobs ativos com o prazo vencido.
+            - "commvault.jobs.sla_next_breach": Segundos até o próximo Job ativo vencer o prazo (-1 se nenhum Job estiver dentro do prazo).
+            - "commvault.jobs.sla_breaches": JSON (LLD) dos Jobs com o prazo vencido, com o tempo além do prazo em "overdue" (segundos).
+    """
+    tracker = active_jobs(target)
+    tracker.update(active)
+    breached = tracker.breached_jobs()
+    next_breach = tracker.next_breach()
     return {
-        "commvault.failed_jobs": failed_jobs,
-        "commvault.running_jobs": running_jobs,
-        "commvault.completed_jobs": completed_jobs,
-        "commvault.queued_jobs": queued_jobs,
-        "commvault.waiting_jobs": waiting_jobs,
-        "commvault.pending_jobs": pending_jobs,
-        "commvault.delayed_jobs": delayed_jobs
+        "commvault.jobs.sla_active": len(tracker),
+        "commvault.jobs.sla_breached": len(breached),
+        "commvault.jobs.sla_next_breach": -1 if next_breach is None else next_breach,
+        "commvault.jobs.sla_breaches": [
+            {
+                "{#JOBID}": str(job.job_id),
+                "{#JOBTYPE}": job.job_type,
+                "{#CLIENTNAME}": job.client,
+                "{#CLIENTGROUP}": job.client_group,
+                "overdue": overdue,
+            }
+            for job, overdue in breached
+        ],
     }
 
-def send_to_zabbix(metrics):
+def send_to_zabbix(target, metrics):
     """Enviar métricas coletadas para o Zabbix.
-    Esta função pega um dicionário de métricas e envia cada par de chave-valor 
-    para o servidor Zabbix usando o executável zabbix_sender. Ele constrói um 
-    comando para cada métrica e o executa no shell. Se o comando falhar, uma 
-    mensagem de erro é impressa.
+    Esta função pega um dicionário de métricas e envia todos os pares de chave-valor
+    para o servidor Zabbix em um único lote, utilizando o protocolo nativo do
+    Zabbix sender. Se o envio falhar, uma mensagem de erro é impressa.
     Args:
+        target (Target): CommCell de origem, com o host correspondente no Zabbix.
         metrics (dict): Um dicionário onde as chaves são nomes de métricas e os 
                         valores são os valores de métricas correspondentes a serem 
                         enviados para o Zabbix.
     Raises:
-        subprocess.CalledProcessError: Se o comando zabbix_sender falhar na execução.
+        ZabbixSenderError: Se ocorrer algum erro na comunicação com o Zabbix.
+    """
+    try:
+        result = default_sender().send_metrics(target.zabbix_host, metrics)
+        print(f"{target.label}Enviado para o Zabbix: {result['processed']} processados, {result['failed']} com falha")
+    except ZabbixSenderError as e:
+        report_error(f"{target.label}Erro ao enviar para o Zabbix: {e}")
+
+@monitored("get-jobs")
+def run(target):
+    """Coleta as métricas de Jobs de um CommCell e as envia para o Zabbix.
+
+    Args:
+        target (Target): CommCell a ser consultado.
     """
-    for key, value in metrics.items():
-        cmd = f'C:\Zabbix\zabbix_sender.exe -z {ZABBIX_SERVER} -s {ZABBIX_HOST} -k {key} -o {value}'
+    metrics = None
+    history_rows = [] if JOB_HISTORY else None
+    active = [] if JOB_SLA_TRACKER else None
+    try:
+        with phase("transform"):
+            if JOB_INCREMENTAL:
+                metrics = get_jobs_incremental(target, history_rows, active)
+            else:
+                jobs = collect_jobs(get_jobs(target), history_rows, active)
+                first_job = next(jobs, None)
+                if first_job:
+                    metrics = parse_jobs(itertools.chain([first_job], jobs))
+    except (requests.exceptions.RequestException, ValueError) as e:
+        report_error(f"{target.label}Erro ao buscar jobs: {e}")
+    if metrics and JOB_HISTORY:
         try:
-            subprocess.run(cmd, shell=True, check=True)
-            print(f"Enviado para o Zabbix: {key} = {value}")
-        except subprocess.CalledProcessError as e:
-            print(f"Erro ao enviar para o Zabbix: {e}")
+            with phase("transform"):
+                metrics.update(history_metrics(target, history_rows))
+        except sqlite3.Error as e:
+            report_error(f"{target.label}Erro ao atualizar o histórico de Jobs: {e}")
+    if metrics and JOB_SLA_TRACKER:
+        if JOB_SLA_LIMITS is None:
+            report_error(f"{target.label}Métricas de SLA dos Jobs ativos não enviadas: {JOB_SLA_ERROR}")
+        else:
+            with phase("transform"):
+                metrics.update(sla_metrics(target, active))
+    if metrics:
+        publish_target(target, "get-jobs", job_samples(metrics))
+        send_to_zabbix(target, metrics)
+    else:
+        print(f"{target.label}Nenhum job encontrado ou erro na API.")
+    target.api.print_latency_report()
+
+def main():
+    """Coleta as métricas de Jobs de todos os CommCells configurados e as envia para o Zabbix."""
+    run_for_targets(run)
 
 if __name__ == "__main__":
-    jobs = get_jobs()
-    if jobs:
-        metrics = parse_jobs(jobs)
-        send_to_zabbix(metrics)
-    else:
-        print("Nenhum job encontrado ou erro na API.")
+    main()
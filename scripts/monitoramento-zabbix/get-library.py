@@ -1,36 +1,49 @@
 import os
+import sys
 from dotenv import load_dotenv # type: ignore
 import requests
 import json
-import time
-import subprocess
 import urllib3
+import contextvars
+from concurrent.futures import ThreadPoolExecutor, as_completed
+# Módulos compartilhados entre os scripts (scripts/common)
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "common"))
+from zabbix_sender import ZabbixSenderError, default_sender, zabbix_item
+from targets import run_for_targets
+from run_metrics import phase, iterate, report_error
+from self_monitoring import monitored
+from prometheus_metrics import collect_samples, library_samples, publish_target
+from discovery_state import DiscoveryState
+from delta_filter import DeltaFilter
+from records import Library, decode_records, loads
 urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
 
 # Carregando configurações
 load_dotenv()
-COMMVAULT_SERVER = os.getenv("COMMVAULT_SERVER")
 ZABBIX_SERVER = os.getenv("ZABBIX_SERVER")
-ZABBIX_HOST = os.getenv("ZABBIX_HOST")
 ZABBIX_KEY_LIBRARIES = os.getenv("ZABBIX_KEY_LIBRARIES")
-API_TOKEN = os.getenv("API_TOKEN")
+# Quantidade de Libraries consultadas em paralelo
+LIBRARY_WORKERS = int(os.getenv("LIBRARY_WORKERS", 8))
 
 # Endpoint da API para buscar Libraries
-BASE_URL = f'{COMMVAULT_SERVER}/commandcenter/api/Library'
+BASE_ENDPOINT = 'Library'
 
-# Cabeçalhos da requisição
-payload={}
-headers = {
-    'Authtoken': API_TOKEN,
-    'Content-Type': 'application/json',
-    'Accept': 'application/json'
-}
+def discovery(target):
+    """Fingerprint das LLDs enviadas pelo CommCell, para não reenviar descobertas iguais."""
+    return target.component("get-library.discovery", lambda: DiscoveryState.from_env(target.state_name("get-library")))
 
-def get_libraries():
+def delta(target):
+    """Envio apenas das métricas alteradas (DELTA_MODE) do CommCell, com heartbeat periódico."""
+    return target.component("get-library.delta", lambda: DeltaFilter.from_env(target.state_name("get-library")))
+
+def get_libraries(target):
     """Busca uma lista de Libraries na API do Commvault e formata os dados em uma Low Level Discovery (LLD) para o Zabbix.
     
     Esta função envia uma solicitação GET ao endpoint da API do Commvault, processa a resposta para extrair informações das Libraries e a formata em uma estrutura adequada para o LLD do Zabbix.
     
+    Args:
+        target (Target): CommCell consultado.
+    
     Returns:
         list: Uma lista de dicionários contendo o nome das Libraries formatados para uma LLD, onde cada dicionário tem a chave '"{#LIBRARYNAME}"' e o nome da biblioteca correspondente como valor. Se ocorrer um erro durante a solicitação, uma lista vazia é retornada.
     
@@ -38,22 +51,89 @@ def get_libraries():
         requests.exceptions.RequestException: Se houver um problema com a solicitação da API.
     """
     try:
-        response = requests.request("GET", BASE_URL, headers=headers, data=payload, verify=False)
-        data = json.loads(response.text)
-        json_array = [entry['entityInfo'] for entry in data['response']]
-        lld_data = [{'"{#LIBRARYNAME}"': json.dumps(ma["name"])} for ma in json_array]
+        data = target.api.get_cached(BASE_ENDPOINT)
+        libraries = decode_records(data['response'], Library.from_entity)
+        lld_data = [{"{#LIBRARYNAME}": json.dumps(library.name)} for library in libraries]
         return lld_data
     except requests.exceptions.RequestException as e:
-        print(f"Erro ao buscar MediaAgents: {e}")
+        report_error(f"{target.label}Erro ao buscar MediaAgents: {e}")
         return []
     
-def get_libraries_status():
+def get_library_details(target, library_id):
+    """Consulta o nome e as métricas (magLibSummary) de uma Library.
+    
+    Args:
+        target (Target): CommCell consultado.
+        library_id (int): ID da Library no Commvault.
+    
+    Returns:
+        Library: Nome e magLibSummary da Library, ou None se a API retornar erro.
+    
+    Raises:
+        requests.exceptions.RequestException: Se houver um problema com a solicitação da API.
+        ValueError: Se a resposta não for um JSON válido.
+        KeyError, TypeError: Se a resposta não tiver o libraryInfo ou o magLibSummary esperados.
+    """
+    response = target.api.get(f"{BASE_ENDPOINT}/{library_id}")
+    if response.status_code != 200:
+        report_error(f"{target.label}Erro ao buscar ID {library_id}: {response.status_code}")
+        return None
+    with phase("decode"):
+        return Library.from_details(loads(response.content), library_id)
+
+def iter_libraries_details(target, ids):
+    """Consulta os detalhes das Libraries em paralelo e os retorna à medida que cada resposta chega.
+    
+    As consultas são distribuídas em um pool com até LIBRARY_WORKERS threads, compartilhando o pool de conexões do cliente da API.
+    
+    Args:
+        target (Target): CommCell consultado.
+        ids (list): Lista de IDs de Library.
+    
+    Libraries cuja consulta falha ou cuja resposta não tem o formato esperado são informadas e ignoradas,
+    sem interromper as demais.
+    
+    Yields:
+        Library: Detalhes de cada Library retornados por get_library_details(), na ordem em que as respostas chegam.
+    """
+    with ThreadPoolExecutor(max_workers=max(1, LIBRARY_WORKERS)) as executor:
+        futures = {executor.submit(contextvars.copy_context().run, get_library_details, target, library_id): library_id for library_id in ids}
+        for future in as_completed(futures):
+            try:
+                library = future.result()
+            except (requests.exceptions.RequestException, ValueError) as e:
+                report_error(f"{target.label}Erro ao buscar ID {futures[future]}: {e}")
+                continue
+            except (KeyError, TypeError) as e:
+                report_error(f"{target.label}Resposta inesperada para a Library ID {futures[future]} (campo ausente ou inválido: {e})")
+                continue
+            if library:
+                yield library
+
+def library_items(target, library):
+    """Converte as métricas de uma Library em itens do Zabbix.
+    
+    Args:
+        target (Target): CommCell de origem, com o host correspondente no Zabbix.
+        library (Library): Detalhes da Library retornados por get_library_details().
+    
+    Yields:
+        dict: Um item <métrica>.library[<nome da library>] para cada campo do magLibSummary.
+    """
+    library_name = library.name
+    # Criar chave para cada métrica
+    for key, value in library.summary.items():
+        # Normalizar a chave (removendo espaços e caracteres especiais)
+        key_normalized = key.replace(" ", "_").lower()
+        yield zabbix_item(target.zabbix_host, f"{key_normalized}.library[{library_name}]", value)
+
+def get_libraries_status(target):
     """Consulta as métricas das Libraries do Commvault através de requisição na API e as envia para o Zabbix.
     
-    Esta função faz uma solicitação GET para a URL base para buscar uma lista de IDs de Library. Para cada ID, ela consulta informações detalhadas sobre a Library, incluindo seu nome e métricas. As métricas são então padronizadas e enviadas ao Zabbix para monitoramento.
+    Esta função faz uma solicitação GET para o endpoint base para buscar uma lista de IDs de Library. Os detalhes de cada Library, incluindo seu nome e métricas, são consultados em paralelo e as métricas padronizadas são repassadas ao envio para o Zabbix assim que cada resposta chega, sem aguardar a consulta de todas as Libraries.
     
     Args:
-        None
+        target (Target): CommCell consultado.
     
     Returns:
         None
@@ -61,76 +141,94 @@ def get_libraries_status():
     Raises:
         None
     """
-    response = requests.request("GET", BASE_URL, headers=headers, data=payload, verify=False)
-    response_data = json.loads(response.text)
-    ids = [item["entityInfo"]["id"] for item in response_data["response"]]
-    final_results = []
-    for library_id in ids:
-        url = f"{BASE_URL}/{library_id}"
-        response = requests.request("GET", url, headers=headers, data=payload, verify=False)
-        if response.status_code == 200:
-            data = response.json()
-            library_info = {
-                "libraryName": data["libraryInfo"]["library"]["libraryName"],
-                "magLibSummary": data["libraryInfo"]["magLibSummary"]
-            }
-            final_results.append(library_info)
-        else:
-            print(f"Erro ao buscar ID {library_id}: {response.status_code}")
-    for library in final_results:
-        library_name = library["libraryName"]
-        summary = library["magLibSummary"]
-        # Criar chave para cada métrica e adicionar à lista
-        for key, value in summary.items():
-            # Normalizar a chave (removendo espaços e caracteres especiais)
-            key_normalized = key.replace(" ", "_").lower()
-            send_to_zabbix_data(key_normalized, library_name, value)
+    try:
+        response_data = target.api.get_cached(BASE_ENDPOINT)
+    except requests.exceptions.RequestException as e:
+        report_error(f"{target.label}Erro ao buscar Libraries: {e}")
+        return
+    ids = [library.library_id for library in decode_records(response_data["response"], Library.from_entity)]
+    # A espera pelos detalhes conta como fetch e a conversão em itens como transform
+    libraries = iterate(iter_libraries_details(target, ids), "fetch")
+    samples = []
+    libraries = collect_samples(libraries, samples, library_samples)
+    items = iterate((item for library in libraries for item in library_items(target, library)), "transform")
+    send_to_zabbix_data(target, items)
+    publish_target(target, "get-library", samples)
 
-def send_to_zabbix(libraries):
-    """Envia uma lista de Libraries para o Zabbix usando o comando zabbix_sender.
+def send_to_zabbix(target, libraries):
+    """Envia uma lista de Libraries para o Zabbix utilizando o protocolo nativo do Zabbix sender.
     
-    Esta função constroi um comando para enviar dados de LLD para o Zabbix. Ela utiliza o módulo `subprocess` para executar o comando em um ambiente shell. Se o comando falhar, uma mensagem de erro será impressa.
+    Esta função serializa os dados de LLD em JSON e os envia para o item de descoberta do Zabbix. A LLD só é enviada quando o conjunto de Libraries muda em relação ao último envio (ou quando vence LLD_RESEND_INTERVAL). Se o envio falhar, uma mensagem de erro será impressa.
     
     Args:
-        libraries (str): Uma string que apresenta todas as Libraries a serem enviadas ao Zabbix.
+        target (Target): CommCell de origem, com o host correspondente no Zabbix.
+        libraries (list): Uma lista no formato LLD com todas as Libraries a serem enviadas ao Zabbix.
+    
+    Returns:
+        bool: True se novas Libraries foram descobertas e o Zabbix precisa de tempo para criar os itens.
     
     Raises:
-        subprocess.CalledProcessError: Se a execução do comando falhar.
+        ZabbixSenderError: Se ocorrer algum erro na comunicação com o Zabbix.
     """
-    cmd = f'echo -e \'"{ZABBIX_SERVER}" custom.discovery.ma "{libraries}"\' | C:\Zabbix\zabbix_sender.exe -z {ZABBIX_SERVER} -s {ZABBIX_HOST} -k {ZABBIX_KEY_LIBRARIES} -o "{libraries}"'
+    state = discovery(target)
+    changed, new_entities = state.check(target.zabbix_host, ZABBIX_KEY_LIBRARIES, libraries)
+    if not changed:
+        return False
     try:
-        subprocess.run(cmd, shell=True, capture_output=True, check=True, text=True)
-        #print(f"Enviado para o Zabbix: \n{ZABBIX_KEY} = {mediaagents}")
-    except subprocess.CalledProcessError as e:
-        print(f"Erro ao enviar para o Zabbix: {e}")
+        default_sender().send([zabbix_item(target.zabbix_host, ZABBIX_KEY_LIBRARIES, libraries)])
+        state.commit()
+        return new_entities
+    except ZabbixSenderError as e:
+        report_error(f"{target.label}Erro ao enviar para o Zabbix: {e}")
+        return False
 
-def send_to_zabbix_data(key_normalized,library_name,value):
-    """Envia dados para o Zabbix usando zabbix_sender.
+def send_to_zabbix_data(target, items):
+    """Envia as métricas das Libraries para o Zabbix em um único lote.
     
-    Esta função constroi um comando para enviar um valor especificado para um servidor Zabbix para uma chave e nome de library fornecidos. Ele executa o comando usando o módulo subprocess e manipula quaisquer erros que possam ocorrer durante a execução.
+    Esta função envia os itens <métrica>.library[<nome da library>] coletados na execução para o servidor Zabbix utilizando o protocolo nativo do Zabbix sender, e manipula quaisquer erros que possam ocorrer durante o envio. Cada lote é enviado assim que completo, permitindo receber um gerador. Com DELTA_MODE habilitado, apenas os valores alterados desde o último envio (ou com heartbeat vencido) são enviados; os envios com algum item rejeitado não são registrados e são repetidos na próxima execução.
     
     Args:
-        key_normalized (str): Padroniza a chave para o item Zabbix.
-        library_name (str): O nome da library associada à chave.
-        value (str): Valor a ser enviado para o servidor Zabbix.
+        target (Target): CommCell de origem.
+        items (iterable): Itens montados com zabbix_item().
     
     Raises:
-        subprocess.CalledProcessError: Se a execução do comando falhar.
+        ZabbixSenderError: Se ocorrer algum erro na comunicação com o Zabbix.
     
     Returns:
         None
     """
-    cmd = f'echo -e \'"{ZABBIX_SERVER}" {key_normalized}.library[{library_name}] "{value}"\' | C:\Zabbix\zabbix_sender.exe -z {ZABBIX_SERVER} -s {ZABBIX_HOST} -k {key_normalized}.library[{library_name}] -o "{value}"'
+    changes = delta(target)
     try:
-        subprocess.run(cmd, shell=True, capture_output=True, check=True, text=True)
-        print(f"Enviado para o Zabbix: \n'{ZABBIX_SERVER} {key_normalized}.library[{library_name}]:{value}'")
-    except subprocess.CalledProcessError as e:
-        print(f"Erro ao enviar para o Zabbix: {e}")
-if __name__ == "__main__":
-    libraries = get_libraries()
+        result = default_sender().send(changes.filter(items))
+        print(f"{target.label}Enviado para o Zabbix: {result['processed']} processados, {result['failed']} com falha, {changes.skipped} inalterados")
+        # Valores rejeitados (ex: itens ainda não criados pela LLD) ou descartados pela fila (SEND_QUEUE)
+        # não são registrados como enviados e seguem para a próxima execução
+        if not result["failed"]:
+            changes.commit()
+    except ZabbixSenderError as e:
+        report_error(f"{target.label}Erro ao enviar para o Zabbix: {e}")
+
+@monitored("get-library")
+def run(target):
+    """Descobre as Libraries de um CommCell, envia a LLD e em seguida as métricas de cada Library para o Zabbix.
+
+    Args:
+        target (Target): CommCell a ser consultado.
+    """
+    with phase("transform"):
+        libraries = get_libraries(target)
     if libraries:
-        send_to_zabbix(libraries)
+        # Aguarda o Zabbix criar os itens somente quando há novas Libraries
+        if send_to_zabbix(target, libraries):
+            discovery(target).wait_for_items()
     else:
-        print("Nenhuma Library encontrada ou erro na API.")
-    time.sleep(10)
-    get_libraries_status()
\ No newline at end of file
+        print(f"{target.label}Nenhuma Library encontrada ou erro na API.")
+    get_libraries_status(target)
+    target.api.print_latency_report()
+
+def main():
+    """Coleta as Libraries de todos os CommCells configurados e as envia para o Zabbix."""
+    run_for_targets(run)
+
+if __name__ == "__main__":
+    main()
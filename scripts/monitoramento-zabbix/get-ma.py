@@ -1,35 +1,45 @@
 import os
+import sys
 from dotenv import load_dotenv # type: ignore
 import requests
 import json
-import subprocess
 import urllib3
+# Módulos compartilhados entre os scripts (scripts/common)
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "common"))
+from zabbix_sender import ZabbixSenderError, default_sender, zabbix_item
+from targets import run_for_targets
+from run_metrics import phase, report_error
+from self_monitoring import monitored
+from prometheus_metrics import media_agent_samples, publish_target
+from discovery_state import DiscoveryState
+from delta_filter import DeltaFilter
+from records import MediaAgent, decode_records
 urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
 
 # Carregando configurações
 load_dotenv()
-COMMVAULT_SERVER = os.getenv("COMMVAULT_SERVER")
 ZABBIX_SERVER = os.getenv("ZABBIX_SERVER")
-ZABBIX_HOST = os.getenv("ZABBIX_HOST")
 ZABBIX_KEY_MEDIAAGENT = os.getenv("ZABBIX_KEY_MEDIAAGENT")
-API_TOKEN = os.getenv("API_TOKEN")
 
 # Endpoint da API para buscar jobs
-url = f'{COMMVAULT_SERVER}/commandcenter/api/V4/mediaAgent'
+endpoint = 'V4/mediaAgent'
 
-# Cabeçalhos da requisição
-payload={}
-headers = {
-    'Authtoken': API_TOKEN,
-    'Content-Type': 'application/json',
-    'Accept': 'application/json'
-}
+def discovery(target):
+    """Fingerprint das LLDs enviadas pelo CommCell, para não reenviar descobertas iguais."""
+    return target.component("get-ma.discovery", lambda: DiscoveryState.from_env(target.state_name("get-ma")))
 
-def get_ma():
+def delta(target):
+    """Envio apenas dos status alterados (DELTA_MODE) do CommCell, com heartbeat periódico."""
+    return target.component("get-ma.delta", lambda: DeltaFilter.from_env(target.state_name("get-ma")))
+
+def get_ma(target):
     """Busca informações dos MediaAgents na API do Commvault.
     
     Esta função envia uma solicitação GET para a API do Commvault para consultar informações dos MediaAgents, processa a resposta e a formata para Low Level Dicovery (LLD) para o Zabbix. Em caso de falha na solicitação, ela manipula a exceção e retorna uma lista vazia.
     
+    Args:
+        target (Target): CommCell consultado.
+    
     Returns:
         list: Uma lista de dicionários contendo nomes de exibição dos MediaAgents formatados em LLD, ou uma lista vazia se ocorrer um erro.
     
@@ -37,22 +47,21 @@ def get_ma():
         requests.exceptions.RequestException: Se houver um erro durante a solicitação da API.
     """
     try:
-        response = requests.request("GET", url, headers=headers, data=payload, verify=False)
-        data = json.loads(response.text)
-        ma_list = [
-            {"displayName":ma["displayName"]}
-            for ma in data.get("mediaAgents",[])
-        ]
-        lld_data = [{'"{#HOSTNAME}"': json.dumps(ma["displayName"])} for ma in ma_list]
+        data = target.api.get_cached(endpoint)
+        ma_list = decode_records(data.get("mediaAgents"), MediaAgent.from_json)
+        lld_data = [{"{#HOSTNAME}": json.dumps(ma.name)} for ma in ma_list]
         return lld_data
     except requests.exceptions.RequestException as e:
-        print(f"Erro ao buscar MediaAgents: {e}")
+        report_error(f"{target.label}Erro ao buscar MediaAgents: {e}")
         return []
 
-def get_ma_status():
+def get_ma_status(target):
     """Busca o status dos MediaAgents na API do Commvault e formata os dados em uma Low Level Discovery (LLD) para o Zabbix.
     
-    Esta função envia uma solicitação GET ao endpoint da API do Commvault para consultar o status dos MediaAgents. Ela processa a resposta para extrair o status de cada MediaAgent, formata-as para LLD e envia os dados para o Zabbix.
+    Esta função envia uma solicitação GET ao endpoint da API do Commvault para consultar o status dos MediaAgents. Ela processa a resposta para extrair o status de cada MediaAgent, formata-as para LLD e envia os dados para o Zabbix em um único lote.
+    
+    Args:
+        target (Target): CommCell consultado.
     
     Returns:
         list: Uma lista de dicionários contendo o status de cada MediaAgent se a operação for bem-sucedida, ou uma lista vazia em caso de exceção.
@@ -61,65 +70,92 @@ def get_ma_status():
         requests.exceptions.RequestException: Se houver um erro durante a solicitação da API.
     """
     try:
-        response = requests.request("GET", url, headers=headers, data=payload, verify=False)
-        data = json.loads(response.text)
-        ma_list = [
-            {"displayName":ma["displayName"],"status":ma["status"]}
-            for ma in data.get("mediaAgents",[])
-        ]
-        lld_data = [{"{#HOSTNAME}": json.dumps(ma["displayName"]),"{#STATUS}": json.dumps(ma["status"])} for ma in ma_list]
-        for item in lld_data:
-            mediaAgent = item.get("{#HOSTNAME}")
-            status = item.get("{#STATUS}")
-            send_to_zabbix_data(mediaAgent, status)
+        data = target.api.get_cached(endpoint)
+        ma_list = decode_records(data.get("mediaAgents"), MediaAgent.from_json)
+        lld_data = [{"{#HOSTNAME}": json.dumps(ma.name),"{#STATUS}": json.dumps(ma.status)} for ma in ma_list]
+        publish_target(target, "get-ma", media_agent_samples(ma_list))
+        send_to_zabbix_data(target, lld_data)
         return []
     except requests.exceptions.RequestException as e:
-        print(f"Erro ao buscar Status MediaAgents: {e}")
+        report_error(f"{target.label}Erro ao buscar Status MediaAgents: {e}")
         return []
 
-def send_to_zabbix(mediaagents):
+def send_to_zabbix(target, mediaagents):
     """Enviar dados do MediaAgent para o servidor Zabbix.
     
-    Esta função constrói um comando para enviar informações do MediaAgent para um servidor Zabbix usando o aplicativo `zabbix_sender`. Ele executa o comando em um shell e manipula quaisquer erros que possam ocorrer durante a execução.
+    Esta função serializa a lista de MediaAgents (LLD) em JSON e a envia para o servidor Zabbix utilizando o protocolo nativo do Zabbix sender. A LLD só é enviada quando o conjunto de MediaAgents muda em relação ao último envio (ou quando vence LLD_RESEND_INTERVAL). Em caso de falha no envio uma mensagem de erro será impressa.
     
     Args:
-        mediaagents (str): Os dados do MediaAgent a serem enviados ao servidor Zabbix.
+        target (Target): CommCell de origem, com o host correspondente no Zabbix.
+        mediaagents (list): Os dados do MediaAgent no formato LLD a serem enviados ao servidor Zabbix.
+    
+    Returns:
+        bool: True se novas MediaAgents foram descobertas e o Zabbix precisa de tempo para criar os itens.
     
     Raises:
-        subprocess.CalledProcessError: Se a execução do comando falhar.
+        ZabbixSenderError: Se ocorrer algum erro na comunicação com o Zabbix.
     """
-    cmd = f'echo -e \'"{ZABBIX_SERVER}" custom.discovery.ma "{mediaagents}"\' | C:\Zabbix\zabbix_sender.exe -z {ZABBIX_SERVER} -s {ZABBIX_HOST} -k {ZABBIX_KEY_MEDIAAGENT} -o "{mediaagents}"'
+    state = discovery(target)
+    changed, new_entities = state.check(target.zabbix_host, ZABBIX_KEY_MEDIAAGENT, mediaagents)
+    if not changed:
+        return False
     try:
-        subprocess.run(cmd, shell=True, capture_output=True, check=True, text=True)
-    except subprocess.CalledProcessError as e:
-        print(f"Erro ao enviar para o Zabbix: {e}")
+        default_sender().send([zabbix_item(target.zabbix_host, ZABBIX_KEY_MEDIAAGENT, mediaagents)])
+        state.commit()
+        return new_entities
+    except ZabbixSenderError as e:
+        report_error(f"{target.label}Erro ao enviar para o Zabbix: {e}")
+        return False
 
-def send_to_zabbix_data(mediaAgent,status):
-    """Envia dados de status dos MediaAgents para o Zabbix usando zabbix_sender.
+def send_to_zabbix_data(target, mediaagents):
+    """Envia dados de status dos MediaAgents para o Zabbix em um único lote.
     
-    Esta função constrói um comando para enviar o status de cada MediaAgent para um servidor Zabbix usando o executável zabbix_sender. Ele executa o comando em um shell e manipula quaisquer erros que possam ocorrer durante a execução.
+    Esta função monta um item status.ma[<MediaAgent>] para cada MediaAgent e envia todos os itens para o servidor Zabbix utilizando o protocolo nativo do Zabbix sender. Com DELTA_MODE habilitado, apenas os status alterados desde o último envio (ou com heartbeat vencido) são enviados; os envios com algum item rejeitado não são registrados e são repetidos na próxima execução. Em caso de falha no envio uma mensagem de erro será impressa.
     
     Args:
-        mediaAgent (str): Nome do MediaAgent para o qual o status está sendo enviado.
-        status (str): Status do MediaAgent a ser enviado ao servidor Zabbix.
+        target (Target): CommCell de origem, com o host correspondente no Zabbix.
+        mediaagents (list): Lista de dicionários com as chaves "{#HOSTNAME}" e "{#STATUS}" de cada MediaAgent.
     
     Raises:
-        subprocess.CalledProcessError: Se a execução do comando falhar.
+        ZabbixSenderError: Se ocorrer algum erro na comunicação com o Zabbix.
     
     Returns:
         None
     """
-    cmd = f'echo -e \'"{ZABBIX_SERVER}" status.ma[{mediaAgent}] "{status}"\' | C:\Zabbix\zabbix_sender.exe -z {ZABBIX_SERVER} -s {ZABBIX_HOST} -k status.ma[{mediaAgent}] -o "{status}"'
+    items = [
+        zabbix_item(target.zabbix_host, f'status.ma[{ma["{#HOSTNAME}"]}]', ma["{#STATUS}"])
+        for ma in mediaagents
+    ]
+    changes = delta(target)
     try:
-        subprocess.run(cmd, shell=True, capture_output=True, check=True, text=True)
-        print(f"Enviado para o Zabbix: \n'{ZABBIX_SERVER} status.ma[{mediaAgent}] {status}'")
-    except subprocess.CalledProcessError as e:
-        print(f"Erro ao enviar para o Zabbix: {e}")
+        result = default_sender().send(changes.filter(items))
+        print(f"{target.label}Enviado para o Zabbix: {result['processed']} processados, {result['failed']} com falha, {changes.skipped} inalterados")
+        # Valores rejeitados (ex: itens ainda não criados pela LLD) ou descartados pela fila (SEND_QUEUE)
+        # não são registrados como enviados e seguem para a próxima execução
+        if not result["failed"]:
+            changes.commit()
+    except ZabbixSenderError as e:
+        report_error(f"{target.label}Erro ao enviar para o Zabbix: {e}")
 
-if __name__ == "__main__":
-    mediaagents = get_ma()
+@monitored("get-ma")
+def run(target):
+    """Descobre os MediaAgents de um CommCell, envia a LLD e em seguida o status de cada MediaAgent para o Zabbix.
+
+    Args:
+        target (Target): CommCell a ser consultado.
+    """
+    with phase("transform"):
+        mediaagents = get_ma(target)
     if mediaagents:
-        send_to_zabbix(mediaagents)
-        get_ma_status()
+        send_to_zabbix(target, mediaagents)
+        get_ma_status(target)
     else:
-        print("Nenhum MediaAgent encontrado ou erro na API.")
+        print(f"{target.label}Nenhum MediaAgent encontrado ou erro na API.")
+    target.api.print_latency_report()
+
+def main():
+    """Coleta os MediaAgents de todos os CommCells configurados e os envia para o Zabbix."""
+    run_for_targets(run)
+
+if __name__ == "__main__":
+    main()
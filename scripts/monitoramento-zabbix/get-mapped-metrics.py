@@ -0,0 +1,65 @@
+import os
+import sys
+from dotenv import load_dotenv # type: ignore
+import urllib3
+# Módulos compartilhados entre os scripts (scripts/common)
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "common"))
+from zabbix_sender import ZabbixSenderError, default_sender
+from targets import run_for_targets
+from run_metrics import report_error
+from self_monitoring import monitored
+from metric_mapping import MappingError, load_mappings, extract_metrics
+urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
+
+# Carregando configurações
+load_dotenv()
+# Arquivo JSON com os mapeamentos endpoint -> métricas (veja metric-mappings.example.json); por padrão,
+# no diretório do script, independente do diretório de trabalho (cron, collector-daemon.py)
+METRIC_MAPPINGS = os.getenv("METRIC_MAPPINGS", os.path.join(os.path.dirname(os.path.abspath(__file__)), "metric-mappings.json"))
+
+# Mapeamentos compilados uma única vez, na carga do script (no collector-daemon.py, uma vez por processo)
+try:
+    EXTRACTORS = load_mappings(METRIC_MAPPINGS)
+except (OSError, MappingError) as e:
+    EXTRACTORS = None
+    MAPPING_ERROR = e
+
+def send_to_zabbix(target, metrics):
+    """Envia as métricas mapeadas para o Zabbix em um único lote.
+
+    Args:
+        target (Target): CommCell de origem, com o host correspondente no Zabbix.
+        metrics (dict): Chave do Zabbix -> valor.
+
+    Raises:
+        ZabbixSenderError: Se ocorrer algum erro na comunicação com o Zabbix.
+    """
+    try:
+        result = default_sender().send_metrics(target.zabbix_host, metrics)
+        print(f"{target.label}Enviado para o Zabbix: {result['processed']} processados, {result['failed']} com falha")
+    except ZabbixSenderError as e:
+        report_error(f"{target.label}Erro ao enviar para o Zabbix: {e}")
+
+@monitored("get-mapped-metrics")
+def run(target):
+    """Consulta os endpoints dos mapeamentos de um CommCell e envia as métricas extraídas para o Zabbix.
+
+    Args:
+        target (Target): CommCell a ser consultado.
+    """
+    if EXTRACTORS is None:
+        report_error(f"{target.label}Mapeamentos de métricas não carregados: {MAPPING_ERROR}")
+        return
+    metrics = extract_metrics(target.api, EXTRACTORS, target.label)
+    if metrics:
+        send_to_zabbix(target, metrics)
+    else:
+        print(f"{target.label}Nenhuma métrica extraída.")
+    target.api.print_latency_report()
+
+def main():
+    """Envia as métricas mapeadas de todos os CommCells configurados para o Zabbix."""
+    run_for_targets(run)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,151 @@
+import re
+from metrics_exporter import publish, sample
+
+# Status de Jobs exportados em commvault_jobs{status=...} (mesmos contadores enviados ao Zabbix)
+JOB_STATUSES = ("failed", "running", "completed", "queued", "waiting", "pending")
+# Níveis de saúde do CommCell (chaves key.health-<nível> de get_commcell_health)
+HEALTH_LEVELS = ("good", "info", "warning", "critical")
+# Multiplicadores dos tamanhos do magLibSummary (ex: "10 TB")
+SIZE_UNITS = {"B": 1, "KB": 1024, "MB": 1024 ** 2, "GB": 1024 ** 3, "TB": 1024 ** 4, "PB": 1024 ** 5}
+SIZE_PATTERN = re.compile(r"^\s*([0-9]+(?:[.,][0-9]+)?)\s*([KMGTP]?B)\s*$", re.IGNORECASE)
+BOOLEANS = {"yes": 1, "no": 0, "true": 1, "false": 0}
+
+
+def commcell_label(target):
+    """Valor do label commcell de um alvo: o host no Zabbix para o alvo padrão, ou o nome do alvo."""
+    return (target.zabbix_host or target.name) if target.default else target.name
+
+
+def publish_target(target, collector, samples):
+    """Publica as amostras de um coletor para um CommCell no snapshot do exporter."""
+    publish(f"{collector}@{target.name}", samples, commcell=commcell_label(target))
+
+
+def collect_samples(iterable, samples, convert):
+    """Repassa os elementos de iterable, acumulando em samples as amostras de convert(elemento)."""
+    for value in iterable:
+        samples.extend(convert(value))
+        yield value
+
+
+def job_samples(metrics):
+    """Converte as métricas de job_metrics() (get-jobs) em amostras do Prometheus."""
+    samples = [
+        sample("commvault_jobs", metrics.get(f"commvault.{name}_jobs", 0), "Jobs por status", status=name)
+        for name in JOB_STATUSES
+    ]
+    samples.append(sample("commvault_jobs_delayed", metrics.get("commvault.delayed_jobs", 0), "Jobs com tempo de execução elevado"))
+    samples.append(sample("commvault_jobs_total", metrics.get("commvault.total_jobs", 0), "Total de Jobs consultados"))
+    for name in ("p50", "p90", "p95", "p99", "max"):
+        value = metrics.get(f"commvault.job_elapsed.{name}")
+        if value is not None:
+            quantile = "1" if name == "max" else str(int(name[1:]) / 100)
+            samples.append(sample("commvault_job_elapsed_seconds", value, "Tempo de execução dos Jobs (percentis)", quantile=quantile))
+    for entry in metrics.get("commvault.jobs.breakdown", []):
+        samples.append(sample("commvault_jobs_breakdown", entry["count"], "Jobs por status, tipo e grupo de clientes",
+                              status=entry["status"], job_type=entry["jobType"], client_group=entry["clientGroup"]))
+    for entry in metrics.get("commvault.jobs.mediaagents", []):
+        media_agent = entry["mediaAgent"]
+        samples.append(sample("commvault_mediaagent_jobs", entry["jobs"], "Jobs por MediaAgent", media_agent=media_agent))
+        samples.append(sample("commvault_mediaagent_bytes", entry["bytes"], "Bytes dos Jobs por MediaAgent", media_agent=media_agent))
+        samples.append(sample("commvault_mediaagent_throughput_bytes_per_second", entry["throughput"],
+                              "Vazão dos Jobs por MediaAgent", media_agent=media_agent))
+    for period in ("24h", "7d"):
+        if f"commvault.history.failure_rate_{period}" in metrics:
+            samples.append(sample("commvault_history_failure_rate_percent", metrics[f"commvault.history.failure_rate_{period}"],
+                                  "Taxa de falha dos Jobs finalizados (histórico local)", period=period))
+            samples.append(sample("commvault_history_jobs", metrics[f"commvault.history.jobs_{period}"],
+                                  "Jobs finalizados (histórico local)", period=period))
+    if "commvault.history.sla_compliance" in metrics:
+        samples.append(sample("commvault_history_sla_compliance_percent", metrics["commvault.history.sla_compliance"],
+                              "Clientes com backup com sucesso dentro do SLA"))
+        samples.append(sample("commvault_history_sla_missed_clients", metrics["commvault.history.sla_missed"],
+                              "Clientes sem backup com sucesso dentro do SLA"))
+        samples.append(sample("commvault_history_attention_clients", metrics["commvault.history.clients_attention"],
+                              "Clientes fora do SLA ou com Jobs com falha"))
+    if "commvault.jobs.sla_breached" in metrics:
+        samples.append(sample("commvault_jobs_sla_breached", metrics["commvault.jobs.sla_breached"], "Jobs ativos com o prazo de SLA vencido"))
+        samples.append(sample("commvault_jobs_sla_next_breach_seconds", metrics["commvault.jobs.sla_next_breach"],
+                              "Segundos até o próximo Job ativo vencer o prazo de SLA (-1 se nenhum)"))
+    return samples
+
+
+def media_agent_samples(media_agents):
+    """Converte o status dos MediaAgents (lista de MediaAgent) em amostras do Prometheus."""
+    return [
+        sample("commvault_mediaagent_status", 1, "Status do MediaAgent (1 para o status atual)",
+               media_agent=ma.name, status=ma.status)
+        for ma in media_agents
+    ]
+
+
+def parse_value(value):
+    """Converte um valor do magLibSummary em número.
+
+    Returns:
+        tuple: (valor numérico, True se for um tamanho convertido em bytes), ou (None, False) se o
+        valor não for numérico (ex: um texto livre).
+    """
+    if isinstance(value, bool):
+        return int(value), False
+    if isinstance(value, (int, float)):
+        return value, False
+    if not isinstance(value, str):
+        return None, False
+    text = value.strip()
+    if text.lower() in BOOLEANS:
+        return BOOLEANS[text.lower()], False
+    match = SIZE_PATTERN.match(text)
+    if match:
+        return float(match.group(1).replace(",", ".")) * SIZE_UNITS[match.group(2).upper()], True
+    try:
+        return float(text), False
+    except ValueError:
+        return None, False
+
+
+def library_samples(library):
+    """Converte as métricas de uma Library (registro Library de get_library_details()) em amostras do Prometheus.
+
+    Cada campo numérico do magLibSummary vira commvault_library_<campo> (com o sufixo _bytes para
+    tamanhos). Campos de texto livre são ignorados.
+    """
+    samples = []
+    for key, value in library.summary.items():
+        number, is_size = parse_value(value)
+        if number is None:
+            continue
+        name = "commvault_library_" + re.sub(r"[^a-z0-9_]", "_", key.replace(" ", "_").lower())
+        samples.append(sample(name + "_bytes" if is_size else name, number, f"magLibSummary: {key}", library=library.name))
+    return samples
+
+
+def health_samples(metrics):
+    """Converte as métricas de get_commcell_health() em amostras do Prometheus."""
+    return [
+        sample("commvault_commcell_health", metrics[f"key.health-{level}"], "Itens de saúde do CommCell por nível", level=level)
+        for level in HEALTH_LEVELS
+        if f"key.health-{level}" in metrics
+    ]
+
+
+def run_samples(summary):
+    """Converte o resumo de uma execução (RunMetrics.summary()) em amostras do Prometheus."""
+    collector = summary["collector"]
+    return [
+        sample("commvault_collector_last_run_timestamp_seconds", summary["started"], "Início da última execução do coletor", collector=collector),
+        sample("commvault_collector_duration_seconds", summary["duration"], "Duração da última execução do coletor", collector=collector),
+        sample("commvault_collector_errors", summary["errors"], "Erros na última execução do coletor", collector=collector),
+    ]
+
+
+def api_samples(stats):
+    """Converte o estado do controle de concorrência da API (RequestGovernor.stats()) em amostras do Prometheus."""
+    return [
+        sample("commvault_api_concurrency_limit", stats["limit"], "Requisições simultâneas permitidas ao CommServe"),
+        sample("commvault_api_in_flight", stats["in_flight"], "Requisições em andamento ao CommServe"),
+        sample("commvault_api_queue_depth", stats["waiting"], "Requisições aguardando vaga para o CommServe"),
+        sample("commvault_api_requests_total", stats["requests"], "Requisições ao CommServe", type="counter"),
+        sample("commvault_api_throttled_total", stats["throttled"], "Reduções do limite de concorrência por sobrecarga", type="counter"),
+        sample("commvault_api_queue_seconds_total", stats["wait_seconds"], "Tempo total de espera por vaga", type="counter"),
+    ]
@@ -0,0 +1,162 @@
+import os
+import time
+from collections import OrderedDict
+from local_state import state_path, load_state, save_state
+
+# Quantidade máxima de Jobs lembrados; os vistos há mais tempo são descartados primeiro
+DEFAULT_MAX_ENTRIES = 100000
+# Tempo, em segundos, após a última vez em que o Job foi visto para esquecê-lo. Deve ser maior que
+# a janela consultada pelo coletor, senão o status é reenviado enquanto o Job ainda está na janela
+DEFAULT_TTL = 86400
+# Envios rejeitados pelo Zabbix após os quais um status é registrado como enviado mesmo assim
+DEFAULT_MAX_ATTEMPTS = 3
+
+
+class SeenJobs:
+    """Índice persistente e limitado dos Jobs cujo status já foi enviado ao Zabbix.
+
+    Para cada jobId é guardado o último status enviado e o momento em que o Job foi visto pela
+    última vez, em ordem de uso (LRU). filter() repassa apenas os Jobs novos ou com status diferente
+    do enviado; os demais apenas renovam a entrada. Entradas sem uso há mais de ttl segundos ou além
+    de max_entries são descartadas. O arquivo de estado guarda a tabela de status uma única vez e
+    cada Job como [jobId, código do status, visto em], na ordem LRU. Os status só são registrados
+    como enviados após commit(), chamado ao final do envio ao Zabbix. Como o Zabbix não informa
+    quais itens de um envio foram rejeitados, um envio com falhas mantém todos os status repassados
+    para a próxima execução, contando as tentativas de cada um; após max_attempts envios com falha o
+    status é registrado mesmo assim, para que um item rejeitado permanentemente não seja reenviado
+    para sempre.
+    """
+
+    def __init__(self, path, max_entries=DEFAULT_MAX_ENTRIES, ttl=DEFAULT_TTL, enabled=True,
+                 max_attempts=DEFAULT_MAX_ATTEMPTS):
+        self.path = path
+        self.max_entries = int(max_entries)
+        self.ttl = float(ttl)
+        self.enabled = enabled
+        self.max_attempts = max(1, int(max_attempts))
+        self.jobs = OrderedDict()
+        # jobId -> [status, envios com falha] dos status ainda não registrados
+        self.attempts = {}
+        self.pending = {}
+        self.skipped = 0
+        self.given_up = 0
+        if enabled:
+            self._load()
+
+    @classmethod
+    def from_env(cls, name):
+        """Cria o índice a partir de SEEN_JOBS, SEEN_JOBS_MAX, SEEN_JOBS_TTL e SEEN_JOBS_ATTEMPTS.
+
+        Args:
+            name (str): Nome do coletor, utilizado no nome do arquivo de estado (state/seen-<name>.json).
+
+        Returns:
+            SeenJobs: Índice configurado. Com SEEN_JOBS desabilitado todos os Jobs são repassados.
+        """
+        enabled = os.getenv("SEEN_JOBS", "true").lower() in ("1", "true", "yes", "sim")
+        return cls(
+            state_path(f"seen-{name}.json") if enabled else None,
+            max_entries=os.getenv("SEEN_JOBS_MAX", DEFAULT_MAX_ENTRIES),
+            ttl=os.getenv("SEEN_JOBS_TTL", DEFAULT_TTL),
+            enabled=enabled,
+            max_attempts=os.getenv("SEEN_JOBS_ATTEMPTS", DEFAULT_MAX_ATTEMPTS),
+        )
+
+    def _load(self):
+        state = load_state(self.path) or {}
+        statuses = state.get("statuses", [])
+        try:
+            for job_id, code, seen in state.get("jobs", []):
+                self.jobs[str(job_id)] = [statuses[code], seen]
+            for job_id, code, count in state.get("attempts", []):
+                self.attempts[str(job_id)] = [statuses[code], count]
+        except (TypeError, ValueError, IndexError) as e:
+            print(f"Arquivo de estado {self.path} ignorado: {e}")
+            self.jobs.clear()
+            self.attempts.clear()
+
+    def __len__(self):
+        return len(self.jobs)
+
+    def filter(self, jobs, now=None):
+        """Repassa apenas os Jobs ainda não enviados ou cujo status mudou.
+
+        Args:
+            jobs (iterable): Jobs no formato LLD, com as chaves "{#JOBID}" e "{#LOCALIZEDSTATUS}".
+            now (float, optional): Momento da consulta (padrão: agora).
+
+        Yields:
+            dict: Jobs cujo status deve ser enviado ao Zabbix.
+        """
+        now = now or time.time()
+        self.pending = {}
+        self.skipped = 0
+        for job in jobs:
+            if not self.enabled:
+                yield job
+                continue
+            job_id = str(job["{#JOBID}"])
+            status = job["{#LOCALIZEDSTATUS}"]
+            last = self.jobs.get(job_id)
+            if last is not None and last[0] == status:
+                last[1] = now
+                self.jobs.move_to_end(job_id)
+                self.skipped += 1
+                continue
+            self.pending[job_id] = status
+            yield job
+
+    def commit(self, now=None, failed=False):
+        """Registra os Jobs repassados pelo último filter(), descarta as entradas vencidas e grava o estado.
+
+        Args:
+            now (float, optional): Momento do envio (padrão: agora).
+            failed (bool): O envio teve itens rejeitados ou descartados. Os status repassados só são
+                registrados após max_attempts envios com falha; até lá são repassados novamente.
+        """
+        if not self.enabled:
+            return
+        now = now or time.time()
+        sent = self.pending
+        self.given_up = 0
+        if failed:
+            sent = {}
+            attempts = {}
+            for job_id, status in self.pending.items():
+                last = self.attempts.get(job_id)
+                count = last[1] + 1 if last is not None and last[0] == status else 1
+                if count >= self.max_attempts:
+                    sent[job_id] = status
+                    self.given_up += 1
+                else:
+                    attempts[job_id] = [status, count]
+            # Apenas os Jobs repassados nesta execução mantêm a contagem de tentativas
+            self.attempts = attempts
+        else:
+            self.attempts = {}
+        for job_id, status in sent.items():
+            self.jobs[job_id] = [status, now]
+            self.jobs.move_to_end(job_id)
+        self.pending = {}
+        self._evict(now)
+        self._save()
+
+    def _evict(self, now):
+        limit = now - self.ttl
+        while self.jobs:
+            job_id, (_, seen) = next(iter(self.jobs.items()))
+            if seen >= limit and len(self.jobs) <= self.max_entries:
+                break
+            del self.jobs[job_id]
+
+    def _save(self):
+        codes = {}
+        jobs = []
+        for job_id, (status, seen) in self.jobs.items():
+            code = codes.setdefault(status, len(codes))
+            jobs.append([int(job_id) if job_id.isdigit() else job_id, code, int(seen)])
+        attempts = [
+            [int(job_id) if job_id.isdigit() else job_id, codes.setdefault(status, len(codes)), count]
+            for job_id, (status, count) in self.attempts.items()
+        ]
+        save_state(self.path, {"statuses": list(codes), "jobs": jobs, "attempts": attempts})
@@ -0,0 +1,85 @@
+import os
+import json
+import functools
+from run_metrics import collector_run
+from zabbix_sender import ZabbixSenderError, default_sender, zabbix_item
+from prometheus_metrics import api_samples, publish_target, run_samples
+
+# Contadores da execução enviados como itens collector.<contador>[<coletor>]
+COUNTERS = ("requests", "http_bytes", "items", "errors")
+# Estado do controle de concorrência da API (RequestGovernor.stats()) enviado como commvault.api.<campo>
+GOVERNOR_FIELDS = ("limit", "in_flight", "waiting", "requests", "throttled", "wait_seconds")
+
+
+def enabled():
+    return os.getenv("SELF_MONITORING", "false").lower() in ("1", "true", "yes", "sim")
+
+
+def run_items(summary, host, clock=None):
+    """Converte o resumo de uma execução (RunMetrics.summary()) em itens internos do Zabbix.
+
+    Args:
+        summary (dict): Resumo da execução.
+        host (str): Host do CommCell no Zabbix.
+        clock (int, optional): Timestamp dos valores.
+
+    Returns:
+        list: Itens collector.duration[<coletor>], collector.phase[<coletor>,<fase>],
+        collector.<contador>[<coletor>] e collector.endpoints[<coletor>] (JSON com a latência por endpoint).
+    """
+    name = summary["collector"]
+    items = [zabbix_item(host, f"collector.duration[{name}]", summary["duration"], clock)]
+    for phase, seconds in summary["phases"].items():
+        items.append(zabbix_item(host, f"collector.phase[{name},{phase}]", seconds, clock))
+    for counter in COUNTERS:
+        items.append(zabbix_item(host, f"collector.{counter}[{name}]", summary[counter], clock))
+    items.append(zabbix_item(host, f"collector.endpoints[{name}]", summary["endpoints"], clock))
+    return items
+
+
+def governor_items(stats, host, clock=None):
+    """Converte o estado do controle de concorrência da API de um CommCell em itens commvault.api.<campo>."""
+    return [zabbix_item(host, f"commvault.api.{field}", stats[field], clock) for field in GOVERNOR_FIELDS]
+
+
+def emit(metrics, target, governor):
+    """Imprime a linha de log JSON da execução e envia os itens internos para o host do CommCell."""
+    summary = metrics.summary()
+    print(json.dumps(dict(event="collector_run", target=target.name, host=target.zabbix_host, governor=governor, **summary)), flush=True)
+    try:
+        default_sender().send(run_items(summary, target.zabbix_host, summary["started"]) + governor_items(governor, target.zabbix_host))
+    except ZabbixSenderError as e:
+        print(f"{target.label}Erro ao enviar o automonitoramento para o Zabbix: {e}")
+
+
+def monitored(collector):
+    """Decorador da função run(target) de um coletor que instrumenta cada execução.
+
+    Com SELF_MONITORING habilitado, ao final de cada execução são emitidos uma linha de log JSON e
+    os itens internos de run_items() no host do CommCell. Uma exceção na execução é contada como erro
+    e repassada ao chamador. A duração e os erros de cada execução e o estado do controle de
+    concorrência da API do CommCell também são publicados para o exporter Prometheus (EXPORTER_PORT).
+
+    Args:
+        collector (str): Nome do coletor (ex: "get-jobs"), utilizado nas chaves dos itens.
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(target, *args, **kwargs):
+            metrics = None
+            try:
+                with collector_run(collector, target) as metrics:
+                    try:
+                        return func(target, *args, **kwargs)
+                    except Exception:
+                        metrics.add("errors")
+                        raise
+            finally:
+                if metrics is not None:
+                    governor = target.api.governor.stats()
+                    publish_target(target, f"{collector}.run", run_samples(metrics.summary()))
+                    publish_target(target, "api", api_samples(governor))
+                    if enabled():
+                        emit(metrics, target, governor)
+        return wrapper
+    return decorator
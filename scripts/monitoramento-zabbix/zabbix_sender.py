@@ -0,0 +1,627 @@
+import os
+import re
+import sys
+import json
+import time
+import socket
+import atexit
+import struct
+import threading
+from collections import deque
+from local_state import state_path
+from run_metrics import phase, record, report_error
+
+# Cabeçalho do protocolo Zabbix ("ZBXD" + flag 0x01) seguido do tamanho dos dados
+ZBXD_HEADER = b"ZBXD\x01"
+ZBXD_HEADER_SIZE = len(ZBXD_HEADER) + 8
+
+DEFAULT_PORT = 10051
+DEFAULT_TIMEOUT = 10
+# Mesmo limite de valores por requisição utilizado pelo zabbix_sender oficial
+DEFAULT_BATCH_SIZE = 250
+# Itens mantidos em memória aguardando envio (SEND_QUEUE); acima disso vão direto para o spool
+DEFAULT_QUEUE_SIZE = 10000
+# Intervalo, em segundos, entre tentativas de envio enquanto o Zabbix estiver indisponível
+DEFAULT_RETRY_INTERVAL = 30
+# Espera máxima, em segundos, para esvaziar a fila ao encerrar o processo
+DEFAULT_FLUSH_TIMEOUT = 30
+# Tamanho máximo do spool em disco, em MB
+DEFAULT_SPOOL_MAX_MB = 100
+
+INFO_PATTERN = re.compile(
+    r"processed:\s*(\d+);\s*failed:\s*(\d+);\s*total:\s*(\d+);\s*seconds spent:\s*([\d.]+)"
+)
+
+
+class ZabbixSenderError(Exception):
+    """Erro de comunicação com o Zabbix Server/Proxy (conexão, protocolo ou resposta inválida)."""
+
+
+def zabbix_item(host, key, value, clock=None):
+    """Monta um item no formato esperado pelo protocolo sender do Zabbix.
+
+    Args:
+        host (str): Nome do host no Zabbix.
+        key (str): Chave do item no Zabbix.
+        value (any): Valor a ser enviado. Dicionários e listas são serializados em JSON (ex: LLD).
+        clock (int, optional): Timestamp (epoch) do valor. Se omitido, é utilizado o horário atual.
+
+    Returns:
+        dict: Item pronto para ser enviado pelo ZabbixSender.
+    """
+    if isinstance(value, (dict, list)):
+        value = json.dumps(value)
+    return {
+        "host": host,
+        "key": key,
+        "value": str(value),
+        "clock": int(clock if clock is not None else time.time()),
+    }
+
+
+def parse_response_info(info):
+    """Extrai os contadores da resposta do Zabbix (ex: "processed: 3; failed: 0; total: 3; seconds spent: 0.000055").
+
+    Args:
+        info (str): Campo "info" da resposta do Zabbix.
+
+    Returns:
+        dict: Dicionário com as chaves processed, failed, total e seconds_spent.
+    """
+    match = INFO_PATTERN.search(info or "")
+    if not match:
+        raise ZabbixSenderError(f"Resposta do Zabbix em formato inesperado: {info}")
+    return {
+        "processed": int(match.group(1)),
+        "failed": int(match.group(2)),
+        "total": int(match.group(3)),
+        "seconds_spent": float(match.group(4)),
+    }
+
+
+class ZabbixSender:
+    """Cliente nativo do protocolo Zabbix sender (trapper), sem dependência do zabbix_sender.exe.
+
+    Os itens de uma execução são agrupados em lotes e cada lote é enviado em uma única requisição
+    TCP, no mesmo formato utilizado pelo zabbix_sender. O Zabbix encerra a conexão após responder
+    cada requisição, portanto é aberta uma conexão por lote.
+    """
+
+    def __init__(self, server, port=DEFAULT_PORT, timeout=DEFAULT_TIMEOUT, batch_size=DEFAULT_BATCH_SIZE):
+        self.server = server
+        self.port = int(port)
+        self.timeout = float(timeout)
+        self.batch_size = max(1, int(batch_size))
+
+    @classmethod
+    def from_env(cls):
+        """Cria o cliente a partir das variáveis de ambiente.
+
+        Utiliza ZABBIX_SERVER (aceita o formato servidor:porta), ZABBIX_PORT, ZABBIX_TIMEOUT e ZABBIX_BATCH_SIZE.
+
+        Returns:
+            ZabbixSender: Cliente configurado.
+        """
+        server = os.getenv("ZABBIX_SERVER", "")
+        port = os.getenv("ZABBIX_PORT", DEFAULT_PORT)
+        if server.count(":") == 1:
+            server, port = server.split(":")
+        return cls(
+            server,
+            port=port,
+            timeout=os.getenv("ZABBIX_TIMEOUT", DEFAULT_TIMEOUT),
+            batch_size=os.getenv("ZABBIX_BATCH_SIZE", DEFAULT_BATCH_SIZE),
+        )
+
+    def send(self, items):
+        """Envia itens para o Zabbix em lotes.
+
+        Os itens são consumidos de forma incremental: cada lote é enviado assim que atinge
+        batch_size itens, o que permite passar um gerador que produz itens à medida que os
+        dados chegam da API.
+
+        Args:
+            items (iterable): Itens montados com zabbix_item().
+
+        Returns:
+            dict: Totais de todos os lotes (processed, failed, total, seconds_spent e batches).
+
+        Raises:
+            ZabbixSenderError: Se ocorrer algum erro de conexão ou a resposta do Zabbix for inválida.
+        """
+        result = {"processed": 0, "failed": 0, "total": 0, "seconds_spent": 0.0, "batches": 0}
+        batch = []
+        for item in items:
+            batch.append(item)
+            if len(batch) >= self.batch_size:
+                self._add_result(result, self._send_batch(batch))
+                batch = []
+        if batch:
+            self._add_result(result, self._send_batch(batch))
+        return result
+
+    @staticmethod
+    def _add_result(result, batch_result):
+        for key in ("processed", "failed", "total", "seconds_spent"):
+            result[key] += batch_result[key]
+        result["batches"] += 1
+
+    def send_metrics(self, host, metrics, clock=None):
+        """Envia um dicionário de métricas (chave -> valor) de um mesmo host.
+
+        Args:
+            host (str): Nome do host no Zabbix.
+            metrics (dict): Dicionário onde as chaves são as chaves dos itens no Zabbix.
+            clock (int, optional): Timestamp (epoch) comum a todos os valores.
+
+        Returns:
+            dict: Totais retornados por send().
+        """
+        return self.send([zabbix_item(host, key, value, clock) for key, value in metrics.items()])
+
+    def _send_batch(self, batch):
+        payload = json.dumps({
+            "request": "sender data",
+            "data": batch,
+            "clock": int(time.time()),
+        }).encode("utf-8")
+        packet = ZBXD_HEADER + struct.pack("<Q", len(payload)) + payload
+        try:
+            with socket.create_connection((self.server, self.port), timeout=self.timeout) as conn:
+                conn.sendall(packet)
+                header = self._recv_exact(conn, ZBXD_HEADER_SIZE)
+                if not header.startswith(b"ZBXD"):
+                    raise ZabbixSenderError("Cabeçalho inválido na resposta do Zabbix.")
+                length = struct.unpack("<Q", header[5:])[0]
+                body = self._recv_exact(conn, length)
+        except (OSError, struct.error) as e:
+            raise ZabbixSenderError(f"Falha na comunicação com {self.server}:{self.port}: {e}") from e
+        try:
+            response = json.loads(body.decode("utf-8"))
+        except ValueError as e:
+            raise ZabbixSenderError(f"Resposta do Zabbix não é um JSON válido: {e}") from e
+        if response.get("response") != "success":
+            raise ZabbixSenderError(f"Zabbix recusou os dados: {response}")
+        return parse_response_info(response.get("info"))
+
+    @staticmethod
+    def _recv_exact(conn, size):
+        data = b""
+        while len(data) < size:
+            chunk = conn.recv(size - len(data))
+            if not chunk:
+                raise ZabbixSenderError("Conexão encerrada pelo Zabbix antes do fim da resposta.")
+            data += chunk
+        return data
+
+
+class _SendRequest:
+    def __init__(self, items):
+        self.items = items
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SharedSender:
+    """Envio compartilhado entre as threads do processo (ex: vários CommCells coletados em paralelo).
+
+    Os itens enviados ao mesmo tempo por threads diferentes são agrupados nos mesmos lotes de até
+    batch_size itens. Enquanto um lote está sendo enviado, os próximos envios se acumulam e seguem
+    juntos no lote seguinte, sem espera adicional quando há apenas um chamador. send() continua
+    síncrono: retorna somente após o Zabbix confirmar os lotes com os itens do chamador.
+    """
+
+    def __init__(self, sender):
+        self.sender = sender
+        self.batch_size = sender.batch_size
+        self._pending = []
+        self._sending = False
+        self._lock = threading.Lock()
+
+    def send(self, items):
+        """Envia itens para o Zabbix pelos lotes compartilhados. Veja ZabbixSender.send().
+
+        Quando um lote contém itens de mais de um chamador, a resposta do Zabbix não identifica os
+        itens rejeitados: cada chamador recebe como failed todas as falhas do lote (limitadas à sua
+        quantidade de itens), para que nenhum valor rejeitado seja considerado entregue, e como
+        seconds_spent o tempo do lote inteiro.
+
+        Raises:
+            ZabbixSenderError: Se o envio de algum lote com itens do chamador falhar.
+        """
+        result = {"processed": 0, "failed": 0, "total": 0, "seconds_spent": 0.0, "batches": 0}
+        chunk = []
+        with phase("send"):
+            for item in items:
+                chunk.append(item)
+                if len(chunk) >= self.batch_size:
+                    ZabbixSender._add_result(result, self._submit(chunk))
+                    record("items", len(chunk))
+                    chunk = []
+            if chunk:
+                ZabbixSender._add_result(result, self._submit(chunk))
+                record("items", len(chunk))
+        return result
+
+    def send_metrics(self, host, metrics, clock=None):
+        """Envia um dicionário de métricas (chave -> valor) de um mesmo host. Veja ZabbixSender.send_metrics()."""
+        return self.send([zabbix_item(host, key, value, clock) for key, value in metrics.items()])
+
+    def _submit(self, items):
+        request = _SendRequest(items)
+        with self._lock:
+            self._pending.append(request)
+            leader = not self._sending
+            self._sending = True
+        # A primeira thread a chegar envia os lotes pendentes de todas as outras
+        if leader:
+            self._drain()
+        request.done.wait()
+        if request.error:
+            raise request.error
+        return request.result
+
+    def _drain(self):
+        while True:
+            with self._lock:
+                if not self._pending:
+                    self._sending = False
+                    return
+                group, size = [], 0
+                while self._pending and (not group or size + len(self._pending[0].items) <= self.batch_size):
+                    request = self._pending.pop(0)
+                    group.append(request)
+                    size += len(request.items)
+            try:
+                batch_result = self.sender._send_batch([item for request in group for item in request.items])
+                # O Zabbix não informa quais itens foram rejeitados: cada chamador recebe as falhas do lote inteiro
+                for request in group:
+                    failed = min(len(request.items), batch_result["failed"])
+                    request.result = {
+                        "processed": len(request.items) - failed,
+                        "failed": failed,
+                        "total": len(request.items),
+                        "seconds_spent": batch_result["seconds_spent"],
+                    }
+            except ZabbixSenderError as e:
+                for request in group:
+                    request.error = e
+            except Exception as e:
+                for request in group:
+                    request.error = ZabbixSenderError(f"Falha inesperada no envio: {e!r}")
+            for request in group:
+                request.done.set()
+
+
+class SendSpool:
+    """Itens não enviados ao Zabbix, gravados em disco até serem reenviados.
+
+    Cada item ocupa uma linha JSON compacta ([host, chave, valor, clock]) acrescentada ao final do
+    arquivo. Os itens reenviados com sucesso são marcados por um offset (arquivo <spool>.offset), de
+    forma que um reenvio interrompido continua do ponto em que parou, inclusive em outra execução;
+    quando todo o arquivo foi reenviado ele é esvaziado. Um lote reenviado antes de uma queda do
+    processo, sem o offset gravado, pode ser reenviado novamente.
+    """
+
+    def __init__(self, path, max_bytes=DEFAULT_SPOOL_MAX_MB * 1024 * 1024):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.dropped = 0
+        self._offset_path = path + ".offset"
+        self._lock = threading.Lock()
+        self._offset = 0
+        try:
+            with open(self._offset_path, encoding="utf-8") as f:
+                self._offset = int(f.read().strip() or 0)
+        except (OSError, ValueError):
+            self._offset = 0
+        self._drop_partial_tail()
+
+    @classmethod
+    def from_env(cls):
+        """Cria o spool do script em execução (ex: state/spool-get-jobs.jsonl), limitado por SEND_SPOOL_MAX_MB."""
+        script = os.path.splitext(os.path.basename(sys.argv[0]))[0] or "zabbix"
+        max_mb = float(os.getenv("SEND_SPOOL_MAX_MB", DEFAULT_SPOOL_MAX_MB))
+        return cls(state_path(f"spool-{script}.jsonl"), int(max_mb * 1024 * 1024))
+
+    def _size(self):
+        try:
+            return os.path.getsize(self.path)
+        except OSError:
+            return 0
+
+    def _drop_partial_tail(self):
+        """Remove uma última linha incompleta (sem quebra de linha), deixada por uma queda do processo durante a gravação.
+
+        As gravações do processo são feitas sob o mesmo lock e sempre terminam em quebra de linha, portanto uma
+        linha incompleta no final do arquivo nunca será completada e impediria o avanço do offset.
+        """
+        try:
+            with open(self.path, "rb+") as f:
+                size = f.seek(0, os.SEEK_END)
+                if not size:
+                    return
+                f.seek(size - 1)
+                if f.read(1) == b"\n":
+                    return
+                # Procura a última quebra de linha a partir do final, em blocos
+                end = size
+                while end > 0:
+                    start = max(0, end - 65536)
+                    f.seek(start)
+                    newline = f.read(end - start).rfind(b"\n")
+                    if newline >= 0:
+                        end = start + newline + 1
+                        break
+                    end = start
+                f.truncate(end)
+                print(f"Spool de envio {self.path}: linha incompleta descartada ({size - end} bytes)")
+        except FileNotFoundError:
+            return
+        if self._offset > end:
+            self._offset = end
+
+    def pending(self):
+        """Retorna True se há itens aguardando reenvio."""
+        with self._lock:
+            return self._size() > self._offset
+
+    def append(self, items):
+        """Grava itens no final do spool.
+
+        Returns:
+            int: Quantidade de itens gravados. Os itens que não cabem em max_bytes são descartados.
+        """
+        lines = [json.dumps([item["host"], item["key"], item["value"], item["clock"]], separators=(",", ":")) + "\n" for item in items]
+        with self._lock:
+            available = self.max_bytes - (self._size() - self._offset)
+            accepted = []
+            for line in lines:
+                available -= len(line.encode("utf-8"))
+                if available < 0:
+                    break
+                accepted.append(line)
+            if accepted:
+                with open(self.path, "a", encoding="utf-8") as f:
+                    f.writelines(accepted)
+            self.dropped += len(lines) - len(accepted)
+        return len(accepted)
+
+    def read(self, limit):
+        """Lê até limit itens a partir do offset, sem removê-los do spool.
+
+        Returns:
+            tuple: (itens, offset após o último item lido), para advance() após o envio.
+        """
+        with self._lock:
+            items = []
+            partial = False
+            try:
+                with open(self.path, "rb") as f:
+                    f.seek(self._offset)
+                    offset = self._offset
+                    while len(items) < limit:
+                        line = f.readline()
+                        if not line.endswith(b"\n"):
+                            if line:
+                                partial = True
+                            break
+                        offset += len(line)
+                        try:
+                            host, key, value, clock = json.loads(line)
+                        except ValueError:
+                            continue
+                        items.append({"host": host, "key": key, "value": value, "clock": clock})
+            except FileNotFoundError:
+                return [], self._offset
+            if partial:
+                self._drop_partial_tail()
+            return items, offset
+
+    def advance(self, offset):
+        """Marca como reenviados os itens até offset, esvaziando o arquivo quando todos foram reenviados."""
+        with self._lock:
+            if offset >= self._size():
+                with open(self.path, "w", encoding="utf-8"):
+                    pass
+                self._offset = 0
+            else:
+                self._offset = offset
+            with open(self._offset_path, "w", encoding="utf-8") as f:
+                f.write(str(self._offset))
+
+
+class QueuedSender:
+    """Envio assíncrono para o Zabbix, desacoplado da coleta.
+
+    send() apenas coloca os itens em uma fila em memória limitada (SEND_QUEUE_SIZE itens) e retorna
+    imediatamente; uma thread de envio esvazia a fila em lotes de até batch_size itens, agrupando os
+    itens de todos os coletores e CommCells do processo. Quando o Zabbix está indisponível (ou a fila
+    está cheia) os itens são gravados no spool em disco, e novas tentativas são feitas a cada
+    SEND_RETRY_INTERVAL segundos. Ao restabelecer a comunicação o spool é reenviado em lotes, antes dos
+    itens novos, com o clock original de cada valor. Ao encerrar o processo a fila é esvaziada por até
+    SEND_FLUSH_TIMEOUT segundos e o restante é gravado no spool.
+    """
+
+    def __init__(self, sender, spool, queue_size=DEFAULT_QUEUE_SIZE, retry_interval=DEFAULT_RETRY_INTERVAL,
+                 flush_timeout=DEFAULT_FLUSH_TIMEOUT):
+        self.sender = sender
+        self.spool = spool
+        self.batch_size = sender.batch_size
+        self.queue_size = max(1, int(queue_size))
+        self.retry_interval = float(retry_interval)
+        self.flush_timeout = float(flush_timeout)
+        self.stats = {"sent": 0, "failed": 0, "spooled": 0, "replayed": 0}
+        self._queue = deque()
+        self._cond = threading.Condition()
+        self._busy = False
+        self._stopping = False
+        # Enquanto time.monotonic() < _retry_at o Zabbix é considerado indisponível
+        self._retry_at = 0.0
+        self._thread = threading.Thread(target=self._worker, name="zabbix-sender", daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    @classmethod
+    def from_env(cls):
+        """Cria o envio assíncrono a partir de ZABBIX_*, SEND_QUEUE_SIZE, SEND_RETRY_INTERVAL, SEND_FLUSH_TIMEOUT e SEND_SPOOL_MAX_MB."""
+        return cls(
+            ZabbixSender.from_env(),
+            SendSpool.from_env(),
+            queue_size=os.getenv("SEND_QUEUE_SIZE", DEFAULT_QUEUE_SIZE),
+            retry_interval=os.getenv("SEND_RETRY_INTERVAL", DEFAULT_RETRY_INTERVAL),
+            flush_timeout=os.getenv("SEND_FLUSH_TIMEOUT", DEFAULT_FLUSH_TIMEOUT),
+        )
+
+    def send(self, items):
+        """Coloca itens na fila de envio.
+
+        Returns:
+            dict: Mesmas chaves de ZabbixSender.send(). Como o envio é assíncrono, processed é a
+            quantidade de itens aceitos na fila ou no spool e failed a de itens descartados por falta
+            de espaço no spool; queued contém a quantidade de itens colocados na fila.
+        """
+        result = {"processed": 0, "failed": 0, "total": 0, "seconds_spent": 0.0, "batches": 0, "queued": 0}
+        overflow = []
+        with phase("send"):
+            with self._cond:
+                for item in items:
+                    result["total"] += 1
+                    if len(self._queue) < self.queue_size:
+                        self._queue.append(item)
+                        result["queued"] += 1
+                    else:
+                        overflow.append(item)
+                self._cond.notify()
+            if overflow:
+                spooled = self._to_spool(overflow)
+                result["failed"] = len(overflow) - spooled
+            result["processed"] = result["total"] - result["failed"]
+        record("items", result["total"])
+        return result
+
+    def send_metrics(self, host, metrics, clock=None):
+        """Envia um dicionário de métricas (chave -> valor) de um mesmo host. Veja ZabbixSender.send_metrics()."""
+        return self.send([zabbix_item(host, key, value, clock) for key, value in metrics.items()])
+
+    def flush(self, timeout=None):
+        """Aguarda a thread de envio esvaziar a fila (enviando ou gravando no spool).
+
+        Returns:
+            bool: True se a fila foi esvaziada dentro de timeout segundos.
+        """
+        deadline = time.monotonic() + (self.flush_timeout if timeout is None else timeout)
+        with self._cond:
+            while self._queue or self._busy:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                self._cond.wait(remaining)
+        return True
+
+    def close(self):
+        """Esvazia a fila ao encerrar o processo, gravando no spool o que não foi possível enviar."""
+        flushed = self.flush()
+        with self._cond:
+            self._stopping = True
+            left = list(self._queue)
+            self._queue.clear()
+            self._cond.notify_all()
+        if left:
+            self._to_spool(left)
+        if not flushed or self.stats["spooled"]:
+            print(f"Fila de envio: {self.stats['sent']} enviados, {self.stats['spooled']} gravados no spool {self.spool.path}, "
+                  f"{self.spool.dropped} descartados")
+
+    def _to_spool(self, items):
+        spooled = self.spool.append(items)
+        self.stats["spooled"] += spooled
+        if spooled < len(items):
+            report_error(f"Spool de envio cheio ({self.spool.path}): {len(items) - spooled} itens descartados")
+        return spooled
+
+    def _available(self):
+        return time.monotonic() >= self._retry_at
+
+    def _worker(self):
+        while True:
+            with self._cond:
+                self._busy = False
+                self._cond.notify_all()
+                while not self._queue and not self._stopping:
+                    if self.spool.pending() and self._available():
+                        break
+                    self._cond.wait(self.retry_interval if self.spool.pending() else None)
+                if self._stopping and not self._queue:
+                    return
+                batch = [self._queue.popleft() for _ in range(min(len(self._queue), self.batch_size))]
+                self._busy = True
+            # O spool é reenviado antes dos itens novos, para que o último valor recebido pelo Zabbix seja o mais recente
+            if self.spool.pending() and self._available():
+                self._replay()
+            if not batch:
+                continue
+            if self.spool.pending() or not self._available():
+                self._to_spool(batch)
+            else:
+                self._deliver(batch)
+
+    def _deliver(self, batch):
+        try:
+            result = self.sender._send_batch(batch)
+            self.stats["sent"] += result["processed"]
+            self.stats["failed"] += result["failed"]
+        except ZabbixSenderError as e:
+            self._unavailable(e)
+            self._to_spool(batch)
+
+    def _replay(self):
+        while True:
+            items, offset = self.spool.read(self.batch_size)
+            if not items:
+                self.spool.advance(offset)
+                if self.spool.pending():
+                    # Nada legível após o offset: aguarda o próximo intervalo em vez de tentar de novo em seguida
+                    self._retry_at = time.monotonic() + self.retry_interval
+                return
+            try:
+                result = self.sender._send_batch(items)
+            except ZabbixSenderError as e:
+                self._unavailable(e)
+                return
+            self.spool.advance(offset)
+            self.stats["replayed"] += len(items)
+            self.stats["sent"] += result["processed"]
+            self.stats["failed"] += result["failed"]
+            if not self.spool.pending():
+                print(f"Spool de envio reenviado para o Zabbix: {self.stats['replayed']} itens")
+                return
+
+    def _unavailable(self, error):
+        if self._available():
+            print(f"Zabbix indisponível, itens gravados no spool até a próxima tentativa em {self.retry_interval:.0f}s: {error}")
+        self._retry_at = time.monotonic() + self.retry_interval
+
+
+_default_sender = None
+_default_sender_lock = threading.Lock()
+
+
+def default_sender():
+    """Retorna o envio compartilhado do processo, criado a partir das variáveis de ambiente na primeira chamada.
+
+    Com SEND_QUEUE habilitado o envio é assíncrono (QueuedSender), com spool em disco enquanto o
+    Zabbix estiver indisponível.
+
+    Returns:
+        SharedSender or QueuedSender: Envio compartilhado entre todos os coletores e CommCells do processo.
+    """
+    global _default_sender
+    with _default_sender_lock:
+        if _default_sender is None:
+            if os.getenv("SEND_QUEUE", "false").lower() in ("1", "true", "yes", "sim"):
+                _default_sender = QueuedSender.from_env()
+            else:
+                _default_sender = SharedSender(ZabbixSender.from_env())
+        return _default_sender